@@ -0,0 +1,206 @@
+"""
+AI Content Creation Agent - Batch Mode
+-------------------------------------
+Runs the content creation workflow non-interactively for many topics at once.
+Topic discovery runs a single time and is shared by all runs; the generation,
+refinement, image and HTML stages then run concurrently, one run per topic,
+with a configurable worker limit. The async variant runs every topic as a
+coroutine on a single event loop instead of one thread per run.
+"""
+
+import os
+import json
+import time
+import asyncio
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Any
+
+from main import (initialize_state, new_run_id, compile_workflow, run_workflow,
+                  acompile_workflow, arun_workflow)
+from components.topic_discovery import get_trending_topics, aget_trending_topics
+from components.llm_client import close_llm_clients, aclose_llm_clients
+from components.checkpoints import aclose_checkpointer
+from components.human_selection import log_selection
+from components.metrics import get_run_metrics, release_run_metrics
+from components.topic_index import get_topic_index, TOPIC_DEDUP
+from components.site_builder import slugify
+
+def discover_topics(batch_id: str) -> List[str]:
+    """Run topic discovery once for the whole batch."""
+    state = initialize_state(run_id=batch_id)
+    return get_trending_topics(state)["trending_topics"]
+
+def unique_topics(topics: List[str]) -> List[str]:
+    """Drop repeated topics, which would write to the same output file."""
+    unique = {}
+    for topic in topics:
+        slug = slugify(topic)
+        if slug in unique:
+            print(f"Skipping duplicate topic \"{topic}\"")
+        else:
+            unique[slug] = topic
+    return list(unique.values())
+
+def select_topics(trending_topics: List[str], top_n: int) -> List[str]:
+    """Selection policy for batch runs: the top N discovered topics.
+
+    Topics covered by earlier runs are skipped with ``TOPIC_DEDUP=filter``
+    and only flagged otherwise.
+    """
+    index = get_topic_index()
+    covered = index.covered(trending_topics) if index else {}
+    if TOPIC_DEDUP == "filter":
+        for topic, match in covered.items():
+            print(f"Skipping \"{topic}\", already covered in run {match['run_id']}")
+        trending_topics = [topic for topic in trending_topics if topic not in covered]
+    selected = unique_topics(trending_topics)[:top_n]
+    for topic in selected:
+        if topic in covered and TOPIC_DEDUP != "filter":
+            print(f"Note: \"{topic}\" was already covered in run {covered[topic]['run_id']}")
+    return selected
+
+def topic_state(topic: str, trending_topics: List[str]) -> Dict[str, Any]:
+    """Initial state of a run for one topic, with the selection logged."""
+    initial_state = initialize_state(
+        run_id=new_run_id(),
+        selected_topic=topic,
+        trending_topics=trending_topics
+    )
+    log_selection(initial_state, topic)
+    return initial_state
+
+def topic_result(initial_state: Dict[str, Any], final_state: Dict[str, Any], started: float) -> Dict[str, Any]:
+    return {
+        "run_id": initial_state["run_id"],
+        "topic": initial_state["selected_topic"],
+        "success": bool(final_state and final_state.get("html_content")),
+        "duration": round(time.monotonic() - started, 1)
+    }
+
+def run_topic(workflow, topic: str, trending_topics: List[str], output_dir: str,
+              metrics_file: str = None) -> Dict[str, Any]:
+    """Run the workflow for a single topic and return a short result record."""
+    initial_state = topic_state(topic, trending_topics)
+
+    started = time.monotonic()
+    final_state = run_workflow(workflow, initial_state, output_dir, metrics_file=metrics_file)
+
+    return topic_result(initial_state, final_state, started)
+
+async def arun_topic(workflow, topic: str, trending_topics: List[str], output_dir: str,
+                     metrics_file: str = None) -> Dict[str, Any]:
+    """Async variant of run_topic."""
+    initial_state = topic_state(topic, trending_topics)
+
+    started = time.monotonic()
+    final_state = await arun_workflow(workflow, initial_state, output_dir, metrics_file=metrics_file)
+
+    return topic_result(initial_state, final_state, started)
+
+def print_progress(results: List[Dict[str, Any]], total: int):
+    result = results[-1]
+    status = "done" if result["success"] else "failed"
+    print(f"[{len(results)}/{total}] {status}: {result['topic']} ({result['duration']}s)")
+
+def write_batch_summary(batch_id: str, batch_dir: str, concurrency: int, topics: List[str],
+                        started: float, results: List[Dict[str, Any]]):
+    """Write the batch summary next to the shared discovery logs."""
+    summary = {
+        "batch_id": batch_id,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "workers": concurrency,
+        "topics": topics,
+        "duration": round(time.monotonic() - started, 1),
+        "runs": results,
+        "discovery_metrics": get_run_metrics(batch_id).summary()
+    }
+    release_run_metrics(batch_id)
+    with open(os.path.join(batch_dir, "batch_summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+
+    succeeded = sum(1 for result in results if result["success"])
+    print(f"Batch completed: {succeeded}/{len(results)} posts generated in {summary['duration']}s")
+
+def run_batch(topics: List[str] = None, top_n: int = 3, workers: int = 4,
+              output_dir: str = "output", metrics_file: str = None) -> List[Dict[str, Any]]:
+    """Produce one post per topic, running up to ``workers`` runs concurrently.
+
+    If no topics are given, a shared discovery run picks the top ``top_n``
+    trending topics.
+    """
+    batch_id = new_run_id()
+    batch_dir = os.path.join("logs", batch_id)
+    os.makedirs(batch_dir, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
+
+    try:
+        if topics:
+            topics = trending_topics = unique_topics(topics)
+        else:
+            trending_topics = discover_topics(batch_id)
+            topics = select_topics(trending_topics, top_n)
+
+        print(f"Starting batch {batch_id} with {len(topics)} topics and {workers} workers...")
+
+        # A compiled graph holds no per-run state and can be shared by all workers
+        workflow = compile_workflow(interactive=False)
+
+        started = time.monotonic()
+        results = []
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="run") as executor:
+            futures = [
+                executor.submit(run_topic, workflow, topic, trending_topics, output_dir, metrics_file)
+                for topic in topics
+            ]
+            for future in as_completed(futures):
+                results.append(future.result())
+                print_progress(results, len(topics))
+
+        write_batch_summary(batch_id, batch_dir, workers, topics, started, results)
+
+        return results
+    finally:
+        close_llm_clients()
+
+async def arun_batch(topics: List[str] = None, top_n: int = 3, concurrency: int = 16,
+                     output_dir: str = "output", metrics_file: str = None) -> List[Dict[str, Any]]:
+    """Async variant of run_batch: up to ``concurrency`` runs share one event loop.
+
+    Model and image calls still go through the shared rate limits, which cap
+    the requests in flight independently of ``concurrency``.
+    """
+    batch_id = new_run_id()
+    batch_dir = os.path.join("logs", batch_id)
+    os.makedirs(batch_dir, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
+
+    try:
+        if topics:
+            topics = trending_topics = unique_topics(topics)
+        else:
+            state = await aget_trending_topics(initialize_state(run_id=batch_id))
+            trending_topics = state["trending_topics"]
+            topics = select_topics(trending_topics, top_n)
+
+        print(f"Starting async batch {batch_id} with {len(topics)} topics and concurrency {concurrency}...")
+
+        workflow = await acompile_workflow(interactive=False)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(topic: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await arun_topic(workflow, topic, trending_topics, output_dir, metrics_file)
+
+        started = time.monotonic()
+        results = []
+        for next_result in asyncio.as_completed([run(topic) for topic in topics]):
+            results.append(await next_result)
+            print_progress(results, len(topics))
+
+        write_batch_summary(batch_id, batch_dir, concurrency, topics, started, results)
+
+        return results
+    finally:
+        await aclose_llm_clients()
+        await aclose_checkpointer()
@@ -0,0 +1,71 @@
+"""
+Extraction Benchmark
+-------------------
+Measures parse throughput of the per-host extractors against saved HTML
+fixtures of each source type, compared with the previous approach of parsing
+the whole page with html.parser and keeping its full text.
+
+Usage:
+    python benchmarks/bench_extract.py [--repeat 20]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components import extractors
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Fixture file and the source URL it was saved from
+FIXTURES = [
+    ("hacker_news.html", "https://news.ycombinator.com"),
+    ("reddit.html", "https://www.reddit.com/r/artificial/"),
+    ("article_listing.html", "https://techcrunch.com/category/artificial-intelligence/"),
+]
+
+def full_page_text(html: str, url: str = "") -> str:
+    """The previous extraction: full parse, all text, truncated afterwards."""
+    text = BeautifulSoup(html, "html.parser").get_text()
+    return " ".join(text.split())[:10000]
+
+def bench(extract, html: str, url: str, repeat: int):
+    """Return the mean seconds per page and the extracted text."""
+    text = extract(html, url)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        extract(html, url)
+    return (time.perf_counter() - started) / repeat, text
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-host HTML extraction")
+    parser.add_argument("--repeat", type=int, default=20, help="Iterations per fixture")
+    args = parser.parse_args()
+
+    backends = ["html.parser"]
+    if extractors.PARSER != "html.parser":
+        backends.append(extractors.PARSER)
+
+    print(f"{'fixture':<22}{'method':<26}{'ms/page':>10}{'MB/s':>10}{'chars':>8}{'lines':>8}")
+    for name, url in FIXTURES:
+        with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+            html = f.read()
+        size_mb = len(html.encode("utf-8")) / 1e6
+
+        methods = [("full page (html.parser)", "html.parser", full_page_text)]
+        for backend in backends:
+            methods.append((f"extractor ({backend})", backend, extractors.extract_items))
+
+        for label, backend, method in methods:
+            extractors.PARSER = backend
+            seconds, text = bench(method, html, url, args.repeat)
+            print(f"{name:<22}{label:<26}{seconds * 1000:>10.2f}{size_mb / seconds:>10.2f}"
+                  f"{len(text):>8}{text.count(chr(10)) + 1:>8}")
+
+if __name__ == "__main__":
+    main()
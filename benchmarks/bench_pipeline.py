@@ -0,0 +1,199 @@
+"""
+Pipeline Benchmark
+-----------------
+Runs the full workflow against the local mock servers and reports, for each
+concurrency level, the per-stage latency percentiles, throughput and peak
+memory. Three paths are measured:
+
+- "invoke": `build_workflow_graph(interactive=False).compile().invoke(...)`
+  called directly from a pool of threads;
+- "batch": `batch.run_batch(...)` with the given number of workers, which adds
+  checkpointing, output files, logs and run summaries on top of the graph;
+- "async": `batch.arun_batch(...)`, the same batch with async nodes, all runs
+  sharing one event loop.
+
+Every level runs in a fresh subprocess with its own working directory, so
+peak RSS is measured per level and no caches carry over between levels.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--modes invoke,batch,async] [--concurrency 1,2,4,8]
+        [--runs 8] [--llm-latency 0.2] [--tokens-per-sec 1000] [--sdxl-latency 1.0]
+        [--failure-rate 0.0] [--json results.json]
+"""
+
+import os
+import sys
+import json
+import asyncio
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from benchmarks.mock_servers import start_server, server_urls
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def benchmark_topics(count: int) -> List[str]:
+    return [f"Benchmark Topic {index}: Efficient Inference at Scale" for index in range(1, count + 1)]
+
+def run_invoke(topics: List[str], concurrency: int) -> int:
+    """Invoke the compiled graph directly for every topic; returns the successful runs."""
+    from main import build_workflow_graph, initialize_state
+    from components.metrics import release_run_metrics
+
+    workflow = build_workflow_graph(interactive=False).compile()
+
+    def invoke(topic: str) -> bool:
+        state = initialize_state(selected_topic=topic, trending_topics=topics)
+        try:
+            return bool(workflow.invoke(state).get("html_content"))
+        except Exception as e:
+            print(f"Run failed for {topic}: {e}")
+            return False
+        finally:
+            release_run_metrics(state["run_id"])
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return sum(executor.map(invoke, topics))
+
+def run_batch_path(topics: List[str], concurrency: int) -> int:
+    from batch import run_batch
+    results = run_batch(topics=topics, workers=concurrency)
+    return sum(1 for result in results if result["success"])
+
+def run_async_path(topics: List[str], concurrency: int) -> int:
+    from batch import arun_batch
+    results = asyncio.run(arun_batch(topics=topics, concurrency=concurrency))
+    return sum(1 for result in results if result["success"])
+
+MODES = {"invoke": run_invoke, "batch": run_batch_path, "async": run_async_path}
+
+def worker(mode: str, concurrency: int, runs: int, result_file: str):
+    """Run one benchmark level in this process and write its results as JSON."""
+    # Import the workflow before the clock starts, so startup is not counted
+    import batch  # imports main as well
+    from components.metrics import process_summary
+
+    topics = benchmark_topics(runs)
+    started = time.monotonic()
+    succeeded = MODES[mode](topics, concurrency)
+    elapsed = time.monotonic() - started
+
+    with open(result_file, "w") as f:
+        json.dump({
+            "mode": mode,
+            "concurrency": concurrency,
+            "runs": runs,
+            "succeeded": succeeded,
+            "seconds": round(elapsed, 2),
+            "runs_per_min": round(succeeded * 60 / elapsed, 2) if elapsed else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": process_summary()
+        }, f, indent=2)
+
+def run_level(mode: str, concurrency: int, runs: int, env: Dict[str, str], verbose: bool) -> Dict[str, Any]:
+    """Run a level in a subprocess with a fresh working directory."""
+    workdir = tempfile.mkdtemp(prefix=f"bench_{mode}_{concurrency}_")
+    result_file = os.path.join(workdir, "result.json")
+    log_file = os.path.join(workdir, "bench.log")
+    try:
+        with open(log_file, "w") as log:
+            process = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", mode,
+                 "--concurrency", str(concurrency), "--runs", str(runs), "--result", result_file],
+                cwd=workdir, env=env,
+                stdout=None if verbose else log, stderr=subprocess.STDOUT
+            )
+        if process.returncode != 0 or not os.path.exists(result_file):
+            with open(log_file, "r") as f:
+                print(f.read()[-2000:])
+            raise RuntimeError(f"{mode} at concurrency {concurrency} failed with exit code {process.returncode}")
+        with open(result_file, "r") as f:
+            return json.load(f)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def print_level(result: Dict[str, Any]):
+    rss = result["peak_rss_mb"]
+    print(f"\n{result['mode']} x{result['concurrency']}: {result['succeeded']}/{result['runs']} runs in "
+          f"{result['seconds']}s, {result['runs_per_min']} runs/min, "
+          f"peak RSS {'n/a' if rss is None else f'{rss} MB'}")
+    print(f"  {'stage':<36}{'count':>7}{'errors':>8}{'retries':>9}{'p50 s':>9}{'p95 s':>9}{'max s':>9}{'wait s':>9}")
+    for stage, stats in result["stages"].items():
+        print(f"  {stage:<36}{stats['count']:>7}{stats['errors']:>8}{stats['retries']:>9}"
+              f"{stats['wall_time_p50']:>9.3f}{stats['wall_time_p95']:>9.3f}{stats['wall_time_max']:>9.3f}"
+              f"{stats['rate_wait_total']:>9.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the workflow against the mock LLM and SDXL servers")
+    parser.add_argument("--modes", type=str, default="invoke,batch", help="Comma-separated paths: invoke, batch, async")
+    parser.add_argument("--concurrency", type=str, default="1,2,4,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--runs", type=int, default=8, help="Runs (topics) per level")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Mock time to first token in seconds")
+    parser.add_argument("--tokens-per-sec", type=float, default=1000, help="Mock completion throughput")
+    parser.add_argument("--sdxl-latency", type=float, default=1.0, help="Mock seconds per image")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of mock requests that fail")
+    parser.add_argument("--json", type=str, help="Also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the runs")
+    parser.add_argument("--worker", type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--result", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, int(args.concurrency), args.runs, args.result)
+        return
+
+    server = start_server(settings={
+        "llm_latency": args.llm_latency,
+        "tokens_per_sec": args.tokens_per_sec,
+        "sdxl_latency": args.sdxl_latency,
+        "failure_rate": args.failure_rate
+    })
+    llm_url, sdxl_url = server_urls(server)
+    env = {
+        **os.environ,
+        "PYTHONPATH": REPO_DIR,
+        "LLM_BASE_URL": llm_url,
+        "SDXL_URL": sdxl_url,
+        "LEPTON_API_KEY": "mock",
+        # Every run should reach the mock servers
+        "LLM_CACHE": "0",
+        "IMAGE_CACHE": "0",
+        "TOPIC_DEDUP": "off",
+        "LOG_RENDER_VIEW": "0"
+    }
+
+    print(f"Mock servers at {llm_url} and {sdxl_url}")
+    results = []
+    for mode in args.modes.split(","):
+        for concurrency in [int(level) for level in args.concurrency.split(",")]:
+            result = run_level(mode, concurrency, args.runs, env, args.verbose)
+            results.append(result)
+            print_level(result)
+
+    server.shutdown()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Startup Benchmark
+----------------
+Measures the wall time of short CLI commands from process start to exit and
+checks it against a budget, so heavy dependencies that creep back into the
+import path are caught. Each command runs in a fresh interpreter in an empty
+working directory; the median of several runs is reported together with the
+heavy packages the command imported. Building the workflow graph is measured
+as well for reference, but it is not held to the budget since it needs
+LangGraph.
+
+Exits with status 1 if any budgeted command is over the budget.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--budget 0.4] [--json results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Dict, Any, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from components.startup_profile import profile_imports, loaded_heavy_packages
+
+MAIN = os.path.join(REPO_DIR, "main.py")
+
+# (name, arguments to the interpreter, held to the budget)
+COMMANDS = [
+    ("interpreter", ["-c", "pass"], False),
+    ("--help", [MAIN, "--help"], True),
+    ("--build-site", [MAIN, "--build-site", "--output", "site"], True),
+    ("--render-logs", [MAIN, "--render-logs", "missing_run"], True),
+    ("import batch", ["-c", "import batch"], True),
+    ("build workflow", ["-c", "import main; main.build_workflow_graph(interactive=False).compile()"], False),
+]
+
+def time_command(argv: List[str], cwd: str, env: Dict[str, str]) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable] + argv, cwd=cwd, env=env,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - started
+
+def measure(name: str, argv: List[str], runs: int, env: Dict[str, str]) -> Dict[str, Any]:
+    """Median and best wall time of a command, and the heavy packages it imports."""
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        # The first run also writes bytecode caches, so it is not timed
+        time_command(argv, workdir, env)
+        times = [time_command(argv, workdir, env) for _ in range(runs)]
+        _, rows, _, _ = profile_imports(argv, capture_output=True, cwd=workdir, env=env)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "command": name,
+        "median": round(statistics.median(times), 3),
+        "best": round(min(times), 3),
+        "heavy": loaded_heavy_packages(rows)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLI startup time against a budget")
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per command")
+    parser.add_argument("--budget", type=float, default=0.4, help="Maximum median seconds per budgeted command")
+    parser.add_argument("--json", type=str, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    env = {**os.environ, "PYTHONPATH": REPO_DIR, "LOG_RENDER_VIEW": "0"}
+
+    print(f"Startup time, median of {args.runs} runs (budget {args.budget:.2f}s)")
+    print(f"  {'command':<18}{'median s':>10}{'best s':>10}  {'status':<8}heavy packages")
+    results = []
+    over_budget = []
+    for name, argv, budgeted in COMMANDS:
+        result = measure(name, argv, args.runs, env)
+        result["budgeted"] = budgeted
+        results.append(result)
+        status = "-"
+        if budgeted:
+            status = "ok" if result["median"] <= args.budget else "OVER"
+            if status == "OVER":
+                over_budget.append(name)
+        print(f"  {name:<18}{result['median']:>10.3f}{result['best']:>10.3f}  {status:<8}"
+              f"{', '.join(result['heavy']) or '-'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"budget": args.budget, "results": results}, f, indent=2)
+
+    if over_budget:
+        print(f"Over budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
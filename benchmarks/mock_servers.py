@@ -0,0 +1,313 @@
+"""
+Mock Servers
+-----------
+Local stand-ins for the external services, so the workflow can be run and
+benchmarked without network access or API spend:
+
+- an OpenAI-compatible chat-completions endpoint (`POST /v1/chat/completions`),
+  streaming (server-sent events) and non-streaming, which recognizes the
+  workflow's stages from their prompts and answers with canned but well-formed
+  topics, posts, critiques, section patches and image prompts;
+- a mock SDXL deployment compatible with `leptonai.client.Client.run`
+  (`GET /openapi.json`, `GET /healthz`, `POST /run`) that returns a PNG.
+
+Latency, token throughput and failure injection are configurable.
+
+Usage:
+    python benchmarks/mock_servers.py [--llm-port 8001] [--sdxl-port 8002]
+        [--llm-latency 0.2] [--tokens-per-sec 200] [--sdxl-latency 2.0]
+        [--failure-rate 0.0] [--failure-status 500]
+
+Then point the workflow at the mocks:
+    LLM_BASE_URL=http://127.0.0.1:8001/v1/ SDXL_URL=http://127.0.0.1:8002 python main.py
+"""
+
+import re
+import json
+import time
+import zlib
+import struct
+import random
+import hashlib
+import argparse
+import threading
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Tuple
+
+DEFAULT_SETTINGS = {
+    "llm_latency": 0.2,       # seconds before the first token
+    "tokens_per_sec": 200.0,  # completion throughput; 0 for no limit
+    "sdxl_latency": 2.0,      # seconds per image
+    "failure_rate": 0.0,      # fraction of requests answered with an error
+    "failure_status": 500,
+    "jitter": 0.1             # +/- fraction applied to the latencies
+}
+
+WORDS = ("model agents inference open-source benchmark training GPU robotics vision language "
+         "retrieval reasoning startup regulation safety chips edge diffusion multimodal").split()
+
+# Appended by refinements, so a revised post differs slightly from its original
+REVISION_SENTENCE = "This section has been revised for clarity."
+
+def _rng(*parts: str) -> random.Random:
+    return random.Random(hashlib.sha256("|".join(parts).encode("utf-8")).digest())
+
+def sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+
+def mock_post(topic: str) -> str:
+    """A Markdown post of roughly 1000 words about a topic."""
+    rng = _rng("post", topic)
+    lines = [f"# {topic}", "", " ".join(sentence(rng) for _ in range(5)), ""]
+    for section in range(6):
+        lines += [f"## Section {section + 1}: {rng.choice(WORDS).capitalize()}", ""]
+        lines += [" ".join(sentence(rng) for _ in range(6)), ""]
+        lines += [f"- **{rng.choice(WORDS)}**: {sentence(rng)}" for _ in range(3)] + [""]
+    return "\n".join(lines)
+
+def mock_topics(prompt: str) -> str:
+    rng = _rng("topics", prompt)
+    return "\n".join(
+        f"{index}. {' '.join(rng.choice(WORDS).capitalize() for _ in range(3))} {index}: "
+        f"{sentence(rng)[:-1]}"
+        for index in range(1, 11)
+    )
+
+def mock_critique(prompt: str) -> str:
+    rng = _rng("critique", prompt)
+    return "\n".join(f"{index}. Improve the {rng.choice(WORDS)} section: {sentence(rng)}"
+                     for index in range(1, rng.randint(3, 5) + 1))
+
+def fenced(text: str) -> str:
+    """The first fenced block of a prompt."""
+    match = re.search(r"```\n?(.*?)```", text, re.DOTALL)
+    return match.group(1).strip() if match else text
+
+def mock_patch(prompt: str) -> str:
+    """Revise the second section of a post split into "[SECTION n]" blocks."""
+    parts = re.split(r"^\s*\[SECTION (\d+)\]\s*$", prompt, flags=re.MULTILINE)
+    sections = {int(parts[i]): parts[i + 1].strip() for i in range(1, len(parts) - 1, 2)}
+    index = 2 if 2 in sections else min(sections, default=1)
+    return f"[SECTION {index}]\n{sections.get(index, '## Section')}\n\n{REVISION_SENTENCE}\n"
+
+def mock_completion(messages: List[Dict[str, str]]) -> str:
+    """Answer a chat request according to the workflow stage its prompt belongs to."""
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    topic_match = re.search(r'(?:about|topic:)\s*"?([^"\n]+)"?', user)
+    topic = topic_match.group(1).strip() if topic_match else "Artificial Intelligence"
+
+    if "trend analyst" in system:
+        return mock_topics(user)
+    if "[SECTION" in system:
+        return mock_patch(user)
+    if "image generation" in system:
+        return f"A detailed digital illustration of {topic}, glowing circuits, soft light, editorial style."
+    if "numbered list" in system:
+        return mock_critique(user)
+    if "feedback" in system:
+        return f"{fenced(user)}\n\n{REVISION_SENTENCE}\n"
+    return mock_post(topic)
+
+@lru_cache(maxsize=64)
+def mock_png(width: int, height: int, seed: int) -> bytes:
+    """A valid gradient PNG, so derivative generation has real pixels to work on."""
+    rng = random.Random(seed)
+    base = [rng.randrange(256) for _ in range(3)]
+    rows = []
+    for y in range(height):
+        shade = y * 255 // max(1, height - 1)
+        pixel = bytes(((base[0] + shade) % 256, base[1], (base[2] + 255 - shade) % 256))
+        rows.append(b"\x00" + pixel * width)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return (struct.pack(">I", len(data)) + kind + data
+                + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(b"".join(rows), 6)) + chunk(b"IEND", b""))
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Request handler shared by both mocks; ``server.settings`` configures it."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        return self.server.settings
+
+    def delay(self, seconds: float):
+        jitter = self.settings["jitter"]
+        if seconds > 0:
+            time.sleep(seconds * random.uniform(1 - jitter, 1 + jitter))
+
+    def read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send_body(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, payload: Dict[str, Any]):
+        self.send_body(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def inject_failure(self) -> bool:
+        """Answer with an error for the configured fraction of requests."""
+        if random.random() >= self.settings["failure_rate"]:
+            return False
+        self.send_json(self.settings["failure_status"],
+                       {"error": {"message": "Injected failure", "type": "server_error"}})
+        return True
+
+    def do_GET(self):
+        if self.path.endswith("/openapi.json"):
+            self.send_json(200, {
+                "openapi": "3.0.2",
+                "info": {"title": "Mock SDXL", "version": "0.1.0"},
+                "paths": {"/run": {"post": {"summary": "Generate an image"}}}
+            })
+        elif self.path.endswith("/healthz"):
+            self.send_json(200, {"status": "ok"})
+        else:
+            self.send_json(404, {"detail": "Not Found"})
+
+    def do_POST(self):
+        request = self.read_json()
+        if self.path.endswith("/chat/completions"):
+            if not self.inject_failure():
+                self.chat_completions(request)
+        elif self.path.endswith("/run"):
+            if not self.inject_failure():
+                self.delay(self.settings["sdxl_latency"])
+                seed = int(request.get("seed") or 0)
+                self.send_body(200, mock_png(int(request.get("width", 1024)),
+                                             int(request.get("height", 1024)), seed), "image/png")
+        else:
+            self.send_json(404, {"detail": "Not Found"})
+
+    def chat_completions(self, request: Dict[str, Any]):
+        text = mock_completion(request.get("messages", []))
+        # Roughly one token per word, keeping the whitespace with the word
+        tokens = re.findall(r"\S+\s*|\s+", text)[:int(request.get("max_tokens") or 4096)]
+        prompt_tokens = sum(len(m.get("content", "")) for m in request.get("messages", [])) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                 "total_tokens": prompt_tokens + len(tokens)}
+        completion_id = f"chatcmpl-{random.getrandbits(48):012x}"
+        model = request.get("model", "mock")
+
+        self.delay(self.settings["llm_latency"])
+        if not request.get("stream"):
+            tokens_per_sec = self.settings["tokens_per_sec"]
+            if tokens_per_sec > 0:
+                time.sleep(len(tokens) / tokens_per_sec)
+            self.send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(choices: List[Dict[str, Any]], **extra):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": choices,
+                **extra
+            }
+            self.write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+        def chunk(delta: Dict[str, Any], finish_reason: str = None):
+            event([{"index": 0, "delta": delta, "finish_reason": finish_reason}])
+
+        chunk({"role": "assistant", "content": ""})
+        started = time.monotonic()
+        tokens_per_sec = self.settings["tokens_per_sec"]
+        for index, token in enumerate(tokens):
+            if tokens_per_sec > 0:
+                # Sleep only when ahead of the configured rate, so timer
+                # granularity does not slow down fast settings
+                ahead = (index / tokens_per_sec) - (time.monotonic() - started)
+                if ahead > 0.005:
+                    time.sleep(ahead)
+            chunk({"content": token})
+        chunk({}, "stop")
+        if (request.get("stream_options") or {}).get("include_usage"):
+            event([], usage=usage)
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def write_chunk(self, data: bytes):
+        """Write one HTTP/1.1 chunk; an empty chunk ends the body."""
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+def start_server(port: int = 0, settings: Dict[str, Any] = None) -> ThreadingHTTPServer:
+    """Start a mock server on a background thread; port 0 picks a free port.
+
+    Both mocks are served by every server, so one port is enough for the
+    chat completions and SDXL endpoints alike.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockHandler)
+    server.daemon_threads = True
+    server.settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    threading.Thread(target=server.serve_forever, name=f"mock-{server.server_port}", daemon=True).start()
+    return server
+
+def server_urls(server: ThreadingHTTPServer) -> Tuple[str, str]:
+    """The LLM_BASE_URL and SDXL_URL for a running mock server."""
+    base = f"http://127.0.0.1:{server.server_port}"
+    return f"{base}/v1/", base
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the mock LLM and SDXL servers")
+    parser.add_argument("--llm-port", type=int, default=8001, help="Port of the chat completions mock")
+    parser.add_argument("--sdxl-port", type=int, default=8002, help="Port of the SDXL mock")
+    parser.add_argument("--llm-latency", type=float, default=DEFAULT_SETTINGS["llm_latency"],
+                        help="Seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=DEFAULT_SETTINGS["tokens_per_sec"],
+                        help="Completion throughput (0 for no limit)")
+    parser.add_argument("--sdxl-latency", type=float, default=DEFAULT_SETTINGS["sdxl_latency"],
+                        help="Seconds per generated image")
+    parser.add_argument("--failure-rate", type=float, default=DEFAULT_SETTINGS["failure_rate"],
+                        help="Fraction of requests answered with an error")
+    parser.add_argument("--failure-status", type=int, default=DEFAULT_SETTINGS["failure_status"],
+                        help="HTTP status of injected failures, e.g. 500 or 429")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_SETTINGS["jitter"],
+                        help="Random +/- fraction applied to latencies")
+    args = parser.parse_args()
+
+    settings = {key: getattr(args, key) for key in DEFAULT_SETTINGS}
+    llm_server = start_server(args.llm_port, settings)
+    sdxl_server = start_server(args.sdxl_port, settings)
+    print(f"LLM_BASE_URL={server_urls(llm_server)[0]}")
+    print(f"SDXL_URL={server_urls(sdxl_server)[1]}")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        llm_server.shutdown()
+        sdxl_server.shutdown()
+
+if __name__ == "__main__":
+    main()
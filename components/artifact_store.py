@@ -0,0 +1,81 @@
+"""
+Artifact Store Component
+-----------------------
+This component implements a content-addressed store for run artifacts:
+drafts, images and HTML pages. Each distinct blob is written once under
+`artifacts/objects/`, named by its SHA-256 hash, and outputs and run logs
+reference it through hardlinks or manifest entries instead of copies.
+"""
+
+import os
+import shutil
+import hashlib
+import threading
+from typing import Optional
+
+ARTIFACT_STORE_DIR = os.getenv("ARTIFACT_STORE_DIR", "artifacts")
+
+_write_lock = threading.Lock()
+
+def object_path(digest: str, extension: str = "") -> str:
+    """Return the store path of a blob with the given hash."""
+    return os.path.join(ARTIFACT_STORE_DIR, "objects", digest[:2], digest + extension)
+
+def digest_of(path: str) -> str:
+    """Return the SHA-256 hash encoded in a store path."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+def put_bytes(data: bytes, extension: str = "") -> str:
+    """Store a blob and return its store path; existing blobs are not rewritten."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = object_path(digest, extension)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    with _write_lock:
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    return path
+
+def put_text(text: str, extension: str = "") -> str:
+    """Store a UTF-8 text blob and return its store path."""
+    return put_bytes(text.encode("utf-8"), extension)
+
+def put_file(path: str) -> Optional[str]:
+    """Store the contents of an existing file and return its store path."""
+    if not path or not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        return put_bytes(f.read(), os.path.splitext(path)[1])
+
+def link(store_path: str, dest: str) -> str:
+    """Materialize a stored blob at ``dest`` without copying it if possible.
+
+    Uses a hardlink, falling back to a copy when the destination is on a
+    different filesystem. Because outputs may share their bytes with the
+    store, they must be replaced through this function rather than edited in
+    place. Returns the destination path.
+    """
+    dest_dir = os.path.dirname(dest)
+    if dest_dir:
+        os.makedirs(dest_dir, exist_ok=True)
+    if os.path.lexists(dest):
+        if os.path.exists(dest) and os.path.samefile(store_path, dest):
+            return dest
+        os.remove(dest)
+    try:
+        os.link(store_path, dest)
+    except OSError:
+        shutil.copyfile(store_path, dest)
+    return dest
+
+def read_bytes(store_path: str) -> bytes:
+    """Read a stored blob."""
+    with open(store_path, "rb") as f:
+        return f.read()
@@ -0,0 +1,381 @@
+"""
+Call Policy Component
+--------------------
+This component is the shared policy for calls to the model endpoints. A call
+gets a deadline for all of its attempts together; transient failures (network
+errors, timeouts, 429 and 5xx responses) are retried with jittered
+exponential backoff; a slow attempt can be hedged with a duplicate request
+once it runs past the stage's recent p95 latency; and a circuit breaker per
+endpoint fails calls fast while the endpoint keeps failing, instead of letting
+every run wait out its own retries. Both blocking and coroutine calls are
+supported.
+"""
+
+import os
+import time
+import asyncio
+import random
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Awaitable, Callable, Dict, Any, Optional, Tuple, TypeVar
+
+from components.metrics import percentile
+
+# Retry settings: attempts per call, and the backoff before each retry is
+# drawn uniformly between 0 and base * 2^(attempt - 1), capped at the maximum
+CALL_MAX_ATTEMPTS = int(os.getenv("CALL_MAX_ATTEMPTS", "4"))
+CALL_BACKOFF_BASE = float(os.getenv("CALL_BACKOFF_BASE", "1"))
+CALL_BACKOFF_MAX = float(os.getenv("CALL_BACKOFF_MAX", "20"))
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Default deadline per call kind in seconds; override with CALL_DEADLINE_<STAGE>,
+# e.g. CALL_DEADLINE_CONTENT_GENERATION=300
+DEFAULT_DEADLINES = {
+    "llm": float(os.getenv("CALL_DEADLINE", "240")),
+    "sdxl": float(os.getenv("CALL_DEADLINE_SDXL", "180")),
+}
+
+# Hedging: once a stage has enough latency samples, an attempt still running
+# after the stage's p95 gets a duplicate request, and the first answer wins
+CALL_HEDGE = os.getenv("CALL_HEDGE", "0") != "0"
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = int(os.getenv("CALL_HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = 200
+
+# Circuit breaker: consecutive failures that open an endpoint's circuit, and
+# seconds before a single trial call is let through again
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+T = TypeVar("T")
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an endpoint whose circuit is open."""
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a call runs out of time across all of its attempts."""
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one endpoint."""
+
+    def __init__(self, endpoint: str, threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.endpoint = endpoint
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Let a call through, or raise CircuitOpenError.
+
+        While half-open only one trial call is let through at a time. Returns
+        True for the trial call, which must end in record_success,
+        record_failure or end_trial.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return False
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            retry_in = max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+            raise CircuitOpenError(f"Circuit for {self.endpoint} is open after {self.failures} "
+                                   f"consecutive failures; next trial in {retry_in:.0f}s")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            trial_failed = self._trial_running
+            self._trial_running = False
+            if trial_failed or (self.opened_at is None and self.failures >= self.threshold):
+                if self.opened_at is None:
+                    print(f"Opening circuit for {self.endpoint} after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+
+    def end_trial(self):
+        """Let another trial through after one ended without an outcome,
+        e.g. because it was cancelled."""
+        with self._lock:
+            self._trial_running = False
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+_state_lock = threading.Lock()
+
+# Hedged attempts run here; a losing attempt finishes in the background
+_hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+def get_breaker(endpoint: str) -> CircuitBreaker:
+    """Return the shared circuit breaker of an endpoint."""
+    with _state_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = _breakers[endpoint] = CircuitBreaker(endpoint)
+        return breaker
+
+def deadline_for(stage: str, kind: str = "llm") -> float:
+    """Return the deadline in seconds of a call, across all of its attempts."""
+    override = os.getenv(f"CALL_DEADLINE_{stage.upper()}")
+    if override:
+        return float(override)
+    return DEFAULT_DEADLINES.get(kind, DEFAULT_DEADLINES["llm"])
+
+def status_of(error: Exception) -> Optional[int]:
+    """HTTP status code carried by an API or HTTP error, if any."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+def is_transport_error(error: Exception) -> bool:
+    """Connection and timeout errors of openai, httpx and requests."""
+    name = type(error).__name__
+    return (isinstance(error, (ConnectionError, TimeoutError))
+            or "Connection" in name or "Timeout" in name or "Transport" in name
+            or "RemoteProtocol" in name)
+
+def is_retryable(error: Exception) -> bool:
+    """Transient failures: connection errors, timeouts, 429 and 5xx responses."""
+    if isinstance(error, (CircuitOpenError, DeadlineExceededError)):
+        return False
+    status = status_of(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return is_transport_error(error)
+
+def endpoint_failed(error: Exception) -> Optional[bool]:
+    """What an error says about the endpoint, for its circuit breaker.
+
+    True for transport errors and 429 or 5xx responses, False for other HTTP
+    responses (the endpoint is answering), and None for errors raised on this
+    side, such as waiting in the rate limiter or running out of the deadline.
+    """
+    if isinstance(error, (CircuitOpenError, DeadlineExceededError)):
+        return None
+    status = status_of(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return True if is_transport_error(error) else None
+
+def retry_after(error: Exception) -> float:
+    """Seconds the server asked to wait before retrying, or 0."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after", 0)))
+    except (TypeError, ValueError):
+        return 0.0
+
+def backoff_delay(attempt: int, error: Exception = None) -> float:
+    """Jittered exponential backoff before retry number ``attempt``."""
+    delay = random.uniform(0, min(CALL_BACKOFF_MAX, CALL_BACKOFF_BASE * 2 ** (attempt - 1)))
+    return max(delay, retry_after(error) if error is not None else 0.0)
+
+def hedge_delay(key: str) -> Optional[float]:
+    """The p95 attempt latency of a stage, or None until there are enough samples."""
+    with _state_lock:
+        samples = list(_latencies[key])
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return percentile(samples, HEDGE_QUANTILE)
+
+def _record_latency(key: str, seconds: float):
+    with _state_lock:
+        _latencies[key].append(seconds)
+
+def _hedged_attempt(attempt: Callable[[float], T], timeout: float, delay: float,
+                    stats: Dict[str, Any]) -> T:
+    """Run an attempt, adding a duplicate if it is still running after ``delay``."""
+    started = time.monotonic()
+    futures = [_hedge_executor.submit(attempt, timeout)]
+    done, _ = wait(futures, timeout=min(delay, timeout))
+    if not done:
+        stats["hedged"] += 1
+        futures.append(_hedge_executor.submit(attempt, max(0.0, timeout - (time.monotonic() - started))))
+
+    pending = set(futures)
+    error = None
+    while pending:
+        remaining = timeout - (time.monotonic() - started)
+        done, pending = wait(pending, timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+        if not done:
+            raise DeadlineExceededError(f"No response within {timeout:.0f}s")
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+class _Call:
+    """Bookkeeping of one call under the policy, shared by the sync and async loops."""
+
+    def __init__(self, endpoint: str, stage: str, kind: str, deadline: Optional[float],
+                 hedge: Optional[bool], retry_if: Optional[Callable[[Exception], bool]],
+                 stats: Optional[Dict[str, Any]]):
+        self.stage = stage
+        self.key = f"{kind}:{stage}"
+        self.stats = stats if stats is not None else {}
+        self.stats.setdefault("retries", 0)
+        self.stats.setdefault("hedged", 0)
+        self.retry_if = retry_if or is_retryable
+        self.hedge = CALL_HEDGE if hedge is None else hedge
+        self.deadline = deadline_for(stage, kind) if deadline is None else deadline
+        self.deadline_at = time.monotonic() + self.deadline
+        self.breaker = get_breaker(endpoint)
+        self.attempt_number = 1
+        self.started = 0.0
+        self.trial = False
+
+    def start_attempt(self) -> Tuple[float, Optional[float]]:
+        """Check the deadline and the circuit before an attempt.
+
+        Returns the seconds left and the hedge delay, if the attempt should be hedged.
+        """
+        remaining = self.deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceededError(f"{self.stage} call exceeded its {self.deadline:.0f}s deadline")
+        self.trial = self.breaker.before_call()
+        self.started = time.monotonic()
+        delay = hedge_delay(self.key) if self.hedge else None
+        return remaining, delay if delay is not None and delay < remaining else None
+
+    def end_attempt(self):
+        """Release a half-open trial that ended without a recorded outcome."""
+        if self.trial:
+            self.trial = False
+            self.breaker.end_trial()
+
+    def succeeded(self):
+        self.trial = False
+        self.breaker.record_success()
+        _record_latency(self.key, time.monotonic() - self.started)
+
+    def failed(self, error: Exception) -> Optional[float]:
+        """Record a failed attempt; return the backoff before the next attempt,
+        or None if the error should be raised."""
+        retryable = self.retry_if(error)
+        # Neutral errors leave the breaker as it is; end_attempt releases a trial
+        failed = endpoint_failed(error)
+        if failed is not None:
+            self.trial = False
+            if failed:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+        if not retryable or self.attempt_number >= CALL_MAX_ATTEMPTS:
+            return None
+        wait_seconds = backoff_delay(self.attempt_number, error)
+        if time.monotonic() + wait_seconds >= self.deadline_at:
+            return None
+        self.stats["retries"] += 1
+        self.attempt_number += 1
+        print(f"{self.stage} call failed ({type(error).__name__}: {error}); retrying in {wait_seconds:.1f}s "
+              f"(attempt {self.attempt_number}/{CALL_MAX_ATTEMPTS})")
+        return wait_seconds
+
+def call_with_policy(attempt: Callable[[float], T], endpoint: str, stage: str, kind: str = "llm",
+                     deadline: float = None, hedge: bool = None,
+                     retry_if: Callable[[Exception], bool] = None,
+                     stats: Dict[str, Any] = None) -> T:
+    """Call ``attempt(timeout)`` under the retry, hedging and circuit-breaking policy.
+
+    ``attempt`` receives the seconds left before the call's deadline and should
+    use them as its request timeout. ``retry_if`` can narrow which errors are
+    retried, e.g. to never repeat a stream that has already delivered text.
+    The number of retries and hedged requests is written to ``stats``.
+    Raises the last error once attempts or time run out.
+    """
+    call = _Call(endpoint, stage, kind, deadline, hedge, retry_if, stats)
+    while True:
+        remaining, delay = call.start_attempt()
+        try:
+            if delay is not None:
+                result = _hedged_attempt(attempt, remaining, delay, call.stats)
+            else:
+                result = attempt(remaining)
+        except Exception as e:
+            wait_seconds = call.failed(e)
+            if wait_seconds is None:
+                raise
+        else:
+            call.succeeded()
+            return result
+        finally:
+            call.end_attempt()
+        time.sleep(wait_seconds)
+
+async def _ahedged_attempt(attempt: Callable[[float], Awaitable[T]], timeout: float, delay: float,
+                           stats: Dict[str, Any]) -> T:
+    """Async variant of _hedged_attempt; the losing request is cancelled."""
+    started = time.monotonic()
+    tasks = [asyncio.ensure_future(attempt(timeout))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=min(delay, timeout))
+        if not done:
+            stats["hedged"] += 1
+            tasks.append(asyncio.ensure_future(attempt(max(0.0, timeout - (time.monotonic() - started)))))
+
+        pending = set(tasks)
+        error = None
+        while pending:
+            remaining = timeout - (time.monotonic() - started)
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, remaining),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceededError(f"No response within {timeout:.0f}s")
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def acall_with_policy(attempt: Callable[[float], Awaitable[T]], endpoint: str, stage: str,
+                            kind: str = "llm", deadline: float = None, hedge: bool = None,
+                            retry_if: Callable[[Exception], bool] = None,
+                            stats: Dict[str, Any] = None) -> T:
+    """Async variant of call_with_policy for coroutine attempts.
+
+    An attempt still running at the deadline is cancelled.
+    """
+    call = _Call(endpoint, stage, kind, deadline, hedge, retry_if, stats)
+    while True:
+        remaining, delay = call.start_attempt()
+        try:
+            if delay is not None:
+                result = await _ahedged_attempt(attempt, remaining, delay, call.stats)
+            else:
+                try:
+                    result = await asyncio.wait_for(attempt(remaining), remaining)
+                except asyncio.TimeoutError:
+                    raise DeadlineExceededError(f"No response within {remaining:.0f}s")
+        except Exception as e:
+            wait_seconds = call.failed(e)
+            if wait_seconds is None:
+                raise
+        else:
+            call.succeeded()
+            return result
+        finally:
+            call.end_attempt()
+        await asyncio.sleep(wait_seconds)
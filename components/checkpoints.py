@@ -0,0 +1,125 @@
+"""
+Checkpoints Component
+--------------------
+This component provides the durable checkpointer for the workflow graph.
+LangGraph saves the state after every node to a SQLite file, keyed by the
+run ID, so a crashed run can resume from its last completed node and a new
+run can be forked from any saved state without repeating upstream calls.
+Async workflows use an async saver over the same file.
+"""
+
+import os
+import asyncio
+import sqlite3
+import threading
+from typing import Dict, Any, List, Tuple
+
+CHECKPOINTS_ENABLED = os.getenv("CHECKPOINTS", "1") != "0"
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", os.path.join("checkpoints", "workflow.sqlite"))
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+# Async savers per event loop, since their connections are bound to the loop
+_async_checkpointers: Dict[int, Any] = {}
+
+def _ensure_directory():
+    directory = os.path.dirname(CHECKPOINT_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+def get_checkpointer():
+    """Return the shared SQLite checkpointer, or None if checkpointing is disabled
+    or langgraph-checkpoint-sqlite is not installed."""
+    global _checkpointer
+    if not CHECKPOINTS_ENABLED:
+        return None
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                try:
+                    from langgraph.checkpoint.sqlite import SqliteSaver
+                except ImportError:
+                    print("langgraph-checkpoint-sqlite is not installed; runs will not be checkpointed")
+                    return None
+                _ensure_directory()
+                # The saver serializes access with its own lock, so the
+                # connection can be shared by batch worker threads
+                _checkpointer = SqliteSaver(sqlite3.connect(CHECKPOINT_PATH, check_same_thread=False))
+    return _checkpointer
+
+async def aget_checkpointer():
+    """Return the async SQLite checkpointer of the running event loop, or None if
+    checkpointing is disabled or aiosqlite is not installed."""
+    if not CHECKPOINTS_ENABLED:
+        return None
+    loop_id = id(asyncio.get_running_loop())
+    if loop_id not in _async_checkpointers:
+        try:
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError:
+            print("langgraph-checkpoint-sqlite or aiosqlite is not installed; runs will not be checkpointed")
+            return None
+        _ensure_directory()
+        _async_checkpointers[loop_id] = AsyncSqliteSaver(await aiosqlite.connect(CHECKPOINT_PATH))
+    return _async_checkpointers[loop_id]
+
+async def aclose_checkpointer():
+    """Close the async checkpointer of the running event loop, e.g. before it ends."""
+    checkpointer = _async_checkpointers.pop(id(asyncio.get_running_loop()), None)
+    if checkpointer is not None:
+        await checkpointer.conn.close()
+
+def run_config(run_id: str) -> Dict[str, Any]:
+    """Return the graph config that stores a run's checkpoints under its run ID."""
+    return {"configurable": {"thread_id": run_id}}
+
+def get_saved_state(workflow, run_id: str):
+    """Return the latest saved state snapshot of a run, or None if there is none."""
+    if workflow.checkpointer is None:
+        raise ValueError("Checkpointing is disabled; cannot resume a run")
+    snapshot = workflow.get_state(run_config(run_id))
+    if not snapshot.values:
+        return None
+    return snapshot
+
+def fork_run(workflow, run_id: str, node: str, new_run_id: str) -> Dict[str, Any]:
+    """Copy the saved state of a run from just before ``node`` into a new run.
+
+    Nodes that ran in the same step as ``node`` (e.g. image generation next to
+    the refinement loop) keep their saved results, so resuming the new run
+    re-executes only ``node`` and everything downstream of it. Returns the
+    state values of the new run.
+    """
+    checkpointer = workflow.checkpointer
+    if checkpointer is None:
+        raise ValueError("Checkpointing is disabled; cannot fork a run")
+
+    # History is ordered newest first; use the last time the node was scheduled
+    snapshot = next(
+        (s for s in workflow.get_state_history(run_config(run_id)) if node in s.next),
+        None
+    )
+    if snapshot is None:
+        raise ValueError(f"Run {run_id} has no saved state before node '{node}'")
+
+    saved = checkpointer.get_tuple(snapshot.config)
+    checkpoint = dict(saved.checkpoint)
+    checkpoint["channel_values"] = {**checkpoint["channel_values"], "run_id": new_run_id}
+    new_config = checkpointer.put(
+        {"configurable": {"thread_id": new_run_id, "checkpoint_ns": ""}},
+        checkpoint,
+        {**saved.metadata, "source": "fork", "parents": {}},
+        checkpoint["channel_versions"]
+    )
+
+    # Keep the results of the other nodes of that step, minus the old run ID
+    sibling_tasks = {task.id for task in snapshot.tasks if task.name != node}
+    writes: Dict[str, List[Tuple[str, Any]]] = {}
+    for task_id, channel, value in saved.pending_writes or []:
+        if task_id in sibling_tasks and channel != "run_id":
+            writes.setdefault(task_id, []).append((channel, value))
+    for task_id, task_writes in writes.items():
+        checkpointer.put_writes(new_config, task_writes, task_id)
+
+    return workflow.get_state(run_config(new_run_id)).values
@@ -6,54 +6,22 @@ This component generates the initial content for the selected topic using direct
 
 import os
 from typing import Dict, Any
-import openai
-import json
 from datetime import datetime
 
+from components.llm_client import chat_completion, achat_completion
+from components import event_log
+
 def log_content_generation(state: Dict[str, Any], content: str):
     """Log the content generation process."""
     run_id = state.get("run_id", datetime.now().strftime("%Y%m%d_%H%M%S"))
-    component_dir = os.path.join("logs", run_id, "content_generation")
-    os.makedirs(component_dir, exist_ok=True)
-    
-    # Log the generated content summary
-    log_file = os.path.join(component_dir, "output.txt")
-    with open(log_file, "w") as f:
-        f.write(f"===== {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} =====\n")
-        f.write(f"Generated content for topic: {state.get('selected_topic', '')}\n\n")
-        
-        # Add a preview of the content
-        f.write("Content preview:\n")
-        f.write("---\n")
-        preview = content[:1000] + "..." if len(content) > 1000 else content
-        f.write(preview)
-        f.write("\n---\n\n")
-        
-        # Add state summary
-        f.write("State summary:\n")
-        summary = {
-            "selected_topic": state.get("selected_topic", ""),
-            "content_length": len(content),
-            "run_id": run_id
-        }
-        f.write(json.dumps(summary, indent=2))
-        f.write("\n\n")
-    
-    # Save the full content to a separate file
-    content_file = os.path.join(component_dir, "initial_content.md")
-    with open(content_file, "w") as f:
-        f.write(content)
+    event_log.emit(run_id, "content_generation", "content_generated", {
+        "selected_topic": state.get("selected_topic", ""),
+        "content_length": len(content)
+    }, bodies={"initial_content.md": content})
 
-def generate_initial_content(state: Dict[str, Any]) -> Dict[str, Any]:
-    """Generate initial content for the selected topic and update the agent state."""
+def content_request(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Arguments of the LLM call that writes the initial draft."""
     selected_topic = state["selected_topic"]
-    print(f"Generating initial content for topic: {selected_topic}")
-    
-    # Set up the OpenAI client with Lepton's API
-    client = openai.OpenAI(
-        base_url="https://llama3-3-70b.lepton.run/api/v1/",
-        api_key=os.getenv("LEPTON_API_KEY")
-    )
     
     # System message to guide the content generation
     system_message = """
@@ -75,25 +43,21 @@ def generate_initial_content(state: Dict[str, Any]) -> Dict[str, Any]:
     Format the post in Markdown with proper headings, paragraphs, and emphasis where appropriate.
     """
     
-    # Generate content using direct API call
-    try:
-        response = client.chat.completions.create(
-            model="llama3.3-70b",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": f"Write a blog post about the trending AI topic: {selected_topic}"}
-            ],
-            max_tokens=4000,
-            temperature=0.7
-        )
-        
-        # Extract content from response
-        content = response.choices[0].message.content.strip()
-        
-    except Exception as e:
-        print(f"Error generating content: {e}")
-        # Fallback content
-        content = f"""
+    return {
+        "messages": [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": f"Write a blog post about the trending AI topic: {selected_topic}"}
+        ],
+        "max_tokens": 4000,
+        "temperature": 0.7,
+        "stage": "content_generation",
+        "run_id": state.get("run_id"),
+        # Write the draft to the run's logs as it is generated
+        "partial_path": os.path.join("logs", state.get("run_id", "unknown"), "content_generation", "partial_content.md")
+    }
+
+def fallback_content(selected_topic: str) -> str:
+    return f"""
 # {selected_topic}: An Overview
 
 ## Introduction
@@ -108,7 +72,9 @@ The complete content generation encountered an error.
 ## Conclusion
 This is a placeholder conclusion.
 """
-    
+
+def content_result(state: Dict[str, Any], content: str) -> Dict[str, Any]:
+    """Log the initial draft and return the updated agent state."""
     # Log the generated content
     log_content_generation(state, content)
     
@@ -117,5 +83,34 @@ This is a placeholder conclusion.
         **state, 
         "current_content": content,
         "refinement_count": 0,
-        "refinement_feedback": []
-    }
\ No newline at end of file
+        "refinement_feedback": [],
+        "refinement_similarity": [],
+        "refinement_stop_reason": ""
+    }
+
+def generate_initial_content(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Generate initial content for the selected topic and update the agent state."""
+    selected_topic = state["selected_topic"]
+    print(f"Generating initial content for topic: {selected_topic}")
+    
+    # Generate content using direct API call
+    try:
+        content = chat_completion(**content_request(state)).strip()
+    except Exception as e:
+        print(f"Error generating content: {e}")
+        content = fallback_content(selected_topic)
+    
+    return content_result(state, content)
+
+async def agenerate_initial_content(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Async variant of generate_initial_content."""
+    selected_topic = state["selected_topic"]
+    print(f"Generating initial content for topic: {selected_topic}")
+    
+    try:
+        content = (await achat_completion(**content_request(state))).strip()
+    except Exception as e:
+        print(f"Error generating content: {e}")
+        content = fallback_content(selected_topic)
+    
+    return content_result(state, content)
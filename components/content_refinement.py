@@ -5,70 +5,37 @@ This component implements the self-critique and refinement mechanism using direc
 """
 
 import os
-from typing import Dict, Any, List
-import openai
+from typing import Dict, Any, List, Optional
 import re
-import json
 from datetime import datetime
 
+from components.llm_client import chat_completion, achat_completion
+from components.convergence import check_convergence, content_similarity
+from components.prompt_builder import (compress_feedback, truncate_to_tokens, remaining_budget, budget_for,
+                                       estimate_tokens, estimate_prompt_tokens)
+from components import event_log
+
+# Refinement mode: "full" rewrites the whole post every iteration, "patch" asks
+# only for the sections the critique targets, and "auto" uses patches for posts
+# with at least PATCH_MIN_SECTIONS sections
+REFINE_MODE = os.getenv("REFINE_MODE", "auto")
+PATCH_MIN_SECTIONS = int(os.getenv("REFINE_PATCH_MIN_SECTIONS", "4"))
+
 def log_refinement(state: Dict[str, Any], feedback: List[str], refined_content: str):
     """Log the refinement process."""
     run_id = state.get("run_id", datetime.now().strftime("%Y%m%d_%H%M%S"))
-    refinement_count = state.get("refinement_count", 0)
-    component_dir = os.path.join("logs", run_id, "content_refinement")
-    os.makedirs(component_dir, exist_ok=True)
-    
-    # Create iteration-specific log directory
-    iteration_dir = os.path.join(component_dir, f"iteration_{refinement_count}")
-    os.makedirs(iteration_dir, exist_ok=True)
-    
-    # Log the feedback and refinement
-    log_file = os.path.join(iteration_dir, "output.txt")
-    with open(log_file, "w") as f:
-        f.write(f"===== {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} =====\n")
-        f.write(f"Refinement iteration: {refinement_count}\n\n")
-        
-        # Log the feedback
-        f.write("Feedback received:\n")
-        for i, point in enumerate(feedback, 1):
-            f.write(f"{i}. {point}\n")
-        f.write("\n")
-        
-        # Add a preview of the refined content
-        f.write("Refined content preview:\n")
-        f.write("---\n")
-        preview = refined_content[:1000] + "..." if len(refined_content) > 1000 else refined_content
-        f.write(preview)
-        f.write("\n---\n\n")
-        
-        # Add state summary
-        f.write("State summary:\n")
-        summary = {
-            "refinement_count": refinement_count,
-            "feedback_points": len(feedback),
-            "content_length": len(refined_content),
-            "run_id": run_id
-        }
-        f.write(json.dumps(summary, indent=2))
-        f.write("\n\n")
-    
-    # Save the full content to a separate file
-    content_file = os.path.join(iteration_dir, "refined_content.md")
-    with open(content_file, "w") as f:
-        f.write(refined_content)
-    
-    # Save the feedback to a separate file
-    feedback_file = os.path.join(iteration_dir, "feedback.json")
-    with open(feedback_file, "w") as f:
-        json.dump(feedback, f, indent=2)
+    event_log.emit(run_id, "content_refinement", "content_refined", {
+        "refinement_count": state.get("refinement_count", 0),
+        "feedback": feedback,
+        "content_length": len(refined_content)
+    }, bodies={"refined_content.md": refined_content})
 
-def critique_content(content: str, topic: str) -> List[str]:
-    """Use LLM to critique the content and provide feedback."""
-    client = openai.OpenAI(
-        base_url="https://llama3-3-70b.lepton.run/api/v1/",
-        api_key=os.getenv("LEPTON_API_KEY")
-    )
-    
+DEFAULT_FEEDBACK = ["Improve the technical depth of the content.", 
+                    "Add more specific examples to illustrate key points.",
+                    "Enhance the conclusion with more forward-looking insights."]
+
+def critique_request(content: str, topic: str, run_id: str = None) -> Dict[str, Any]:
+    """Arguments of the LLM call that critiques the content."""
     system_message = """
     You are an expert editor specializing in AI and technology content.
     
@@ -94,7 +61,7 @@ def critique_content(content: str, topic: str) -> List[str]:
     3. Third improvement point
     """
     
-    user_message = f"""
+    user_template = """
     Review this blog post about "{topic}":
     
     ```
@@ -104,34 +71,29 @@ def critique_content(content: str, topic: str) -> List[str]:
     Provide 3-5 specific improvement points, ordered by priority.
     """
     
-    try:
-        # Get critique from LLM
-        response = client.chat.completions.create(
-            model="llama3.3-70b",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message}
-            ],
-            max_tokens=2000,
-            temperature=0.2
-        )
-        
-        critique = response.choices[0].message.content.strip()
-        
-        # Process the critique to extract clean feedback points
-        feedback = process_feedback(critique)
-        
-    except Exception as e:
-        print(f"Error generating critique: {e}")
-        feedback = ["Improve the technical depth of the content.", 
-                   "Add more specific examples to illustrate key points.",
-                   "Enhance the conclusion with more forward-looking insights."]
+    # A long draft is critiqued on the excerpt that fits the stage's budget
+    content_budget = remaining_budget("critique", system_message, user_template.format(topic=topic, content=""))
+    excerpt = truncate_to_tokens(content, content_budget)
+    if len(excerpt) < len(content):
+        print(f"Critiquing the first {len(excerpt)} of {len(content)} characters to fit the prompt budget")
+    user_message = user_template.format(topic=topic, content=excerpt)
     
+    return {
+        "messages": [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_message}
+        ],
+        "max_tokens": 2000,
+        "temperature": 0.2,
+        "stage": "critique",
+        "run_id": run_id
+    }
+
+def critique_result(feedback: List[str]) -> List[str]:
+    """Fill in and print the feedback points of a critique."""
     # Ensure we have at least some feedback points
     if not feedback:
-        feedback = ["Improve the technical depth of the content.", 
-                   "Add more specific examples to illustrate key points.",
-                   "Enhance the conclusion with more forward-looking insights."]
+        feedback = list(DEFAULT_FEEDBACK)
     
     # Print feedback in a clean format
     print("Feedback received:")
@@ -141,6 +103,27 @@ def critique_content(content: str, topic: str) -> List[str]:
     
     return feedback[:5]  # Return at most 5 feedback points
 
+def critique_content(content: str, topic: str, run_id: str = None) -> List[str]:
+    """Use LLM to critique the content and provide feedback."""
+    try:
+        # Get critique from LLM and extract clean feedback points
+        feedback = process_feedback(chat_completion(**critique_request(content, topic, run_id)).strip())
+    except Exception as e:
+        print(f"Error generating critique: {e}")
+        feedback = []
+    
+    return critique_result(feedback)
+
+async def acritique_content(content: str, topic: str, run_id: str = None) -> List[str]:
+    """Async variant of critique_content."""
+    try:
+        feedback = process_feedback((await achat_completion(**critique_request(content, topic, run_id))).strip())
+    except Exception as e:
+        print(f"Error generating critique: {e}")
+        feedback = []
+    
+    return critique_result(feedback)
+
 def process_feedback(critique: str) -> List[str]:
     """Process the critique text to extract clean feedback points."""
     # First, split by newlines
@@ -172,24 +155,53 @@ def process_feedback(critique: str) -> List[str]:
     
     return feedback_lines
 
-def refine_content(state: Dict[str, Any]) -> Dict[str, Any]:
-    """Refine content based on critique and update the agent state."""
-    current_content = state["current_content"]
-    topic = state["selected_topic"]
-    refinement_count = state["refinement_count"]
-    previous_feedback = state["refinement_feedback"]
-    
-    print(f"Starting refinement iteration {refinement_count + 1}...")
-    
-    # Get critique of the current content
-    feedback = critique_content(current_content, topic)
-    
-    # Set up the OpenAI client with Lepton's API
-    client = openai.OpenAI(
-        base_url="https://llama3-3-70b.lepton.run/api/v1/",
-        api_key=os.getenv("LEPTON_API_KEY")
-    )
-    
+def split_sections(content: str) -> List[str]:
+    """Split a Markdown document into sections, one per heading.
+
+    The first section holds anything before the first heading. Joining the
+    returned sections reproduces the original document exactly.
+    """
+    sections = []
+    current = []
+    in_code_block = False
+    for line in content.splitlines(keepends=True):
+        if line.lstrip().startswith("```"):
+            in_code_block = not in_code_block
+        if not in_code_block and re.match(r'^#{1,6}\s', line) and current:
+            sections.append("".join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append("".join(current))
+    return sections
+
+def parse_section_patches(response: str, section_count: int) -> Dict[int, str]:
+    """Parse "[SECTION n]" blocks from a patch response into revised sections."""
+    patches = {}
+    parts = re.split(r'^\s*\[SECTION (\d+)\]\s*$', response, flags=re.MULTILINE)
+    # re.split alternates text and captured section numbers: [pre, n, body, n, body, ...]
+    for number, body in zip(parts[1::2], parts[2::2]):
+        index = int(number) - 1
+        body = body.strip("\n")
+        if 0 <= index < section_count and body.strip():
+            patches[index] = body
+    return patches
+
+def apply_section_patches(sections: List[str], patches: Dict[int, str]) -> str:
+    """Splice revised sections back into the document."""
+    patched = []
+    for index, section in enumerate(sections):
+        if index in patches:
+            # Keep the blank line that separated this section from the next one
+            trailing = section[len(section.rstrip("\n")):] or "\n"
+            patched.append(patches[index].rstrip("\n") + trailing)
+        else:
+            patched.append(section)
+    return "".join(patched)
+
+def rewrite_full_request(current_content: str, topic: str, formatted_feedback: str, formatted_previous: str,
+                         run_id: str = None, partial_path: str = None) -> Dict[str, Any]:
+    """Arguments of the LLM call that rewrites the whole blog post."""
     system_message = """
     You are an expert AI content writer. Your task is to improve a blog post based on editorial feedback.
     
@@ -199,19 +211,6 @@ def refine_content(state: Dict[str, Any]) -> Dict[str, Any]:
     Return the complete improved version of the blog post in Markdown format.
     """
     
-    # Format the feedback for inclusion in the prompt
-    formatted_feedback = "\n".join([f"- {point}" for point in feedback])
-    
-    # Format previous feedback history
-    formatted_previous = ""
-    if previous_feedback:
-        formatted_previous = "Previous rounds of feedback:\n"
-        for i, round_feedback in enumerate(previous_feedback):
-            formatted_previous += f"Round {i+1}:\n"
-            for item in round_feedback[:3]:  # Limit to first 3 items per round
-                shortened = item[:100] + "..." if len(item) > 100 else item
-                formatted_previous += f"- {shortened}\n"
-    
     user_message = f"""
     Original blog post about "{topic}":
     ```
@@ -226,34 +225,266 @@ def refine_content(state: Dict[str, Any]) -> Dict[str, Any]:
     Please improve the blog post based on this feedback. Provide the complete revised version.
     """
     
-    try:
-        # Get refined content from LLM
-        response = client.chat.completions.create(
-            model="llama3.3-70b",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message}
-            ],
-            max_tokens=4000,
-            temperature=0.4
-        )
-        
-        refined_content = response.choices[0].message.content.strip()
-        
-    except Exception as e:
-        print(f"Error refining content: {e}")
-        # If there's an error, keep the original content
+    return {
+        "messages": [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_message}
+        ],
+        "max_tokens": 4000,
+        "temperature": 0.4,
+        "stage": "refinement",
+        "run_id": run_id,
+        "partial_path": partial_path
+    }
+
+def rewrite_full(current_content: str, topic: str, formatted_feedback: str, formatted_previous: str,
+                 run_id: str = None, partial_path: str = None) -> str:
+    """Ask the LLM for a complete rewrite of the blog post."""
+    return chat_completion(**rewrite_full_request(current_content, topic, formatted_feedback,
+                                                  formatted_previous, run_id, partial_path)).strip()
+
+async def arewrite_full(current_content: str, topic: str, formatted_feedback: str, formatted_previous: str,
+                        run_id: str = None, partial_path: str = None) -> str:
+    """Async variant of rewrite_full."""
+    return (await achat_completion(**rewrite_full_request(current_content, topic, formatted_feedback,
+                                                          formatted_previous, run_id, partial_path))).strip()
+
+def rewrite_sections_request(sections: List[str], topic: str, formatted_feedback: str, formatted_previous: str,
+                             run_id: str = None, partial_path: str = None) -> Dict[str, Any]:
+    """Arguments of the LLM call that revises only the sections targeted by the feedback."""
+    system_message = """
+    You are an expert AI content writer. Your task is to improve a blog post based on editorial feedback.
+    
+    The blog post is split into numbered sections. Revise ONLY the sections that the feedback
+    applies to, and leave every other section out of your answer.
+    
+    For each section you revise, output a line containing only its marker, e.g. [SECTION 3],
+    followed by the complete revised section in Markdown, including its heading.
+    Do not add any other text before, between or after the sections.
+    """
+    
+    numbered_sections = "\n".join(
+        f"[SECTION {index}]\n{section.strip()}\n" for index, section in enumerate(sections, 1)
+    )
+    
+    user_message = f"""
+    Blog post about "{topic}", split into sections:
+    
+    {numbered_sections}
+    
+    Editorial feedback:
+    {formatted_feedback}
+    
+    {formatted_previous}
+    
+    Please revise only the sections this feedback applies to.
+    """
+    
+    return {
+        "messages": [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_message}
+        ],
+        "max_tokens": 4000,
+        "temperature": 0.4,
+        "stage": "refinement_patch",
+        "run_id": run_id,
+        "partial_path": partial_path
+    }
+
+def sections_in_budget(sections: List[str], topic: str, formatted_feedback: str,
+                       formatted_previous: str) -> List[str]:
+    """The leading sections that fit in the patch prompt's budget.
+
+    Sections left out are kept as they are, so the prompt can be cut
+    without losing any of the draft.
+    """
+    fixed = rewrite_sections_request([], topic, formatted_feedback, formatted_previous)["messages"]
+    available = budget_for("refinement_patch") - estimate_prompt_tokens(fixed)
+    count = 0
+    for index, section in enumerate(sections, 1):
+        available -= estimate_tokens(f"[SECTION {index}]\n{section.strip()}\n")
+        if available < 0:
+            break
+        count += 1
+    if count < len(sections):
+        print(f"Offering the first {count} of {len(sections)} sections for revision to fit the prompt budget")
+    return sections[:count]
+
+def rewrite_sections(sections: List[str], topic: str, formatted_feedback: str, formatted_previous: str,
+                     run_id: str = None, partial_path: str = None) -> Dict[int, str]:
+    """Ask the LLM to revise only the sections targeted by the feedback.
+
+    Returns the revised sections keyed by their index.
+    """
+    sections = sections_in_budget(sections, topic, formatted_feedback, formatted_previous)
+    if not sections:
+        return {}
+    response = chat_completion(**rewrite_sections_request(sections, topic, formatted_feedback,
+                                                          formatted_previous, run_id, partial_path))
+    return parse_section_patches(response, len(sections))
+
+async def arewrite_sections(sections: List[str], topic: str, formatted_feedback: str, formatted_previous: str,
+                            run_id: str = None, partial_path: str = None) -> Dict[int, str]:
+    """Async variant of rewrite_sections."""
+    sections = sections_in_budget(sections, topic, formatted_feedback, formatted_previous)
+    if not sections:
+        return {}
+    response = await achat_completion(**rewrite_sections_request(sections, topic, formatted_feedback,
+                                                                 formatted_previous, run_id, partial_path))
+    return parse_section_patches(response, len(sections))
+
+def refinement_inputs(state: Dict[str, Any], feedback: List[str]) -> Dict[str, Any]:
+    """Arguments of the rewrite for this iteration, and whether to patch sections."""
+    run_id = state.get("run_id")
+    sections = split_sections(state["current_content"])
+    # Format the feedback for inclusion in the prompt
+    formatted_feedback = "\n".join([f"- {point}" for point in feedback])
+    # Format previous feedback history, compressing older rounds
+    formatted_previous = compress_feedback(state["refinement_feedback"])
+    use_patch = REFINE_MODE == "patch"
+    if REFINE_MODE == "auto":
+        # A full rewrite has to be shown the whole draft, so drafts too long
+        # for its budget are patched section by section instead
+        full_messages = rewrite_full_request(state["current_content"], state["selected_topic"],
+                                             formatted_feedback, formatted_previous)["messages"]
+        use_patch = len(sections) >= PATCH_MIN_SECTIONS or (
+            len(sections) > 1 and estimate_prompt_tokens(full_messages) > budget_for("refinement"))
+    return {
+        "sections": sections,
+        "use_patch": use_patch,
+        "topic": state["selected_topic"],
+        "formatted_feedback": formatted_feedback,
+        "formatted_previous": formatted_previous,
+        "run_id": run_id,
+        # Write the revision to the iteration's logs as it is generated
+        "partial_path": os.path.join("logs", run_id or "unknown", "content_refinement",
+                                     f"iteration_{state['refinement_count']}", "partial_content.md")
+    }
+
+def patched_content(sections: List[str], patches: Dict[int, str]) -> str:
+    """The document with the section edits applied, or "" to fall back to a full rewrite."""
+    if patches:
+        print(f"Revised {len(patches)} of {len(sections)} sections")
+        return apply_section_patches(sections, patches).strip()
+    print("No section edits to apply, falling back to a full rewrite")
+    return ""
+
+def is_default_feedback(feedback: List[str]) -> bool:
+    """Whether a feedback round is the fallback used when the critique failed."""
+    return feedback == DEFAULT_FEEDBACK[:5]
+
+def refinement_result(state: Dict[str, Any], feedback: List[str], refined_content: Optional[str],
+                      patches: Dict[int, str] = None) -> Dict[str, Any]:
+    """Log the iteration, check convergence and return the changed state keys.
+
+    ``refined_content`` is None if the rewrite failed; the draft is then kept
+    and refinement stops, instead of the unchanged draft counting as converged.
+    If the draft was revised by section ``patches``, similarity is measured
+    on the replaced sections only, since untouched sections would otherwise
+    make every patch look converged.
+    """
+    current_content = state["current_content"]
+    refinement_count = state["refinement_count"]
+    rewrite_failed = refined_content is None
+    if rewrite_failed:
         refined_content = current_content
     
     # Log the refinement process
     log_refinement(state, feedback, refined_content)
     
     # Update the state with the refined content and increment refinement count
-    updated_feedback = previous_feedback + [feedback]
-    
+    updated_feedback = state["refinement_feedback"] + [feedback]
+    
+    # Check whether the draft has stabilized enough to stop refining. Fallback
+    # feedback rounds are left out, so a failed critique does not look repeated
+    if patches and not rewrite_failed:
+        sections = split_sections(current_content)
+        similarity = content_similarity("\n".join(sections[index] for index in sorted(patches)),
+                                        "\n".join(patches[index] for index in sorted(patches)))
+    else:
+        similarity = content_similarity(current_content, refined_content)
+    if rewrite_failed:
+        stop_reason = "refinement_failed"
+    else:
+        critiques = [] if is_default_feedback(feedback) else [
+            round_ for round_ in updated_feedback if not is_default_feedback(round_)
+        ]
+        stop_reason = check_convergence(refinement_count + 1, similarity, critiques)
+    print(f"Similarity to previous draft: {similarity:.2f}")
+    if stop_reason:
+        print(f"Stopping refinement after {refinement_count + 1} iterations: {stop_reason}")
+    
+    # Return only the keys this node changes, so the loop can run alongside
+    # other branches of the workflow
     return {
-        **state,
         "current_content": refined_content,
         "refinement_count": refinement_count + 1,
-        "refinement_feedback": updated_feedback
-    }
\ No newline at end of file
+        "refinement_feedback": updated_feedback,
+        "refinement_similarity": state.get("refinement_similarity", []) + [round(similarity, 3)],
+        "refinement_stop_reason": stop_reason
+    }
+
+def refine_content(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Refine content based on critique and update the agent state."""
+    current_content = state["current_content"]
+    print(f"Starting refinement iteration {state['refinement_count'] + 1}...")
+    
+    # Get critique of the current content
+    feedback = critique_content(current_content, state["selected_topic"], run_id=state.get("run_id"))
+    inputs = refinement_inputs(state, feedback)
+    sections = inputs.pop("sections")
+    use_patch = inputs.pop("use_patch")
+    topic = inputs.pop("topic")
+    
+    try:
+        refined_content = ""
+        patches = {}
+        if use_patch:
+            # Only regenerate the sections the feedback targets; a failed
+            # call falls back to a full rewrite like an unparsable answer
+            try:
+                patches = rewrite_sections(sections, topic, **inputs)
+            except Exception as e:
+                print(f"Error revising sections: {e}")
+            refined_content = patched_content(sections, patches)
+        
+        if not refined_content:
+            refined_content = rewrite_full(current_content, topic, **inputs)
+        
+    except Exception as e:
+        print(f"Error refining content: {e}")
+        # If there's an error, keep the original content
+        refined_content = None
+    
+    return refinement_result(state, feedback, refined_content, patches)
+
+async def arefine_content(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Async variant of refine_content."""
+    current_content = state["current_content"]
+    print(f"Starting refinement iteration {state['refinement_count'] + 1}...")
+    
+    feedback = await acritique_content(current_content, state["selected_topic"], run_id=state.get("run_id"))
+    inputs = refinement_inputs(state, feedback)
+    sections = inputs.pop("sections")
+    use_patch = inputs.pop("use_patch")
+    topic = inputs.pop("topic")
+    
+    try:
+        refined_content = ""
+        patches = {}
+        if use_patch:
+            try:
+                patches = await arewrite_sections(sections, topic, **inputs)
+            except Exception as e:
+                print(f"Error revising sections: {e}")
+            refined_content = patched_content(sections, patches)
+        
+        if not refined_content:
+            refined_content = await arewrite_full(current_content, topic, **inputs)
+        
+    except Exception as e:
+        print(f"Error refining content: {e}")
+        refined_content = None
+    
+    return refinement_result(state, feedback, refined_content, patches)
@@ -0,0 +1,69 @@
+"""
+Refinement Convergence Component
+-------------------------------
+This component decides when the self-critique and refinement loop has
+converged. It compares successive drafts using word shingle similarity and
+checks whether the editor keeps repeating the same feedback points, so the
+loop can stop early once further iterations barely change the text.
+"""
+
+import os
+import re
+from typing import List, Set
+
+REFINE_MIN_ITERATIONS = int(os.getenv("REFINE_MIN_ITERATIONS", "1"))
+REFINE_MAX_ITERATIONS = int(os.getenv("REFINE_MAX_ITERATIONS", "4"))
+REFINE_SIMILARITY_THRESHOLD = float(os.getenv("REFINE_SIMILARITY_THRESHOLD", "0.9"))
+REFINE_FEEDBACK_REPEAT_THRESHOLD = float(os.getenv("REFINE_FEEDBACK_REPEAT_THRESHOLD", "0.6"))
+
+# Word overlap above which two feedback points count as the same point
+FEEDBACK_POINT_OVERLAP = 0.5
+
+def _words(text: str) -> List[str]:
+    """Lower-case words of a text, ignoring Markdown punctuation."""
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+def _jaccard(a: Set, b: Set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+def shingles(text: str, size: int = 4) -> Set[tuple]:
+    """Return the set of word shingles of the given size."""
+    words = _words(text)
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def content_similarity(previous: str, current: str) -> float:
+    """Normalized shingle similarity between two drafts (1.0 means identical)."""
+    return _jaccard(shingles(previous), shingles(current))
+
+def feedback_repetition(previous_round: List[str], current_round: List[str]) -> float:
+    """Fraction of the current feedback points already raised in the previous round."""
+    if not previous_round or not current_round:
+        return 0.0
+    previous_words = [set(_words(point)) for point in previous_round]
+    repeated = 0
+    for point in current_round:
+        words = set(_words(point))
+        if any(_jaccard(words, other) >= FEEDBACK_POINT_OVERLAP for other in previous_words):
+            repeated += 1
+    return repeated / len(current_round)
+
+def check_convergence(iteration: int, similarity: float, feedback_history: List[List[str]]) -> str:
+    """Decide whether refinement should stop after the given iteration.
+
+    Returns the stop reason, or an empty string to keep refining.
+    """
+    if iteration >= REFINE_MAX_ITERATIONS:
+        return "max_iterations"
+    if iteration < REFINE_MIN_ITERATIONS:
+        return ""
+    if similarity >= REFINE_SIMILARITY_THRESHOLD:
+        return "content_converged"
+    if len(feedback_history) >= 2:
+        repetition = feedback_repetition(feedback_history[-2], feedback_history[-1])
+        if repetition >= REFINE_FEEDBACK_REPEAT_THRESHOLD:
+            return "feedback_repeated"
+    return ""
@@ -0,0 +1,150 @@
+"""
+Event Log Component
+------------------
+This component implements the structured, asynchronous run log. Components
+enqueue events to an in-memory queue and return immediately; a background
+writer thread batches them into one append-only `events.jsonl` file per run.
+Large bodies (drafts, HTML) are stored once in the content-addressed artifact
+store and referenced from the events by their store path.
+"""
+
+import os
+import json
+import queue
+import atexit
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Union
+
+from components import artifact_store
+
+LOGS_DIR = "logs"
+EVENTS_FILE = "events.jsonl"
+
+# Maximum number of events written per batch, and how long the writer waits
+# for more events before flushing a partial batch
+BATCH_SIZE = 256
+FLUSH_INTERVAL = 0.2
+
+Body = Union[str, bytes]
+
+class EventLog:
+    """Background writer for structured run events."""
+
+    def __init__(self, logs_dir: str = LOGS_DIR):
+        self.logs_dir = logs_dir
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, run_id: str, component: str, event: str, data: Dict[str, Any] = None,
+             bodies: Dict[str, Body] = None):
+        """Enqueue an event without blocking.
+
+        ``bodies`` maps a file name (e.g. "content.md") to large text or binary
+        payloads; they are hashed and stored by the writer thread.
+        """
+        self._queue.put({
+            "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+            "run_id": run_id or "unknown",
+            "component": component,
+            "event": event,
+            "data": data or {},
+            "bodies": bodies or {}
+        })
+
+    def flush(self, timeout: float = None):
+        """Block until every event enqueued so far has been written."""
+        done = threading.Event()
+        self._queue.put({"flush": done})
+        done.wait(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < BATCH_SIZE:
+                    batch.append(self._queue.get(timeout=FLUSH_INTERVAL))
+            except queue.Empty:
+                pass
+
+            flushes = [item["flush"] for item in batch if "flush" in item]
+            events = [item for item in batch if "flush" not in item]
+            try:
+                self._write(events)
+            except Exception as e:
+                # Logging must never take the pipeline down
+                print(f"Could not write events: {e}")
+            for done in flushes:
+                done.set()
+
+    def _write(self, events: List[Dict[str, Any]]):
+        """Write a batch of events, one append per run.
+
+        Events are serialized one by one, with values JSON cannot represent
+        written as strings, so a bad event only loses itself.
+        """
+        lines: Dict[str, List[str]] = {}
+        for event in events:
+            try:
+                run_dir = os.path.join(self.logs_dir, event["run_id"])
+                bodies = event.pop("bodies")
+                if bodies:
+                    event["bodies"] = {name: self._store_body(name, body) for name, body in bodies.items()}
+                line = json.dumps(event, ensure_ascii=False, default=str)
+            except Exception as e:
+                print(f"Could not write {event.get('event')} event: {e}")
+                continue
+            lines.setdefault(run_dir, []).append(line)
+
+        for run_dir, run_lines in lines.items():
+            os.makedirs(run_dir, exist_ok=True)
+            with open(os.path.join(run_dir, EVENTS_FILE), "a", encoding="utf-8") as f:
+                f.write("\n".join(run_lines) + "\n")
+
+    def _store_body(self, name: str, body: Body) -> str:
+        """Store a body in the artifact store and return its store path."""
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        return artifact_store.put_bytes(data, os.path.splitext(name)[1])
+
+_event_log: Optional[EventLog] = None
+_event_log_lock = threading.Lock()
+
+def get_event_log() -> EventLog:
+    """Return the process-wide event log, starting its writer thread on first use."""
+    global _event_log
+    if _event_log is None:
+        with _event_log_lock:
+            if _event_log is None:
+                _event_log = EventLog()
+                atexit.register(_event_log.flush, 10)
+    return _event_log
+
+def emit(run_id: str, component: str, event: str, data: Dict[str, Any] = None,
+         bodies: Dict[str, Body] = None):
+    """Enqueue an event on the process-wide event log."""
+    get_event_log().emit(run_id, component, event, data, bodies)
+
+def flush(timeout: float = None):
+    """Wait until all events enqueued so far are on disk."""
+    if _event_log is not None:
+        _event_log.flush(timeout)
+
+def read_events(run_id: str, logs_dir: str = LOGS_DIR) -> List[Dict[str, Any]]:
+    """Read all events recorded for a run."""
+    path = os.path.join(logs_dir, run_id, EVENTS_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def body_path(event: Dict[str, Any], name: str) -> Optional[str]:
+    """Return the artifact store path of a body referenced by an event."""
+    return event.get("bodies", {}).get(name)
+
+def read_body(event: Dict[str, Any], name: str) -> Optional[bytes]:
+    """Load a body referenced by an event."""
+    path = body_path(event, name)
+    if not path:
+        return None
+    return artifact_store.read_bytes(path)
@@ -0,0 +1,135 @@
+"""
+Extractors Component
+-------------------
+This component turns scraped source pages into dense, LLM-ready text. A
+registry maps each source host to an extractor that parses only the parts of
+the page it needs (story rows, post titles, article headings) and returns one
+item per line, instead of dumping the text of the whole page. Parsing uses
+lxml when it is installed and falls back to Python's built-in parser.
+BeautifulSoup is imported on the first parse.
+"""
+
+from importlib.util import find_spec
+from urllib.parse import urlparse
+from typing import TYPE_CHECKING, Callable, Dict, List
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+PARSER = "lxml" if find_spec("lxml") else "html.parser"
+
+# Maximum number of characters of extracted text per page
+MAX_TEXT_LENGTH = 10000
+
+Extractor = Callable[[str], List[str]]
+
+EXTRACTORS: Dict[str, Extractor] = {}
+
+def register_extractor(*hosts: str):
+    """Register a function as the extractor for the given hosts."""
+    def decorator(extractor: Extractor) -> Extractor:
+        for host in hosts:
+            EXTRACTORS[host.lower()] = extractor
+        return extractor
+    return decorator
+
+def parse(html: str, *names, **attrs) -> "BeautifulSoup":
+    """Parse HTML with the fastest available backend.
+
+    If tag names or attributes are given, only the matching tags are kept.
+    """
+    from bs4 import BeautifulSoup, SoupStrainer
+    strainer = SoupStrainer(*names, **attrs) if names or attrs else None
+    return BeautifulSoup(html, PARSER, parse_only=strainer)
+
+@register_extractor("news.ycombinator.com")
+def extract_hacker_news(html: str) -> List[str]:
+    """Story titles with their scores from the Hacker News front page."""
+    soup = parse(html, "span", class_=["titleline", "score"])
+    items = []
+    for span in soup.find_all("span"):
+        classes = span.get("class", [])
+        if "titleline" in classes:
+            link = span.find("a")
+            if link:
+                items.append(link.get_text(" ", strip=True))
+        elif "score" in classes and items:
+            # The score row follows its story row
+            items[-1] = f"{items[-1]} ({span.get_text(strip=True)})"
+    return items
+
+@register_extractor("www.reddit.com", "old.reddit.com", "reddit.com")
+def extract_reddit(html: str) -> List[str]:
+    """Post titles with their scores from a subreddit listing."""
+    soup = parse(html, "shreddit-post")
+    items = []
+    for post in soup.find_all("shreddit-post"):
+        title = " ".join(post.get("post-title", "").split())
+        if not title:
+            continue
+        score = post.get("score")
+        items.append(f"{title} ({score} points)" if score else title)
+    if items:
+        return items
+
+    # Old Reddit markup
+    soup = parse(html, "a", class_="title")
+    return [link.get_text(" ", strip=True) for link in soup.find_all("a")]
+
+@register_extractor("venturebeat.com", "techcrunch.com")
+def extract_article_headings(html: str) -> List[str]:
+    """Article headlines from a news category page."""
+    soup = parse(html, ["h2", "h3"])
+    return [heading.get_text(" ", strip=True) for heading in soup.find_all(["h2", "h3"])]
+
+def extract_page_text(html: str) -> List[str]:
+    """Fallback for unknown hosts: the visible text of the whole page."""
+    soup = parse(html)
+    for tag in soup(["script", "style", "noscript", "nav", "footer", "svg"]):
+        tag.decompose()
+    return [" ".join(soup.get_text(" ").split())]
+
+def get_extractor(url: str) -> Extractor:
+    """Return the extractor registered for the host of a URL."""
+    host = urlparse(url).netloc.lower()
+    if host.startswith("www.") and host not in EXTRACTORS:
+        host = host[4:]
+    return EXTRACTORS.get(host, extract_page_text)
+
+def host_items(html: str, url: str) -> List[str]:
+    """Items found by the extractor registered for the URL's host, without the
+    page-text fallback; empty for hosts without an extractor."""
+    extractor = get_extractor(url)
+    if extractor is extract_page_text:
+        return []
+    try:
+        return extractor(html) or []
+    except Exception:
+        return []
+
+def format_items(items: List[str]) -> str:
+    """Join extracted items one per line, dropping duplicates (e.g. the same
+    headline in a hero card and a list)."""
+    seen = set()
+    lines = []
+    for item in items:
+        if item and item not in seen:
+            seen.add(item)
+            lines.append(item)
+    return "\n".join(lines)[:MAX_TEXT_LENGTH]
+
+def extract_items(html: str, url: str = "") -> str:
+    """Extract the relevant items of a page, one per line.
+
+    Falls back to the page text if the host's extractor finds nothing, e.g.
+    after a site redesign.
+    """
+    extractor = get_extractor(url)
+    items: List[str] = []
+    try:
+        items = extractor(html)
+    except Exception as e:
+        print(f"Error extracting {url}: {e}")
+    if not items and extractor is not extract_page_text:
+        items = extract_page_text(html)
+    return format_items(items)
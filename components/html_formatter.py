@@ -5,202 +5,135 @@ This component formats the final content into an HTML page.
 """
 
 import os
-import markdown
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 import re
+import threading
+from string import Template
 from datetime import datetime
-import json
 
-def log_html_creation(state: Dict[str, Any], title: str, html_content: str, output_path: str = None):
-    """Log the HTML creation process."""
-    run_id = state.get("run_id", datetime.now().strftime("%Y%m%d_%H%M%S"))
-    component_dir = os.path.join("logs", run_id, "html_formatter")
-    os.makedirs(component_dir, exist_ok=True)
-    
-    # Log the HTML creation
-    log_file = os.path.join(component_dir, "output.txt")
-    with open(log_file, "w") as f:
-        f.write(f"===== {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} =====\n")
-        f.write(f"Generated HTML for: {title}\n\n")
-        
-        # Log the image path used
-        f.write(f"Image path: {state.get('image_url', '')}\n")
-        
-        if output_path:
-            f.write(f"Output path: {output_path}\n")
-        
-        # Add a preview of the HTML
-        f.write("\nHTML preview:\n")
-        f.write("---\n")
-        html_preview = html_content[:500] + "..." if len(html_content) > 500 else html_content
-        f.write(html_preview)
-        f.write("\n---\n\n")
-        
-        # Add state summary
-        f.write("State summary:\n")
-        summary = {
-            "title": title,
-            "html_length": len(html_content),
-            "image_path": state.get("image_url", ""),
-            "run_id": run_id
-        }
-        f.write(json.dumps(summary, indent=2))
-        f.write("\n\n")
-    
-    # Save a copy of the HTML file
-    html_file = os.path.join(component_dir, "output.html")
-    with open(html_file, "w", encoding="utf-8") as f:
-        f.write(html_content)
+from components import event_log
+from components.image_generation import get_derivatives, aget_derivatives
 
-def create_html_page(state: Dict[str, Any]) -> Dict[str, Any]:
-    """Format the content into an HTML page and update the agent state."""
-    content = state["current_content"]
-    image_path = state["image_url"]
-    
-    print("Creating HTML page...")
-    
-    # Extract title from the content (assuming it's the first line)
-    title_match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
-    if title_match:
-        title = title_match.group(1)
-    else:
-        title = state["selected_topic"]
-    
-    # Convert Markdown to HTML
-    html_body = markdown.markdown(content, extensions=['extra', 'toc'])
-    
-    # Determine relative path for image
-    if os.path.exists(image_path):
-        # If the image path is relative to the current directory,
-        # adjust it to be relative to the output HTML file
-        rel_image_path = os.path.relpath(image_path, "output")
-    else:
-        # If the image doesn't exist (placeholder), use a placeholder URL
-        rel_image_path = "https://placehold.co/600x400?text=AI+Blog+Image"
-    
-    # Get current date
-    current_date = datetime.now().strftime("%B %d, %Y")
-    
-    # Create HTML template
-    html_template = f"""<!DOCTYPE html>
+# The page template is parsed once at import; rendering only joins its parts
+PAGE_TEMPLATE = """<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title}</title>
+    <title>$title</title>
     <style>
-        :root {{
+        :root {
             --primary-color: #3498db;
             --secondary-color: #2c3e50;
             --text-color: #333;
             --background-color: #f5f5f5;
             --content-background: #ffffff;
-        }}
+        }
         
-        body {{
+        body {
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
             line-height: 1.6;
             color: var(--text-color);
             background-color: var(--background-color);
             margin: 0;
             padding: 0;
-        }}
+        }
         
-        .container {{
+        .container {
             max-width: 800px;
             margin: 0 auto;
             padding: 20px;
             background-color: var(--content-background);
             box-shadow: 0 0 10px rgba(0, 0, 0, 0.1);
-        }}
+        }
         
-        header {{
+        header {
             text-align: center;
             margin-bottom: 30px;
             padding: 20px 0;
             border-bottom: 1px solid #eee;
-        }}
+        }
         
-        h1 {{
+        h1 {
             color: var(--secondary-color);
             margin-bottom: 10px;
             font-size: 2.2em;
-        }}
+        }
         
-        .date {{
+        .date {
             color: #666;
             font-style: italic;
             margin-bottom: 20px;
-        }}
+        }
         
-        .featured-image {{
+        .featured-image {
             width: 100%;
             height: auto;
             max-height: 400px;
             object-fit: cover;
             margin-bottom: 30px;
             border-radius: 5px;
-        }}
+        }
         
-        h2 {{
+        h2 {
             color: var(--primary-color);
             margin-top: 30px;
             border-bottom: 1px solid #eee;
             padding-bottom: 10px;
             font-size: 1.8em;
-        }}
+        }
         
-        h3 {{
+        h3 {
             color: var(--secondary-color);
             margin-top: 25px;
             font-size: 1.4em;
-        }}
+        }
         
-        p {{
+        p {
             margin-bottom: 20px;
-        }}
+        }
         
-        blockquote {{
+        blockquote {
             border-left: 4px solid var(--primary-color);
             padding-left: 15px;
             margin-left: 0;
             color: #555;
-        }}
+        }
         
-        code {{
+        code {
             background-color: #f0f0f0;
             padding: 2px 5px;
             border-radius: 3px;
             font-family: 'Courier New', Courier, monospace;
-        }}
+        }
         
-        pre {{
+        pre {
             background-color: #f0f0f0;
             padding: 15px;
             border-radius: 5px;
             overflow-x: auto;
-        }}
+        }
         
-        footer {{
+        footer {
             text-align: center;
             margin-top: 50px;
             padding-top: 20px;
             border-top: 1px solid #eee;
             color: #777;
-        }}
+        }
     </style>
 </head>
 <body>
     <div class="container">
         <header>
-            <h1>{title}</h1>
-            <div class="date">Published on {current_date}</div>
+            <h1>$title</h1>
+            <div class="date">Published on $current_date</div>
         </header>
         
-        <img src="{rel_image_path}" alt="Featured Image for {title}" class="featured-image">
+        $featured_image
         
         <article>
-            {html_body}
+            $html_body
         </article>
         
         <footer>
@@ -210,9 +143,149 @@ def create_html_page(state: Dict[str, Any]) -> Dict[str, Any]:
 </body>
 </html>
 """
+
+class PageTemplate:
+    """A string.Template-style template split into static parts once."""
+
+    def __init__(self, text: str):
+        self.parts: List[str] = []
+        self.names: List[str] = []
+        static: List[str] = []
+        position = 0
+        for match in Template.pattern.finditer(text):
+            static.append(text[position:match.start()])
+            position = match.end()
+            name = match.group("named") or match.group("braced")
+            if name is None:
+                # "$$" stands for a literal dollar sign
+                static.append("$")
+                continue
+            self.parts.append("".join(static))
+            self.names.append(name)
+            static = []
+        static.append(text[position:])
+        self.parts.append("".join(static))
+
+    def render(self, **values: str) -> str:
+        pieces = [self.parts[0]]
+        for name, part in zip(self.names, self.parts[1:]):
+            pieces.append(values[name])
+            pieces.append(part)
+        return "".join(pieces)
+
+_page_template = PageTemplate(PAGE_TEMPLATE)
+_converters = threading.local()
+
+def markdown_to_html(content: str) -> str:
+    """Convert Markdown to HTML with a per-thread converter that is reset
+    between documents instead of being rebuilt for each one."""
+    converter = getattr(_converters, "markdown", None)
+    if converter is None:
+        import markdown
+        converter = _converters.markdown = markdown.Markdown(extensions=['extra', 'toc'])
+    return converter.reset().convert(content)
+
+# Displayed width of the featured image, for the browser to pick a derivative
+IMAGE_SIZES = "(max-width: 800px) 100vw, 800px"
+
+def featured_image(title: str, image_src: str, derivatives: Dict[str, List[Tuple[str, int]]] = None) -> str:
+    """Markup of the featured image, with responsive WebP/JPEG sources if available."""
+    alt = f"Featured Image for {title}"
+    if not derivatives or not derivatives.get("jpg"):
+        return f'<img src="{image_src}" alt="{alt}" class="featured-image">'
+    
+    def srcset(entries: List[Tuple[str, int]]) -> str:
+        return ", ".join(f"{src} {width}w" for src, width in entries)
+    
+    jpeg = derivatives["jpg"]
+    lines = ["<picture>"]
+    if derivatives.get("webp"):
+        lines.append(f'            <source type="image/webp" srcset="{srcset(derivatives["webp"])}" sizes="{IMAGE_SIZES}">')
+    lines.append(f'            <img src="{jpeg[-1][0]}" srcset="{srcset(jpeg)}" sizes="{IMAGE_SIZES}" '
+                 f'alt="{alt}" class="featured-image">')
+    lines.append("        </picture>")
+    return "\n".join(lines)
+
+def render_page(content: str, title: str, image_src: str, current_date: str,
+                derivatives: Dict[str, List[Tuple[str, int]]] = None) -> str:
+    """Render a Markdown post into a complete HTML page.
+
+    ``derivatives`` maps "webp"/"jpg" to (src, width) pairs of resized copies
+    of the image, already relative to the page.
+    """
+    return _page_template.render(
+        title=title,
+        current_date=current_date,
+        featured_image=featured_image(title, image_src, derivatives),
+        html_body=markdown_to_html(content)
+    )
+
+def log_html_creation(state: Dict[str, Any], title: str, html_content: str, output_path: str = None):
+    """Log the HTML creation process."""
+    run_id = state.get("run_id", datetime.now().strftime("%Y%m%d_%H%M%S"))
+    # The HTML body is stored once per run even if it is logged again with its output path
+    event_log.emit(run_id, "html_formatter", "html_created", {
+        "title": title,
+        "image_path": state.get("image_url", ""),
+        "output_path": output_path,
+        "html_length": len(html_content)
+    }, bodies={"output.html": html_content})
+
+def html_result(state: Dict[str, Any], derivatives: Dict[str, List[Tuple[str, int]]]) -> Dict[str, Any]:
+    """Render the page, given the image's derivatives, and update the agent state."""
+    content = state["current_content"]
+    image_path = state["image_url"]
+    
+    # Extract title from the content (assuming it's the first line)
+    title_match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
+    if title_match:
+        title = title_match.group(1)
+    else:
+        title = state["selected_topic"]
+    
+    # Determine relative path for image
+    if os.path.exists(image_path):
+        # If the image path is relative to the current directory,
+        # adjust it to be relative to the output HTML file
+        rel_image_path = os.path.relpath(image_path, "output")
+        derivatives = {
+            image_format: [(os.path.relpath(path, "output"), width) for path, width in entries]
+            for image_format, entries in derivatives.items()
+        }
+    else:
+        # If the image doesn't exist (placeholder), use a placeholder URL
+        rel_image_path = "https://placehold.co/600x400?text=AI+Blog+Image"
+        derivatives = {}
+    
+    # Get current date
+    current_date = datetime.now().strftime("%B %d, %Y")
+    
+    # Convert Markdown to HTML and fill in the page template
+    html_template = render_page(content, title, rel_image_path, current_date, derivatives)
     
     # Log the HTML creation
     log_html_creation(state, title, html_template)
     
     # Update the state with the HTML content
-    return {**state, "html_content": html_template}
\ No newline at end of file
+    return {**state, "html_content": html_template}
+
+def create_html_page(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Format the content into an HTML page and update the agent state."""
+    image_path = state["image_url"]
+    
+    print("Creating HTML page...")
+    
+    # Smaller copies are built in the background after the image is generated
+    derivatives = get_derivatives(image_path) if os.path.exists(image_path) else {}
+    
+    return html_result(state, derivatives)
+
+async def acreate_html_page(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Async variant of create_html_page."""
+    image_path = state["image_url"]
+    
+    print("Creating HTML page...")
+    
+    derivatives = await aget_derivatives(image_path) if os.path.exists(image_path) else {}
+    
+    return html_result(state, derivatives)
@@ -4,36 +4,19 @@ Human Selection Component
 This component implements the human-in-the-loop mechanism for topic selection.
 """
 
-from typing import Dict, List, Any
-import os
-import json
+from typing import Dict, Any
 from datetime import datetime
 
+from components import event_log
+from components.topic_index import get_topic_index
+
 def log_selection(state: Dict[str, Any], selected_topic: str):
     """Log the topic selection."""
     run_id = state.get("run_id", datetime.now().strftime("%Y%m%d_%H%M%S"))
-    component_dir = os.path.join("logs", run_id, "human_selection")
-    os.makedirs(component_dir, exist_ok=True)
-    
-    # Log the selected topic
-    log_file = os.path.join(component_dir, "output.txt")
-    with open(log_file, "w") as f:
-        f.write(f"===== {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} =====\n")
-        f.write("Input topics:\n")
-        for i, topic in enumerate(state.get("trending_topics", []), 1):
-            f.write(f"{i}. {topic}\n")
-        f.write("\n")
-        f.write(f"Selected topic: {selected_topic}\n\n")
-        
-        # Add state summary
-        f.write("State summary:\n")
-        summary = {
-            "trending_topics": state.get("trending_topics", []),
-            "selected_topic": selected_topic,
-            "run_id": run_id
-        }
-        f.write(json.dumps(summary, indent=2))
-        f.write("\n\n")
+    event_log.emit(run_id, "human_selection", "topic_selected", {
+        "trending_topics": state.get("trending_topics", []),
+        "selected_topic": selected_topic
+    })
 
 def get_human_selection(state: Dict[str, Any]) -> Dict[str, Any]:
     """Get human selection of a topic and update the agent state."""
@@ -49,10 +32,16 @@ def get_human_selection(state: Dict[str, Any]) -> Dict[str, Any]:
         
         return {**state, "selected_topic": selected_topic}
     
-    # Display the trending topics to the user
+    # Display the trending topics to the user, flagging those covered before
+    index = get_topic_index()
+    covered = index.covered(trending_topics) if index else {}
     print("\nTrending AI Topics:")
     for i, topic in enumerate(trending_topics, 1):
-        print(f"{i}. {topic}")
+        if topic in covered:
+            match = covered[topic]
+            print(f"{i}. {topic}  [already covered in run {match['run_id']}: {match['topic']}]")
+        else:
+            print(f"{i}. {topic}")
     
     # Get user selection
     while True:
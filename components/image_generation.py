@@ -4,66 +4,74 @@ Image Generation Component
 This component generates an appropriate image for the blog post using Lepton's SDXL API.
 """
 
+import io
 import os
-import uuid
-from typing import Dict, Any
-import openai
-from leptonai.client import Client
+import asyncio
+import re
 import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from importlib.util import find_spec
+from typing import Dict, Any, List, Tuple
 from datetime import datetime
-import shutil
+
+# Pillow is optional; it is imported when the first derivatives are built
+HAS_PILLOW = find_spec("PIL") is not None
+
+from components.llm_client import chat_completion, achat_completion, get_sdxl_client, get_async_sdxl_client, SDXL_URL
+from components.call_policy import call_with_policy, acall_with_policy
+from components.rate_limiter import limited, alimited
+from components.convergence import content_similarity
+from components.prompt_builder import truncate_to_tokens, remaining_budget
+from components import metrics
+from components import event_log
+from components import artifact_store
+
+# Generate the image from the initial draft, in parallel with refinement
+IMAGE_PARALLEL = os.getenv("IMAGE_PARALLEL", "1") != "0"
+# Regenerate the image at the join if the title/introduction the image was based
+# on is less similar than this to the refined one (0 disables regeneration)
+IMAGE_REFRESH_THRESHOLD = float(os.getenv("IMAGE_REFRESH_THRESHOLD", "0.3"))
+
+# Renders are cached by a stable hash of the prompt, seed and SDXL parameters.
+# The seed is derived from the prompt unless IMAGE_SEED is set, so identical
+# prompts reuse the same render instead of paying for a new one.
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE", "1") != "0"
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join("cache", "images"))
+IMAGE_SEED = os.getenv("IMAGE_SEED")
+IMAGES_DIR = os.path.join("output", "images")
+
+SDXL_PARAMS = {
+    "height": 1024,
+    "width": 1024,
+    "guidance_scale": 7.5,  # Increased for better prompt adherence
+    "high_noise_frac": 0.8,
+    "steps": 30,
+    "use_refiner": True  # Enable refiner for better quality
+}
+
+# Smaller WebP/JPEG copies for responsive pages, built off-thread with Pillow
+IMAGE_DERIVATIVE_WIDTHS = [int(width) for width in os.getenv("IMAGE_DERIVATIVE_WIDTHS", "480,768,1024").split(",")]
+IMAGE_DERIVATIVE_QUALITY = int(os.getenv("IMAGE_DERIVATIVE_QUALITY", "80"))
+DERIVATIVE_FORMATS = [("WEBP", ".webp"), ("JPEG", ".jpg")]
+
+_derivative_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-derivatives")
+_derivative_futures: Dict[str, Future] = {}
+_derivative_lock = threading.Lock()
 
 def log_image_generation(state: Dict[str, Any], image_prompt: str, image_path: str):
     """Log the image generation process."""
     run_id = state.get("run_id", datetime.now().strftime("%Y%m%d_%H%M%S"))
-    component_dir = os.path.join("logs", run_id, "image_generation")
-    os.makedirs(component_dir, exist_ok=True)
-    
-    # Log the image prompt and path
-    log_file = os.path.join(component_dir, "output.txt")
-    with open(log_file, "w") as f:
-        f.write(f"===== {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} =====\n")
-        f.write(f"Topic: {state.get('selected_topic', '')}\n\n")
-        
-        # Log the prompt
-        f.write("Image generation prompt:\n")
-        f.write(f"\"{image_prompt}\"\n\n")
-        
-        # Log the image path
-        f.write(f"Generated image saved to: {image_path}\n\n")
-        
-        # Add state summary
-        f.write("State summary:\n")
-        summary = {
-            "selected_topic": state.get("selected_topic", ""),
-            "image_path": image_path,
-            "prompt_length": len(image_prompt),
-            "run_id": run_id
-        }
-        f.write(json.dumps(summary, indent=2))
-        f.write("\n\n")
-    
-    # Save the prompt to a separate file
-    prompt_file = os.path.join(component_dir, "image_prompt.txt")
-    with open(prompt_file, "w") as f:
-        f.write(image_prompt)
-    
-    # If image exists, copy it to the logs directory
-    if os.path.exists(image_path):
-        try:
-            image_filename = os.path.basename(image_path)
-            log_image_path = os.path.join(component_dir, image_filename)
-            shutil.copy2(image_path, log_image_path)
-        except Exception as e:
-            print(f"Could not copy image to logs: {e}")
-
-def generate_image_prompt(content: str, topic: str) -> str:
-    """Generate a prompt for image generation based on the content."""
-    client = openai.OpenAI(
-        base_url="https://llama3-3-70b.lepton.run/api/v1/",
-        api_key=os.getenv("LEPTON_API_KEY")
-    )
-    
+    event_log.emit(run_id, "image_generation", "image_generated", {
+        "selected_topic": state.get("selected_topic", ""),
+        "image_prompt": image_prompt,
+        "image_path": image_path
+    })
+
+def image_prompt_request(content: str, topic: str, run_id: str = None) -> Dict[str, Any]:
+    """Arguments of the LLM call that writes the image prompt."""
     system_message = """
     You are an expert in creating prompts for AI image generation systems like Stable Diffusion.
     
@@ -80,35 +88,38 @@ def generate_image_prompt(content: str, topic: str) -> str:
     The prompt should be 1-3 sentences.
     """
     
-    user_message = f"""
+    user_template = """
     Blog post topic: {topic}
     
     Blog post content (excerpt):
     ```
-    {content[:2000]}  
+    {excerpt}
     ```
     
     Create an image generation prompt for this article.
     """
     
-    try:
-        response = client.chat.completions.create(
-            model="llama3.3-70b",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message}
-            ],
-            max_tokens=200,
-            temperature=0.7
-        )
-        
-        # Clean up the prompt
-        image_prompt = response.choices[0].message.content.strip().strip('"').strip()
-        
-    except Exception as e:
-        print(f"Error generating image prompt: {e}")
-        # Fallback prompt
-        image_prompt = f"Highly detailed digital illustration of {topic}, futuristic, technology concept, blue background, high quality"
+    # Use as much of the post as the stage's token budget allows
+    excerpt_budget = remaining_budget("image_prompt", system_message, user_template.format(topic=topic, excerpt=""))
+    user_message = user_template.format(topic=topic, excerpt=truncate_to_tokens(content, excerpt_budget))
+    
+    return {
+        "messages": [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_message}
+        ],
+        "max_tokens": 200,
+        "temperature": 0.7,
+        "stage": "image_prompt",
+        "run_id": run_id
+    }
+
+def fallback_image_prompt(topic: str) -> str:
+    return f"Highly detailed digital illustration of {topic}, futuristic, technology concept, blue background, high quality"
+
+def clean_image_prompt(response: str) -> str:
+    """Clean up a generated prompt and add style keywords if needed."""
+    image_prompt = response.strip().strip('"').strip()
     
     # Add some style keywords if needed
     if "digital art" not in image_prompt.lower() and "illustration" not in image_prompt.lower():
@@ -116,54 +127,244 @@ def generate_image_prompt(content: str, topic: str) -> str:
     
     return image_prompt
 
-def generate_image_lepton_sdxl(prompt: str) -> str:
-    """Generate an image using Lepton's SDXL API and return the path to the saved image."""
+def generate_image_prompt(content: str, topic: str, run_id: str = None) -> str:
+    """Generate a prompt for image generation based on the content."""
     try:
-        # Initialize Lepton client
-        api_token = os.getenv("LEPTON_API_KEY")
-        client = Client("https://sdxl.lepton.run", token=api_token)
-        
-        # Generate image with SDXL
-        image_data = client.run(
-            prompt=prompt,
-            height=1024,
-            width=1024,
-            guidance_scale=7.5,  # Increased for better prompt adherence
-            high_noise_frac=0.8,
-            seed=uuid.uuid4().int % (2**32),  # Random seed
-            steps=30,
-            use_refiner=True  # Enable refiner for better quality
-        )
-        
-        # Create output directory if it doesn't exist
-        os.makedirs("output/images", exist_ok=True)
-        
-        # Save the image
-        image_path = f"output/images/blog_image_{hash(prompt) % 10000}.png"
-        with open(image_path, 'wb') as f:
-            f.write(image_data)
-        
-        print(f"Image saved to {image_path}")
-        return image_path
-        
+        return clean_image_prompt(chat_completion(**image_prompt_request(content, topic, run_id)))
     except Exception as e:
-        print(f"Error generating image with Lepton SDXL: {e}")
+        print(f"Error generating image prompt: {e}")
+        return clean_image_prompt(fallback_image_prompt(topic))
+
+async def agenerate_image_prompt(content: str, topic: str, run_id: str = None) -> str:
+    """Async variant of generate_image_prompt."""
+    try:
+        return clean_image_prompt(await achat_completion(**image_prompt_request(content, topic, run_id)))
+    except Exception as e:
+        print(f"Error generating image prompt: {e}")
+        return clean_image_prompt(fallback_image_prompt(topic))
+
+def image_seed(prompt: str) -> int:
+    """Return the SDXL seed for a prompt: IMAGE_SEED if set, else derived from the prompt."""
+    if IMAGE_SEED:
+        return int(IMAGE_SEED)
+    return int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+
+def image_cache_key(prompt: str, seed: int) -> str:
+    """Stable hash of everything that determines a render."""
+    payload = json.dumps({"endpoint": SDXL_URL, "prompt": prompt, "seed": seed, **SDXL_PARAMS}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _cache_entry_path(key: str) -> str:
+    return os.path.join(IMAGE_CACHE_DIR, f"{key}.json")
+
+def load_cached_image(key: str) -> str:
+    """Return the artifact store path of a cached render, or an empty string."""
+    if not IMAGE_CACHE_ENABLED:
         return ""
+    try:
+        with open(_cache_entry_path(key), "r") as f:
+            store_path = json.load(f)["image"]
+    except (OSError, ValueError, KeyError):
+        return ""
+    return store_path if os.path.exists(store_path) else ""
 
-def generate_image(state: Dict[str, Any]) -> Dict[str, Any]:
-    """Generate an image for the blog post and update the agent state."""
-    content = state["current_content"]
-    topic = state["selected_topic"]
+def save_cached_image(key: str, store_path: str, prompt: str, seed: int):
+    """Record a render in the image cache."""
+    if not IMAGE_CACHE_ENABLED:
+        return
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    path = _cache_entry_path(key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"image": store_path, "prompt": prompt, "seed": seed, "params": SDXL_PARAMS}, f)
+    os.replace(tmp_path, path)
+
+def make_derivatives(image_path: str) -> Dict[str, List[Tuple[str, int]]]:
+    """Write resized WebP and JPEG copies next to an image.
+
+    Returns the written paths and widths per format; empty if Pillow is not
+    installed. Encoded copies are kept in the artifact store, indexed by the
+    hash of the source image, so they are only ever encoded once.
+    """
+    if not HAS_PILLOW or not os.path.exists(image_path):
+        return {}
+    from PIL import Image
     
-    print("Generating image for the blog post...")
+    source = artifact_store.put_file(image_path)
+    index_path = os.path.join(IMAGE_CACHE_DIR, f"{artifact_store.digest_of(source)}.derivatives.json")
+    try:
+        with open(index_path, "r") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        stored = {}
     
-    # Generate a prompt for the image
-    image_prompt = generate_image_prompt(content, topic)
-    print(f"Image generation prompt: {image_prompt}")
+    derivatives: Dict[str, List[Tuple[str, int]]] = {}
+    base = os.path.splitext(image_path)[0]
+    image = None
+    changed = False
+    for width in IMAGE_DERIVATIVE_WIDTHS:
+        for image_format, extension in DERIVATIVE_FORMATS:
+            name = f"{width}{extension}"
+            store_path = stored.get(name)
+            if not store_path or not os.path.exists(store_path):
+                if image is None:
+                    image = Image.open(source).convert("RGB")
+                if width > image.width:
+                    continue
+                resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+                buffer = io.BytesIO()
+                resized.save(buffer, image_format, quality=IMAGE_DERIVATIVE_QUALITY)
+                store_path = stored[name] = artifact_store.put_bytes(buffer.getvalue(), extension)
+                changed = True
+            dest = f"{base}-{name}"
+            artifact_store.link(store_path, dest)
+            derivatives.setdefault(extension.lstrip("."), []).append((dest, width))
     
-    # Generate image with Lepton SDXL
-    image_path = generate_image_lepton_sdxl(image_prompt)
+    if changed:
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(stored, f)
+        os.replace(tmp_path, index_path)
+    return derivatives
+
+def schedule_derivatives(image_path: str):
+    """Start building an image's derivatives in the background."""
+    if not HAS_PILLOW:
+        return
+    with _derivative_lock:
+        _derivative_futures[image_path] = _derivative_executor.submit(make_derivatives, image_path)
+
+def get_derivatives(image_path: str, timeout: float = 60) -> Dict[str, List[Tuple[str, int]]]:
+    """Wait for an image's derivatives, building them now if none were scheduled
+    in this process (e.g. for a resumed run)."""
+    with _derivative_lock:
+        future = _derivative_futures.pop(image_path, None)
+    try:
+        if future is not None:
+            return future.result(timeout=timeout)
+        return make_derivatives(image_path)
+    except Exception as e:
+        print(f"Error creating image derivatives: {e}")
+        return {}
+
+async def aget_derivatives(image_path: str, timeout: float = 60) -> Dict[str, List[Tuple[str, int]]]:
+    """Async variant of get_derivatives; the encoding stays on the worker threads."""
+    with _derivative_lock:
+        future = _derivative_futures.pop(image_path, None)
+    try:
+        if future is None:
+            future = _derivative_executor.submit(make_derivatives, image_path)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    except Exception as e:
+        print(f"Error creating image derivatives: {e}")
+        return {}
+
+def render_target(prompt: str) -> Tuple[int, str, str]:
+    """Seed, cache key and output path of the render of a prompt."""
+    seed = image_seed(prompt)
+    key = image_cache_key(prompt, seed)
+    return seed, key, os.path.join(IMAGES_DIR, f"blog_image_{key[:16]}.png")
+
+def reuse_cached_render(key: str, image_path: str, run_id: str, started: float) -> bool:
+    """Link a cached render to ``image_path`` if there is one."""
+    store_path = load_cached_image(key)
+    if not store_path:
+        return False
+    artifact_store.link(store_path, image_path)
+    metrics.record(run_id, "sdxl", "generate_image", time.monotonic() - started, cached=True)
+    print(f"Reusing cached image {image_path}")
+    schedule_derivatives(image_path)
+    return True
+
+def save_render(image_data: bytes, prompt: str, seed: int, key: str, image_path: str,
+                run_id: str, started: float, stats: Dict[str, Any]) -> str:
+    """Record the metrics of a render and save it; returns the image path."""
+    metrics.record(run_id, "sdxl", "generate_image", time.monotonic() - started,
+                   retries=stats["retries"], hedged=stats["hedged"], rate_wait=stats["rate_wait"],
+                   bytes_transferred=len(prompt.encode("utf-8")) + len(image_data))
+    
+    # Save the image in the artifact store and link it into the output directory
+    store_path = artifact_store.put_bytes(image_data, ".png")
+    artifact_store.link(store_path, image_path)
+    save_cached_image(key, store_path, prompt, seed)
+    
+    print(f"Image saved to {image_path}")
+    schedule_derivatives(image_path)
+    return image_path
+
+def render_failed(error: Exception, run_id: str, started: float, stats: Dict[str, Any]) -> str:
+    print(f"Error generating image with Lepton SDXL: {error}")
+    metrics.record(run_id, "sdxl", "generate_image", time.monotonic() - started, ok=False,
+                   retries=stats["retries"], hedged=stats["hedged"], rate_wait=stats["rate_wait"])
+    return ""
+
+def sdxl_run_url() -> str:
+    """The deployment's /run endpoint, which the Lepton client calls for ``client.run``."""
+    return f"{SDXL_URL.rstrip('/')}/run"
+
+def generate_image_lepton_sdxl(prompt: str, run_id: str = None) -> str:
+    """Generate an image using Lepton's SDXL API and return the path to the saved image.
+
+    Renders are reused from the image cache when the same prompt, seed and
+    parameters were rendered before. Requests go to the deployment's /run
+    endpoint through the shared pooled client, so attempts neither rebuild a
+    client nor refetch the deployment's OpenAPI spec.
+    """
+    started = time.monotonic()
+    seed, key, image_path = render_target(prompt)
+    if reuse_cached_render(key, image_path, run_id, started):
+        return image_path
+    
+    stats = {"retries": 0, "hedged": 0, "rate_wait": 0.0}
+    
+    def attempt(timeout: float) -> bytes:
+        with limited(SDXL_URL, "sdxl", run_id, timeout=timeout, stats=stats) as permit:
+            # The request timeout bounds the attempt to the call's deadline
+            response = get_sdxl_client().post(sdxl_run_url(), json={"prompt": prompt, "seed": seed, **SDXL_PARAMS},
+                                              timeout=max(1.0, timeout - permit.waited))
+            response.raise_for_status()
+            return response.content
     
+    try:
+        # Generate image with SDXL, retrying transient failures
+        image_data = call_with_policy(attempt, SDXL_URL, "generate_image", kind="sdxl", stats=stats)
+        return save_render(image_data, prompt, seed, key, image_path, run_id, started, stats)
+    except Exception as e:
+        return render_failed(e, run_id, started, stats)
+
+async def agenerate_image_lepton_sdxl(prompt: str, run_id: str = None) -> str:
+    """Async variant of generate_image_lepton_sdxl, using the event loop's pooled client."""
+    started = time.monotonic()
+    seed, key, image_path = render_target(prompt)
+    if reuse_cached_render(key, image_path, run_id, started):
+        return image_path
+    
+    stats = {"retries": 0, "hedged": 0, "rate_wait": 0.0}
+    
+    async def attempt(timeout: float) -> bytes:
+        async with alimited(SDXL_URL, "sdxl", run_id, timeout=timeout, stats=stats) as permit:
+            response = await get_async_sdxl_client().post(
+                sdxl_run_url(), json={"prompt": prompt, "seed": seed, **SDXL_PARAMS},
+                timeout=max(1.0, timeout - permit.waited)
+            )
+            response.raise_for_status()
+            return response.content
+    
+    try:
+        image_data = await acall_with_policy(attempt, SDXL_URL, "generate_image", kind="sdxl", stats=stats)
+        return save_render(image_data, prompt, seed, key, image_path, run_id, started, stats)
+    except Exception as e:
+        return render_failed(e, run_id, started, stats)
+
+def title_and_intro(content: str, max_chars: int = 1500) -> str:
+    """Return the title and introduction of a post: everything before its second heading."""
+    headings = [match.start() for match in re.finditer(r'^#{1,6}\s', content, re.MULTILINE)]
+    end = headings[1] if len(headings) > 1 else len(content)
+    return content[:min(end, max_chars)].strip()
+
+def image_result(state: Dict[str, Any], image_prompt: str, image_path: str) -> Dict[str, Any]:
+    """Log the generated image and return the image keys of the agent state."""
     if not image_path:
         print("Failed to generate image. Using placeholder.")
         # Return placeholder image path
@@ -172,5 +373,59 @@ def generate_image(state: Dict[str, Any]) -> Dict[str, Any]:
     # Log the image generation
     log_image_generation(state, image_prompt, image_path)
     
-    # Update the state with the image path
-    return {**state, "image_url": image_path}
\ No newline at end of file
+    # Update the state with the image path. Only the image keys are returned
+    # because this node can run in parallel with the refinement loop.
+    return {
+        "image_url": image_path,
+        "image_prompt": image_prompt,
+        "image_basis": title_and_intro(state["current_content"])
+    }
+
+def generate_image(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Generate an image for the blog post and update the agent state."""
+    print("Generating image for the blog post...")
+    
+    # Generate a prompt for the image
+    image_prompt = generate_image_prompt(state["current_content"], state["selected_topic"], run_id=state.get("run_id"))
+    print(f"Image generation prompt: {image_prompt}")
+    
+    # Generate image with Lepton SDXL
+    image_path = generate_image_lepton_sdxl(image_prompt, run_id=state.get("run_id"))
+    
+    return image_result(state, image_prompt, image_path)
+
+async def agenerate_image(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Async variant of generate_image."""
+    print("Generating image for the blog post...")
+    
+    image_prompt = await agenerate_image_prompt(state["current_content"], state["selected_topic"],
+                                                run_id=state.get("run_id"))
+    print(f"Image generation prompt: {image_prompt}")
+    
+    image_path = await agenerate_image_lepton_sdxl(image_prompt, run_id=state.get("run_id"))
+    
+    return image_result(state, image_prompt, image_path)
+
+def image_is_stale(state: Dict[str, Any]) -> bool:
+    """Whether the title or introduction changed materially since the image was generated."""
+    if IMAGE_REFRESH_THRESHOLD <= 0 or not state.get("image_basis"):
+        return False
+    
+    similarity = content_similarity(state["image_basis"], title_and_intro(state["current_content"]))
+    if similarity >= IMAGE_REFRESH_THRESHOLD:
+        return False
+    
+    print(f"Title and introduction changed during refinement (similarity {similarity:.2f}), regenerating image...")
+    return True
+
+def refresh_image_if_stale(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Join point of the parallel image branch.
+
+    Regenerates the image from the refined draft only if its title or
+    introduction changed materially since the image was generated.
+    """
+    return generate_image(state) if image_is_stale(state) else {}
+
+async def arefresh_image_if_stale(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Async variant of refresh_image_if_stale."""
+    return await agenerate_image(state) if image_is_stale(state) else {}
@@ -0,0 +1,481 @@
+"""
+LLM Client Component
+-------------------
+This component holds the endpoint and model settings for the Lepton-hosted
+models and a process-wide registry of pooled API clients, so every component
+reuses warm keep-alive connections instead of building a client per call.
+Completions can be run from threads (chat_completion) or from an event loop
+(achat_completion).
+"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Any, List, Optional, Tuple
+
+from components.llm_cache import get_llm_cache, make_cache_key, cache_enabled_for
+from components.prompt_builder import estimate_prompt_tokens, budget_for
+from components.call_policy import call_with_policy, acall_with_policy, is_retryable, DeadlineExceededError
+from components.rate_limiter import limited, alimited
+from components import metrics
+from components import event_log
+
+# Endpoint and model settings, shared by every component
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://llama3-3-70b.lepton.run/api/v1/")
+LLM_MODEL = os.getenv("LLM_MODEL", "llama3.3-70b")
+SDXL_URL = os.getenv("SDXL_URL", "https://sdxl.lepton.run")
+
+# Connection pool settings
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "300"))
+
+# Stream completions token by token unless disabled
+LLM_STREAM = os.getenv("LLM_STREAM", "1") != "0"
+
+# Streamed text is flushed to partial_path every this many characters
+LLM_PARTIAL_FLUSH_CHARS = int(os.getenv("LLM_PARTIAL_FLUSH_CHARS", "2048"))
+
+# Ask for token usage in a final chunk of each stream
+STREAM_OPTIONS = {"include_usage": True}
+
+if TYPE_CHECKING:
+    import httpx
+    import openai
+
+_clients: Dict[Tuple[str, str], "openai.OpenAI"] = {}
+_clients_lock = threading.Lock()
+
+def get_llm_client(base_url: str = None) -> "openai.OpenAI":
+    """Return the shared OpenAI-compatible client for the given endpoint.
+
+    Clients are created once per (endpoint, API key) and keep a pool of
+    keep-alive connections that is reused by all threads in the process.
+    """
+    base_url = base_url or LLM_BASE_URL
+    api_key = os.getenv("LEPTON_API_KEY")
+    key = (base_url, api_key)
+
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            # The SDK is imported with the first client, keeping it out of startup
+            import httpx
+            import openai
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=LLM_POOL_SIZE,
+                    max_keepalive_connections=LLM_POOL_SIZE,
+                    keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+                ),
+                timeout=LLM_TIMEOUT
+            )
+            # Retries are left to the shared call policy
+            client = openai.OpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                http_client=http_client,
+                max_retries=0
+            )
+            _clients[key] = client
+
+    return client
+
+_async_clients: Dict[Tuple[str, str, int], "openai.AsyncOpenAI"] = {}
+
+def get_async_llm_client(base_url: str = None) -> "openai.AsyncOpenAI":
+    """Return the shared async client for the given endpoint and the running event loop.
+
+    Async connection pools are bound to their event loop, so there is one
+    client per (endpoint, API key, loop).
+    """
+    base_url = base_url or LLM_BASE_URL
+    api_key = os.getenv("LEPTON_API_KEY")
+    key = (base_url, api_key, id(asyncio.get_running_loop()))
+
+    client = _async_clients.get(key)
+    if client is None:
+        import httpx
+        import openai
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_POOL_SIZE,
+                max_keepalive_connections=LLM_POOL_SIZE,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+            ),
+            timeout=LLM_TIMEOUT
+        )
+        client = _async_clients[key] = openai.AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            http_client=http_client,
+            max_retries=0
+        )
+    return client
+
+def _sdxl_limits():
+    import httpx
+    return httpx.Limits(
+        max_connections=LLM_POOL_SIZE,
+        max_keepalive_connections=LLM_POOL_SIZE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+    )
+
+def _sdxl_headers(api_token: Optional[str]) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {api_token}"} if api_token else {}
+
+_sdxl_clients: Dict[Tuple[str, str], "httpx.Client"] = {}
+
+def get_sdxl_client(url: str = None) -> "httpx.Client":
+    """Return the shared HTTP client for the SDXL endpoint.
+
+    Like the LLM clients, it is created once per (endpoint, API key) and keeps
+    its keep-alive connections; requests pass their own timeout.
+    """
+    url = url or SDXL_URL
+    api_token = os.getenv("LEPTON_API_KEY")
+    key = (url, api_token)
+
+    client = _sdxl_clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _sdxl_clients.get(key)
+        if client is None:
+            import httpx
+            client = _sdxl_clients[key] = httpx.Client(
+                headers=_sdxl_headers(api_token), limits=_sdxl_limits(), timeout=LLM_TIMEOUT
+            )
+    return client
+
+_async_sdxl_clients: Dict[Tuple[str, str, int], "httpx.AsyncClient"] = {}
+
+def get_async_sdxl_client(url: str = None) -> "httpx.AsyncClient":
+    """Return the shared async HTTP client for the SDXL endpoint and the running event loop."""
+    url = url or SDXL_URL
+    api_token = os.getenv("LEPTON_API_KEY")
+    key = (url, api_token, id(asyncio.get_running_loop()))
+
+    client = _async_sdxl_clients.get(key)
+    if client is None:
+        import httpx
+        client = _async_sdxl_clients[key] = httpx.AsyncClient(
+            headers=_sdxl_headers(api_token), limits=_sdxl_limits(), timeout=LLM_TIMEOUT
+        )
+    return client
+
+async def aclose_llm_clients():
+    """Close the async clients of the running event loop, e.g. before it ends."""
+    loop_id = id(asyncio.get_running_loop())
+    for key in [key for key in _async_clients if key[2] == loop_id]:
+        await _async_clients.pop(key).close()
+    for key in [key for key in _async_sdxl_clients if key[2] == loop_id]:
+        await _async_sdxl_clients.pop(key).aclose()
+
+def close_llm_clients():
+    """Close all pooled clients, e.g. at the end of a batch run."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        for client in _sdxl_clients.values():
+            client.close()
+        _sdxl_clients.clear()
+
+def log_llm_call(run_id: Optional[str], record: Dict[str, Any]):
+    """Record the timing of one LLM call in the run's event log."""
+    if not run_id:
+        return
+    event_log.emit(run_id, "llm", "llm_call", record)
+
+def _finish_call(run_id: Optional[str], record: Dict[str, Any], started: float,
+                 request_bytes: int, content: Optional[str], ok: bool = True):
+    """Complete a call record and report it to the call log and the run metrics."""
+    wall_time = time.monotonic() - started
+    record["wall_time"] = round(wall_time, 3)
+    record["ok"] = ok
+    # Generation rate after the first token when streaming, overall otherwise
+    generation_time = wall_time - (record.get("ttft") or 0)
+    if record.get("completion_tokens") and generation_time > 0 and not record["cached"]:
+        record["tokens_per_sec"] = round(record["completion_tokens"] / generation_time, 1)
+    log_llm_call(run_id, record)
+
+    # Cache hits cost no tokens and transfer nothing
+    cached = record["cached"]
+    metrics.record(
+        run_id, "llm", record["stage"], wall_time,
+        ok=ok,
+        prompt_tokens=None if cached else record.get("prompt_tokens"),
+        completion_tokens=None if cached else record.get("completion_tokens"),
+        bytes_transferred=None if cached else request_bytes + len((content or "").encode("utf-8")),
+        retries=record.get("retries", 0),
+        hedged=record.get("hedged", 0),
+        rate_wait=record.get("rate_wait", 0.0),
+        cached=cached,
+        ttft=record.get("ttft")
+    )
+
+class _LLMCall:
+    """State of one chat completion, shared by the blocking and async clients."""
+
+    def __init__(self, messages: List[Dict[str, str]], max_tokens: int, temperature: Optional[float],
+                 use_cache: bool, stream: Optional[bool], stage: str, run_id: Optional[str],
+                 partial_path: Optional[str], on_text: Optional[Callable[[str], None]]):
+        self.stream = LLM_STREAM if stream is None else stream
+        self.stage = stage
+        self.run_id = run_id
+        self.max_tokens = max_tokens
+        self.partial_path = partial_path
+        self.on_text = on_text
+        self.started = time.monotonic()
+        self.record = {
+            "stage": stage,
+            "model": LLM_MODEL,
+            "max_tokens": max_tokens,
+            "prompt_chars": sum(len(message["content"]) for message in messages),
+            "prompt_tokens_estimate": estimate_prompt_tokens(messages),
+            "streamed": self.stream,
+            "cached": False
+        }
+        self.request_bytes = len(json.dumps(messages).encode("utf-8"))
+        if self.record["prompt_tokens_estimate"] > budget_for(stage):
+            print(f"Warning: {stage} prompt is about {self.record['prompt_tokens_estimate']} tokens, "
+                  f"over its budget of {budget_for(stage)}")
+
+        self.cache = get_llm_cache() if use_cache and cache_enabled_for(stage) else None
+        self.cache_key = None
+        if self.cache is not None:
+            self.cache_key = make_cache_key(LLM_BASE_URL, LLM_MODEL, messages, temperature, max_tokens)
+
+        self.params = {
+            "model": LLM_MODEL,
+            "messages": messages,
+            "max_tokens": max_tokens
+        }
+        if temperature is not None:
+            self.params["temperature"] = temperature
+
+        # Set once a streamed attempt has passed text on; it must not be retried then
+        self.delivered = False
+        self.stats: Dict[str, Any] = {}
+        self._parts: List[str] = []
+        self._partial_file = None
+        self._unflushed = 0
+
+    def cached_response(self) -> Optional[str]:
+        """Serve the call from the LLM cache, if possible."""
+        if self.cache is None:
+            return None
+        cached = self.cache.get(self.cache_key)
+        if cached is None:
+            return None
+        if self.partial_path:
+            os.makedirs(os.path.dirname(self.partial_path), exist_ok=True)
+            with open(self.partial_path, "w") as f:
+                f.write(cached)
+        if self.on_text:
+            self.on_text(cached)
+        self.record.update(cached=True, streamed=False)
+        _finish_call(self.run_id, self.record, self.started, self.request_bytes, cached)
+        return cached
+
+    @property
+    def token_estimate(self) -> int:
+        """Tokens charged to the rate limiter before the call."""
+        return self.record["prompt_tokens_estimate"] + self.max_tokens
+
+    @property
+    def used_tokens(self) -> int:
+        return ((self.record.get("prompt_tokens") or self.record["prompt_tokens_estimate"])
+                + (self.record.get("completion_tokens") or 0))
+
+    def retry_if(self, error: Exception) -> bool:
+        return not self.delivered and is_retryable(error)
+
+    def begin_stream(self):
+        self._parts = []
+        self._unflushed = 0
+        self.record.pop("prompt_tokens", None)
+        self.record.pop("completion_tokens", None)
+        if self.partial_path:
+            os.makedirs(os.path.dirname(self.partial_path), exist_ok=True)
+            self._partial_file = open(self.partial_path, "w")
+
+    def stream_chunk(self, chunk, deadline_at: float, timeout: float):
+        """Forward the text of one streamed chunk as it arrives."""
+        if time.monotonic() > deadline_at:
+            raise DeadlineExceededError(f"Stream still running after {timeout:.0f}s")
+        # Requested with include_usage, the last chunk carries the usage and no choices
+        usage = getattr(chunk, "usage", None)
+        if usage:
+            self.record["prompt_tokens"] = usage.prompt_tokens
+            self.record["completion_tokens"] = usage.completion_tokens
+        if not chunk.choices:
+            return
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            return
+        if not self._parts:
+            self.record["ttft"] = round(time.monotonic() - self.started, 3)
+            self.delivered = True
+        self._parts.append(delta)
+        if self._partial_file:
+            self._partial_file.write(delta)
+            self._unflushed += len(delta)
+            if self._unflushed >= LLM_PARTIAL_FLUSH_CHARS:
+                self._partial_file.flush()
+                self._unflushed = 0
+        if self.on_text:
+            self.on_text(delta)
+
+    def end_stream(self) -> str:
+        if self._partial_file:
+            self._partial_file.close()
+            self._partial_file = None
+        # Without reported usage, estimate the prompt and count each streamed
+        # chunk as roughly one token
+        if self.record.get("prompt_tokens") is None:
+            self.record["prompt_tokens"] = self.record["prompt_tokens_estimate"]
+        if self.record.get("completion_tokens") is None:
+            self.record["completion_tokens"] = len(self._parts)
+        return "".join(self._parts)
+
+    def response_content(self, response) -> str:
+        """Text of a non-streamed response, recording its token usage."""
+        self.record["ttft"] = None
+        if response.usage:
+            self.record["prompt_tokens"] = response.usage.prompt_tokens
+            self.record["completion_tokens"] = response.usage.completion_tokens
+        return response.choices[0].message.content
+
+    def finish(self, content: Optional[str], ok: bool = True):
+        # Non-streamed text is passed on once, after the winning attempt, so
+        # a losing hedged request cannot deliver it twice
+        if ok and content and not self.stream and self.on_text:
+            self.on_text(content)
+        self.record.update(self.stats)
+        _finish_call(self.run_id, self.record, self.started, self.request_bytes, content, ok=ok)
+        if ok and self.cache is not None and content:
+            self.cache.put(self.cache_key, content)
+
+def chat_completion(messages: List[Dict[str, str]], max_tokens: int, temperature: float = None,
+                    use_cache: bool = True, stream: bool = None, stage: str = "llm",
+                    run_id: str = None, partial_path: str = None,
+                    on_text: Callable[[str], None] = None) -> str:
+    """Run a chat completion against the shared client and return the text.
+
+    Responses are served from the shared LLM cache when possible, unless the
+    stage is not cached (see ``cache_enabled_for``); pass ``use_cache=False``
+    for other calls whose output should never be reused.
+    In streaming mode the text is written to ``partial_path`` and passed to
+    ``on_text`` as it arrives; otherwise ``on_text`` receives the whole text. Time-to-first-token and tokens/sec are logged
+    per call to the run's event log and reported to the run's
+    metrics together with token counts and bytes transferred.
+
+    Calls run under the shared call policy (see ``components/call_policy.py``):
+    transient failures are retried with backoff until the stage's deadline,
+    and non-streaming calls may be hedged. A stream is only retried if it
+    failed before delivering any text. Every attempt first waits for its turn
+    in the endpoint's rate limiter, which is charged the estimated prompt
+    tokens plus ``max_tokens`` and refunded what the call did not use.
+    """
+    call = _LLMCall(messages, max_tokens, temperature, use_cache, stream, stage, run_id, partial_path, on_text)
+    cached = call.cached_response()
+    if cached is not None:
+        return cached
+
+    def attempt(timeout: float) -> str:
+        with limited(LLM_BASE_URL, "llm", run_id, tokens=call.token_estimate,
+                     timeout=timeout, stats=call.stats) as permit:
+            # Time spent waiting for the limiter counts against the deadline
+            timeout = max(1.0, timeout - permit.waited)
+            client = get_llm_client()
+            if call.stream:
+                deadline_at = time.monotonic() + timeout
+                call.begin_stream()
+                try:
+                    # Close the connection if the stream is abandoned mid-way,
+                    # so it goes back to the pool
+                    with client.chat.completions.create(stream=True, stream_options=STREAM_OPTIONS,
+                                                        timeout=timeout, **call.params) as response:
+                        for chunk in response:
+                            call.stream_chunk(chunk, deadline_at, timeout)
+                finally:
+                    content = call.end_stream()
+            else:
+                content = call.response_content(client.chat.completions.create(timeout=timeout, **call.params))
+            permit.used_tokens = call.used_tokens
+            return content
+
+    try:
+        content = call_with_policy(
+            attempt, LLM_BASE_URL, stage, kind="llm",
+            # Duplicate streams would pass the same text on twice
+            hedge=False if call.stream else None,
+            retry_if=call.retry_if,
+            stats=call.stats
+        )
+    except Exception:
+        call.finish(None, ok=False)
+        raise
+
+    call.finish(content)
+    return content
+
+async def achat_completion(messages: List[Dict[str, str]], max_tokens: int, temperature: float = None,
+                           use_cache: bool = True, stream: bool = None, stage: str = "llm",
+                           run_id: str = None, partial_path: str = None,
+                           on_text: Callable[[str], None] = None) -> str:
+    """Async variant of chat_completion, using the event loop's pooled async client.
+
+    Caching, logging, metrics, the call policy and the rate limiter behave
+    exactly as for chat_completion; hedged and timed-out attempts are cancelled.
+    """
+    call = _LLMCall(messages, max_tokens, temperature, use_cache, stream, stage, run_id, partial_path, on_text)
+    cached = call.cached_response()
+    if cached is not None:
+        return cached
+
+    async def attempt(timeout: float) -> str:
+        async with alimited(LLM_BASE_URL, "llm", run_id, tokens=call.token_estimate,
+                            timeout=timeout, stats=call.stats) as permit:
+            timeout = max(1.0, timeout - permit.waited)
+            client = get_async_llm_client()
+            if call.stream:
+                deadline_at = time.monotonic() + timeout
+                call.begin_stream()
+                try:
+                    response = await client.chat.completions.create(stream=True, stream_options=STREAM_OPTIONS,
+                                                                    timeout=timeout, **call.params)
+                    # Close the connection if the attempt is cancelled mid-stream
+                    async with response:
+                        async for chunk in response:
+                            call.stream_chunk(chunk, deadline_at, timeout)
+                finally:
+                    content = call.end_stream()
+            else:
+                content = call.response_content(
+                    await client.chat.completions.create(timeout=timeout, **call.params))
+            permit.used_tokens = call.used_tokens
+            return content
+
+    try:
+        content = await acall_with_policy(
+            attempt, LLM_BASE_URL, stage, kind="llm",
+            hedge=False if call.stream else None,
+            retry_if=call.retry_if,
+            stats=call.stats
+        )
+    except Exception:
+        call.finish(None, ok=False)
+        raise
+
+    call.finish(content)
+    return content
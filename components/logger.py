@@ -3,12 +3,21 @@ Logger Component
 ---------------
 This component handles logging of inputs, prompts, and outputs for each step
 of the content creation workflow.
+
+Components record structured events through the asynchronous event log
+(see event_log.py). The human-readable per-component files are an optional
+view rendered from a run's events, either after each run (LOG_RENDER_VIEW=1)
+or on demand with `python main.py --render-logs <run_id>`.
 """
 
 import os
 import json
 from typing import Dict, Any, Callable, List
-from datetime import datetime
+
+from components import event_log
+from components import artifact_store
+
+LOG_RENDER_VIEW = os.getenv("LOG_RENDER_VIEW", "0") != "0"
 
 def setup_logging(run_id: str):
     """Set up logging directories for a specific run."""
@@ -39,145 +48,208 @@ def log_state(state_dict: Dict[str, Any], *, state_type: str, node_name: str = N
     if state_type not in ["start", "input", "output"] or not state_dict:
         return
     
-    run_id = state_dict.get("run_id", "unknown")
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
     # Skip logging if node_name is None (happens at the very start and end)
     if node_name is None:
         return
     
-    # Determine the component directory based on node name
-    component_dir = os.path.join("logs", run_id, node_name)
+    # Summarize the state (replace large content with its length)
+    summary = {
+        k: v if not isinstance(v, str) or len(v) < 200 
+        else f"<{len(v)} characters>" 
+        for k, v in state_dict.items()
+    }
+    event_log.emit(state_dict.get("run_id", "unknown"), node_name, f"state_{state_type}", {"state": summary})
+
+def _timestamp(event: Dict[str, Any]) -> str:
+    """Format an event timestamp the way the text logs always have."""
+    return event["ts"][:19]
+
+def _body_text(event: Dict[str, Any], name: str) -> str:
+    body = event_log.read_body(event, name)
+    return body.decode("utf-8") if body is not None else ""
+
+def _link_body(event: Dict[str, Any], name: str, dest: str):
+    """Hardlink a body from the artifact store into the rendered view."""
+    path = event_log.body_path(event, name)
+    if path:
+        artifact_store.link(path, dest)
+
+def _link_file(path: str, dest: str):
+    """Hardlink an output file into the rendered view through the artifact store."""
+    store_path = artifact_store.put_file(path)
+    if store_path:
+        artifact_store.link(store_path, dest)
+
+def _write_summary(f, summary: Dict[str, Any]):
+    f.write("State summary:\n")
+    f.write(json.dumps(summary, indent=2))
+    f.write("\n\n")
+
+def render_topics_discovered(run_id: str, run_dir: str, event: Dict[str, Any]):
+    topics = event["data"]["trending_topics"]
+    component_dir = os.path.join(run_dir, "topic_discovery")
+    os.makedirs(component_dir, exist_ok=True)
+    with open(os.path.join(component_dir, "output.txt"), "w") as f:
+        f.write(f"===== {_timestamp(event)} =====\n")
+        f.write("Discovered trending topics:\n")
+        for i, topic in enumerate(topics, 1):
+            f.write(f"{i}. {topic}\n")
+        f.write("\n")
+        _write_summary(f, {"trending_topics": topics, "run_id": run_id})
+
+def render_topic_selected(run_id: str, run_dir: str, event: Dict[str, Any]):
+    data = event["data"]
+    component_dir = os.path.join(run_dir, "human_selection")
     os.makedirs(component_dir, exist_ok=True)
+    with open(os.path.join(component_dir, "output.txt"), "w") as f:
+        f.write(f"===== {_timestamp(event)} =====\n")
+        f.write("Input topics:\n")
+        for i, topic in enumerate(data["trending_topics"], 1):
+            f.write(f"{i}. {topic}\n")
+        f.write("\n")
+        f.write(f"Selected topic: {data['selected_topic']}\n\n")
+        _write_summary(f, {**data, "run_id": run_id})
+
+def render_content_generated(run_id: str, run_dir: str, event: Dict[str, Any]):
+    data = event["data"]
+    content = _body_text(event, "initial_content.md")
+    component_dir = os.path.join(run_dir, "content_generation")
+    os.makedirs(component_dir, exist_ok=True)
+    with open(os.path.join(component_dir, "output.txt"), "w") as f:
+        f.write(f"===== {_timestamp(event)} =====\n")
+        f.write(f"Generated content for topic: {data['selected_topic']}\n\n")
+        f.write("Content preview:\n")
+        f.write("---\n")
+        f.write(content[:1000] + "..." if len(content) > 1000 else content)
+        f.write("\n---\n\n")
+        _write_summary(f, {**data, "run_id": run_id})
+    _link_body(event, "initial_content.md", os.path.join(component_dir, "initial_content.md"))
+
+def render_content_refined(run_id: str, run_dir: str, event: Dict[str, Any]):
+    data = event["data"]
+    refinement_count = data["refinement_count"]
+    feedback = data["feedback"]
+    refined_content = _body_text(event, "refined_content.md")
+    iteration_dir = os.path.join(run_dir, "content_refinement", f"iteration_{refinement_count}")
+    os.makedirs(iteration_dir, exist_ok=True)
+    with open(os.path.join(iteration_dir, "output.txt"), "w") as f:
+        f.write(f"===== {_timestamp(event)} =====\n")
+        f.write(f"Refinement iteration: {refinement_count}\n\n")
+        f.write("Feedback received:\n")
+        for i, point in enumerate(feedback, 1):
+            f.write(f"{i}. {point}\n")
+        f.write("\n")
+        f.write("Refined content preview:\n")
+        f.write("---\n")
+        f.write(refined_content[:1000] + "..." if len(refined_content) > 1000 else refined_content)
+        f.write("\n---\n\n")
+        _write_summary(f, {
+            "refinement_count": refinement_count,
+            "feedback_points": len(feedback),
+            "content_length": data["content_length"],
+            "run_id": run_id
+        })
+    _link_body(event, "refined_content.md", os.path.join(iteration_dir, "refined_content.md"))
+    with open(os.path.join(iteration_dir, "feedback.json"), "w") as f:
+        json.dump(feedback, f, indent=2)
+
+def render_image_generated(run_id: str, run_dir: str, event: Dict[str, Any]):
+    data = event["data"]
+    image_prompt = data["image_prompt"]
+    image_path = data["image_path"]
+    component_dir = os.path.join(run_dir, "image_generation")
+    os.makedirs(component_dir, exist_ok=True)
+    with open(os.path.join(component_dir, "output.txt"), "w") as f:
+        f.write(f"===== {_timestamp(event)} =====\n")
+        f.write(f"Topic: {data['selected_topic']}\n\n")
+        f.write("Image generation prompt:\n")
+        f.write(f"\"{image_prompt}\"\n\n")
+        f.write(f"Generated image saved to: {image_path}\n\n")
+        _write_summary(f, {
+            "selected_topic": data["selected_topic"],
+            "image_path": image_path,
+            "prompt_length": len(image_prompt),
+            "run_id": run_id
+        })
+    with open(os.path.join(component_dir, "image_prompt.txt"), "w") as f:
+        f.write(image_prompt)
+    _link_file(image_path, os.path.join(component_dir, os.path.basename(image_path)))
+
+def render_html_created(run_id: str, run_dir: str, event: Dict[str, Any]):
+    data = event["data"]
+    html_content = _body_text(event, "output.html")
+    component_dir = os.path.join(run_dir, "html_formatter")
+    os.makedirs(component_dir, exist_ok=True)
+    with open(os.path.join(component_dir, "output.txt"), "w") as f:
+        f.write(f"===== {_timestamp(event)} =====\n")
+        f.write(f"Generated HTML for: {data['title']}\n\n")
+        f.write(f"Image path: {data['image_path']}\n")
+        if data.get("output_path"):
+            f.write(f"Output path: {data['output_path']}\n")
+        f.write("\nHTML preview:\n")
+        f.write("---\n")
+        f.write(html_content[:500] + "..." if len(html_content) > 500 else html_content)
+        f.write("\n---\n\n")
+        _write_summary(f, {
+            "title": data["title"],
+            "html_length": data["html_length"],
+            "image_path": data["image_path"],
+            "run_id": run_id
+        })
+    _link_body(event, "output.html", os.path.join(component_dir, "output.html"))
+
+def render_run_completed(run_id: str, run_dir: str, event: Dict[str, Any]):
+    output_path = event["data"]["final_output_path"]
+    if output_path:
+        _link_file(output_path, os.path.join(run_dir, os.path.basename(output_path)))
+
+def render_llm_calls(run_id: str, run_dir: str, events: List[Dict[str, Any]]):
+    with open(os.path.join(run_dir, "llm_calls.jsonl"), "w") as f:
+        for event in events:
+            f.write(json.dumps({"timestamp": _timestamp(event), **event["data"]}) + "\n")
+
+def render_state_events(run_id: str, run_dir: str, events: List[Dict[str, Any]]):
+    for event in events:
+        state_type = event["event"][len("state_"):]
+        component_dir = os.path.join(run_dir, event["component"])
+        os.makedirs(component_dir, exist_ok=True)
+        file_name = "input.txt" if state_type == "input" else "output.txt"
+        with open(os.path.join(component_dir, file_name), "a") as f:
+            f.write(f"===== {_timestamp(event)} =====\n")
+            f.write(f"{state_type.capitalize()} of {event['component']}:\n")
+            _write_summary(f, event["data"]["state"])
+
+# Renderers for events that map to one set of files each
+RENDERERS: Dict[str, Callable[[str, str, Dict[str, Any]], None]] = {
+    "topics_discovered": render_topics_discovered,
+    "topic_selected": render_topic_selected,
+    "content_generated": render_content_generated,
+    "content_refined": render_content_refined,
+    "image_generated": render_image_generated,
+    "html_created": render_html_created,
+    "run_completed": render_run_completed,
+}
+
+def render_run_logs(run_id: str):
+    """Render the human-readable log files of a run from its event log."""
+    run_dir = os.path.join(event_log.LOGS_DIR, run_id)
+    events = event_log.read_events(run_id)
     
-    # Clean up state data for logging (remove large content if needed)
-    log_state = {k: v for k, v in state_dict.items()}
+    for event in events:
+        renderer = RENDERERS.get(event["event"])
+        if renderer:
+            try:
+                renderer(run_id, run_dir, event)
+            except Exception as e:
+                print(f"Could not render {event['event']} event: {e}")
     
-    # Create appropriate log file based on state type
-    if state_type == "input":
-        log_file = os.path.join(component_dir, "input.txt")
-        with open(log_file, "a") as f:
-            f.write(f"===== {timestamp} =====\n")
-            f.write(f"Input to {node_name}:\n")
-            
-            # Handle specific components
-            if node_name == "topic_discovery":
-                f.write("Starting topic discovery process...\n\n")
-            
-            elif node_name == "human_selection":
-                f.write("Trending topics:\n")
-                for i, topic in enumerate(log_state.get("trending_topics", []), 1):
-                    f.write(f"{i}. {topic}\n")
-                f.write("\n")
-            
-            elif node_name == "generate_content":
-                f.write(f"Selected topic: {log_state.get('selected_topic', '')}\n\n")
-            
-            elif node_name == "refine_content":
-                f.write(f"Refinement iteration: {log_state.get('refinement_count', 0) + 1}\n")
-                f.write(f"Current content length: {len(log_state.get('current_content', ''))}\n")
-                
-                # Write summary of previous feedback if available
-                previous_feedback = log_state.get("refinement_feedback", [])
-                if previous_feedback:
-                    f.write("\nPrevious feedback summary:\n")
-                    for i, round_feedback in enumerate(previous_feedback):
-                        f.write(f"Round {i+1}:\n")
-                        for j, item in enumerate(round_feedback[:5]):
-                            f.write(f"- {item}\n")
-                        f.write("\n")
-                f.write("\n")
-            
-            elif node_name == "generate_image":
-                f.write("Starting image generation for the blog post...\n")
-                f.write(f"Content length: {len(log_state.get('current_content', ''))}\n")
-                f.write(f"Topic: {log_state.get('selected_topic', '')}\n\n")
-            
-            elif node_name == "create_html":
-                f.write("Starting HTML formatting...\n")
-                f.write(f"Content length: {len(log_state.get('current_content', ''))}\n")
-                f.write(f"Image path: {log_state.get('image_url', '')}\n\n")
-            
-            # Add general state info as JSON
-            f.write("State summary:\n")
-            summary = {
-                k: v if not isinstance(v, str) or len(v) < 200 
-                else f"<{len(v)} characters>" 
-                for k, v in log_state.items()
-            }
-            f.write(json.dumps(summary, indent=2))
-            f.write("\n\n")
+    llm_calls = [event for event in events if event["event"] == "llm_call"]
+    if llm_calls:
+        render_llm_calls(run_id, run_dir, llm_calls)
     
-    elif state_type == "output":
-        log_file = os.path.join(component_dir, "output.txt")
-        with open(log_file, "a") as f:
-            f.write(f"===== {timestamp} =====\n")
-            f.write(f"Output from {node_name}:\n")
-            
-            # Handle specific components
-            if node_name == "topic_discovery":
-                f.write("Discovered trending topics:\n")
-                for i, topic in enumerate(log_state.get("trending_topics", []), 1):
-                    f.write(f"{i}. {topic}\n")
-                f.write("\n")
-            
-            elif node_name == "human_selection":
-                f.write(f"Selected topic: {log_state.get('selected_topic', '')}\n\n")
-            
-            elif node_name == "generate_content":
-                f.write("Generated initial content:\n")
-                f.write("---\n")
-                f.write(log_state.get("current_content", "")[:1000] + "...\n")
-                f.write("---\n\n")
-                
-                # Save full content to separate file
-                content_file = os.path.join(component_dir, "initial_content.md")
-                with open(content_file, "w") as cf:
-                    cf.write(log_state.get("current_content", ""))
-            
-            elif node_name == "refine_content":
-                # Get the latest feedback
-                all_feedback = log_state.get("refinement_feedback", [])
-                iteration = log_state.get("refinement_count", 0)
-                
-                f.write(f"Refinement iteration {iteration} completed\n")
-                
-                if all_feedback and len(all_feedback) > 0:
-                    latest_feedback = all_feedback[-1]
-                    f.write("\nFeedback received:\n")
-                    for i, point in enumerate(latest_feedback, 1):
-                        f.write(f"{i}. {point}\n")
-                
-                f.write("\nRefined content summary:\n")
-                content_preview = log_state.get("current_content", "")[:500] + "..."
-                f.write(content_preview + "\n\n")
-                
-                # Save full content to separate file
-                content_file = os.path.join(component_dir, f"refined_content_{iteration}.md")
-                with open(content_file, "w") as cf:
-                    cf.write(log_state.get("current_content", ""))
-            
-            elif node_name == "generate_image":
-                f.write(f"Generated image path: {log_state.get('image_url', '')}\n\n")
-            
-            elif node_name == "create_html":
-                f.write("HTML formatting completed\n")
-                f.write(f"HTML content length: {len(log_state.get('html_content', ''))}\n\n")
-                
-                # Save HTML preview
-                html_preview = log_state.get("html_content", "")[:500] + "..."
-                f.write("HTML preview:\n")
-                f.write(html_preview + "\n\n")
-            
-            # Add general state info as JSON
-            f.write("State summary:\n")
-            summary = {
-                k: v if not isinstance(v, str) or len(v) < 200 
-                else f"<{len(v)} characters>" 
-                for k, v in log_state.items()
-            }
-            f.write(json.dumps(summary, indent=2))
-            f.write("\n\n")
+    state_events = [event for event in events if event["event"].startswith("state_")]
+    if state_events:
+        render_state_events(run_id, run_dir, state_events)
 
 def format_feedback(feedback_list: List[str]) -> str:
     """Format feedback points in a clean, readable format."""
@@ -0,0 +1,232 @@
+"""
+Metrics Component
+----------------
+This component records performance metrics for every graph node and every
+LLM, SDXL and HTTP call: wall time, retries, prompt/completion tokens and
+bytes transferred. Metrics are kept per run for `run_summary.json` and
+aggregated process-wide for a Prometheus text-format export, so batch runs
+can track latency percentiles and token spend per stage.
+"""
+
+import os
+import math
+import time
+import inspect
+import threading
+import functools
+from collections import defaultdict, deque
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+# Number of recent durations kept per stage for process-wide percentiles
+QUANTILE_WINDOW = 1000
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+class RunMetrics:
+    """Metrics records for a single run."""
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]):
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self) -> Dict[str, Any]:
+        """Aggregate the records per kind and stage."""
+        with self._lock:
+            records = list(self.records)
+
+        stages: Dict[str, Dict[str, Any]] = {}
+        grouped: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for record in records:
+            grouped[f"{record['kind']}:{record['name']}"].append(record)
+
+        for key, group in sorted(grouped.items()):
+            durations = [record["wall_time"] for record in group]
+            stages[key] = {
+                "count": len(group),
+                "errors": sum(1 for record in group if not record["ok"]),
+                "retries": sum(record["retries"] for record in group),
+                "hedged": sum(record.get("hedged") or 0 for record in group),
+                "rate_wait_total": round(sum(record.get("rate_wait") or 0 for record in group), 3),
+                "wall_time_total": round(sum(durations), 3),
+                "wall_time_p50": round(percentile(durations, 0.5), 3),
+                "wall_time_p95": round(percentile(durations, 0.95), 3),
+                "wall_time_max": round(max(durations), 3),
+                "prompt_tokens": sum(record["prompt_tokens"] or 0 for record in group),
+                "completion_tokens": sum(record["completion_tokens"] or 0 for record in group),
+                "bytes": sum(record["bytes"] or 0 for record in group)
+            }
+
+        calls = [record for record in records if record["kind"] != "node"]
+        return {
+            "stages": stages,
+            "totals": {
+                "calls": len(calls),
+                "retries": sum(record["retries"] for record in calls),
+                "hedged": sum(record.get("hedged") or 0 for record in calls),
+                "rate_wait": round(sum(record.get("rate_wait") or 0 for record in calls), 3),
+                "prompt_tokens": sum(record["prompt_tokens"] or 0 for record in calls),
+                "completion_tokens": sum(record["completion_tokens"] or 0 for record in calls),
+                "bytes": sum(record["bytes"] or 0 for record in calls)
+            }
+        }
+
+_runs: Dict[str, RunMetrics] = {}
+_runs_lock = threading.Lock()
+
+# Process-wide aggregates for the Prometheus export, keyed by (kind, name)
+_totals: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+_durations: Dict[Tuple[str, str], deque] = defaultdict(lambda: deque(maxlen=QUANTILE_WINDOW))
+
+def get_run_metrics(run_id: str) -> RunMetrics:
+    """Return the metrics collector for a run, creating it if needed."""
+    with _runs_lock:
+        metrics = _runs.get(run_id)
+        if metrics is None:
+            metrics = _runs[run_id] = RunMetrics(run_id)
+        return metrics
+
+def release_run_metrics(run_id: str):
+    """Forget a finished run's records; process-wide aggregates are kept."""
+    with _runs_lock:
+        _runs.pop(run_id, None)
+
+def record(run_id: Optional[str], kind: str, name: str, wall_time: float, ok: bool = True,
+           retries: int = 0, prompt_tokens: int = None, completion_tokens: int = None,
+           bytes_transferred: int = None, **extra):
+    """Record one node execution or external call.
+
+    ``kind`` is one of "node", "llm", "sdxl" or "http"; ``name`` is the stage.
+    """
+    entry = {
+        "kind": kind,
+        "name": name,
+        "wall_time": round(wall_time, 3),
+        "ok": ok,
+        "retries": retries,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "bytes": bytes_transferred,
+        **extra
+    }
+    if run_id:
+        get_run_metrics(run_id).add(entry)
+
+    with _runs_lock:
+        totals = _totals[(kind, name)]
+        totals["count"] += 1
+        totals["seconds"] += wall_time
+        totals["errors"] += 0 if ok else 1
+        totals["retries"] += retries
+        totals["hedged"] += extra.get("hedged") or 0
+        totals["rate_wait"] += extra.get("rate_wait") or 0
+        totals["prompt_tokens"] += prompt_tokens or 0
+        totals["completion_tokens"] += completion_tokens or 0
+        totals["bytes"] += bytes_transferred or 0
+        _durations[(kind, name)].append(wall_time)
+
+def timed_node(name: str, node: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Callable:
+    """Wrap a graph node so that its wall time is recorded for the run.
+
+    Coroutine nodes get a coroutine wrapper, so the graph still awaits them.
+    """
+    if inspect.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def async_wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
+            started = time.monotonic()
+            ok = False
+            try:
+                result = await node(state)
+                ok = True
+                return result
+            finally:
+                record(state.get("run_id"), "node", name, time.monotonic() - started, ok=ok)
+        return async_wrapper
+    
+    @functools.wraps(node)
+    def wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.monotonic()
+        ok = False
+        try:
+            result = node(state)
+            ok = True
+            return result
+        finally:
+            record(state.get("run_id"), "node", name, time.monotonic() - started, ok=ok)
+    return wrapper
+
+def process_summary() -> Dict[str, Dict[str, Any]]:
+    """Per-stage call counts and latency percentiles across all runs in the process."""
+    with _runs_lock:
+        totals = {key: dict(values) for key, values in _totals.items()}
+        durations = {key: list(values) for key, values in _durations.items()}
+
+    return {
+        f"{kind}:{name}": {
+            "count": int(totals[(kind, name)]["count"]),
+            "errors": int(totals[(kind, name)]["errors"]),
+            "retries": int(totals[(kind, name)]["retries"]),
+            "rate_wait_total": round(totals[(kind, name)]["rate_wait"], 3),
+            "wall_time_p50": round(percentile(values, 0.5), 3),
+            "wall_time_p95": round(percentile(values, 0.95), 3),
+            "wall_time_max": round(max(values), 3)
+        }
+        for (kind, name), values in sorted(durations.items())
+    }
+
+def render_prometheus() -> str:
+    """Render the process-wide metrics in the Prometheus text exposition format."""
+    with _runs_lock:
+        totals = {key: dict(values) for key, values in _totals.items()}
+        durations = {key: list(values) for key, values in _durations.items()}
+
+    lines = [
+        "# HELP content_agent_duration_seconds Wall time of graph nodes and external calls.",
+        "# TYPE content_agent_duration_seconds summary"
+    ]
+    for (kind, name), values in sorted(durations.items()):
+        labels = f'kind="{kind}",stage="{name}"'
+        for quantile in (0.5, 0.95, 0.99):
+            lines.append(f'content_agent_duration_seconds{{{labels},quantile="{quantile}"}} '
+                         f'{percentile(values, quantile):.6f}')
+        lines.append(f"content_agent_duration_seconds_sum{{{labels}}} {totals[(kind, name)]['seconds']:.6f}")
+        lines.append(f"content_agent_duration_seconds_count{{{labels}}} {int(totals[(kind, name)]['count'])}")
+
+    counters = [
+        ("errors", "content_agent_errors_total", "Failed node executions and calls."),
+        ("retries", "content_agent_retries_total", "Retried external calls."),
+        ("hedged", "content_agent_hedged_total", "Duplicate requests sent for slow external calls."),
+        ("prompt_tokens", "content_agent_prompt_tokens_total", "Prompt tokens sent to the LLM."),
+        ("completion_tokens", "content_agent_completion_tokens_total", "Completion tokens received from the LLM."),
+        ("bytes", "content_agent_bytes_total", "Bytes transferred by external calls.")
+    ]
+    for field, metric, help_text in counters:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for (kind, name), values in sorted(totals.items()):
+            lines.append(f'{metric}{{kind="{kind}",stage="{name}"}} {int(values[field])}')
+
+    lines.append("# HELP content_agent_rate_wait_seconds_total Time calls waited for the rate limiter.")
+    lines.append("# TYPE content_agent_rate_wait_seconds_total counter")
+    for (kind, name), values in sorted(totals.items()):
+        lines.append(f'content_agent_rate_wait_seconds_total{{kind="{kind}",stage="{name}"}} {values["rate_wait"]:.6f}')
+
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path: str):
+    """Write the Prometheus export to a file, e.g. for a node-exporter textfile collector."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render_prometheus())
+    # Replace atomically so scrapers never read a partial file
+    os.replace(tmp_path, path)
@@ -0,0 +1,146 @@
+"""
+Prompt Builder Component
+-----------------------
+This component keeps prompt sizes under control. It provides a local token
+estimator and a per-stage input token budget, and the helpers the stages use
+to fit their prompts into it: deduplicating boilerplate lines across scraped
+sources, sharing the budget fairly between sources, compressing older rounds
+of refinement feedback and truncating excerpts at line boundaries.
+"""
+
+import os
+import re
+import math
+from typing import Dict, List
+
+# Default input token budget per LLM stage; override with PROMPT_BUDGET_<STAGE>,
+# e.g. PROMPT_BUDGET_TOPIC_DISCOVERY=8000
+DEFAULT_BUDGETS = {
+    "topic_discovery": 4000,
+    "content_generation": 1000,
+    "critique": 6000,
+    "refinement": 8000,
+    "refinement_patch": 8000,
+    "image_prompt": 1000,
+}
+DEFAULT_BUDGET = int(os.getenv("PROMPT_BUDGET", "8000"))
+
+# Token budget for the compressed history of earlier feedback rounds
+FEEDBACK_HISTORY_TOKENS = int(os.getenv("FEEDBACK_HISTORY_TOKENS", "300"))
+
+# Tokens added by the chat template around each message
+MESSAGE_OVERHEAD = 4
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens of a text without a tokenizer.
+
+    Counts punctuation marks as one token each and words as one token per
+    four characters, which errs on the high side for English prose and so
+    keeps prompts safely within their budget.
+    """
+    return sum(math.ceil(len(piece) / 4) for piece in _TOKEN_PATTERN.findall(text))
+
+def estimate_prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    """Estimate the input tokens of a list of chat messages."""
+    return sum(estimate_tokens(message["content"]) + MESSAGE_OVERHEAD for message in messages)
+
+def budget_for(stage: str) -> int:
+    """Return the input token budget of an LLM stage."""
+    override = os.getenv(f"PROMPT_BUDGET_{stage.upper()}")
+    if override:
+        return int(override)
+    return DEFAULT_BUDGETS.get(stage, DEFAULT_BUDGET)
+
+def remaining_budget(stage: str, *fixed_parts: str) -> int:
+    """Tokens left in a stage's budget for its variable part, given the fixed parts."""
+    used = sum(estimate_tokens(part) + MESSAGE_OVERHEAD for part in fixed_parts)
+    return max(0, budget_for(stage) - used)
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut a text to at most ``max_tokens``, preferring to end on a whole line."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    lines = []
+    used = 0
+    for line in text.splitlines():
+        tokens = estimate_tokens(line)
+        if used + tokens > max_tokens:
+            if not lines:
+                # A single overlong line: keep as many words as fit
+                words = []
+                for word in line.split():
+                    used += estimate_tokens(word)
+                    if used > max_tokens:
+                        break
+                    words.append(word)
+                lines.append(" ".join(words))
+            break
+        lines.append(line)
+        used += tokens
+    return "\n".join(lines)
+
+def dedupe_lines(texts: List[str]) -> List[str]:
+    """Drop lines already seen in the same or an earlier text.
+
+    Navigation, footer and sign-in boilerplate repeats across scraped pages
+    and within them; only its first occurrence is kept.
+    """
+    seen = set()
+    deduped = []
+    for text in texts:
+        lines = []
+        for line in text.splitlines():
+            key = " ".join(line.lower().split())
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            lines.append(line)
+        deduped.append("\n".join(lines))
+    return deduped
+
+def fit_sources(texts: List[str], max_tokens: int) -> List[str]:
+    """Share a token budget fairly between sources.
+
+    Each source gets an equal share; budget left unused by short sources is
+    handed to the longer ones.
+    """
+    sizes = [estimate_tokens(text) for text in texts]
+    shares = [0] * len(texts)
+    remaining = max_tokens
+    pending = sorted(range(len(texts)), key=lambda index: sizes[index])
+    while pending:
+        share = remaining // len(pending)
+        index = pending.pop(0)
+        shares[index] = min(sizes[index], share)
+        remaining -= shares[index]
+    return [truncate_to_tokens(text, share) for text, share in zip(texts, shares)]
+
+def _shorten(text: str, max_words: int) -> str:
+    words = text.split()
+    return " ".join(words[:max_words]) + ("..." if len(words) > max_words else "")
+
+def compress_feedback(history: List[List[str]], max_tokens: int = None) -> str:
+    """Format earlier rounds of feedback for the refinement prompt.
+
+    The latest round keeps its first three points; older rounds are squeezed
+    onto one line each, and the oldest rounds are dropped until the history
+    fits in ``max_tokens``.
+    """
+    if not history:
+        return ""
+    max_tokens = FEEDBACK_HISTORY_TOKENS if max_tokens is None else max_tokens
+
+    rounds = []
+    for i, round_feedback in enumerate(history[:-1]):
+        points = "; ".join(_shorten(point, 8) for point in round_feedback[:3])
+        rounds.append(f"Round {i+1}: {points}\n")
+    latest = f"Round {len(history)}:\n" + "".join(
+        f"- {_shorten(point, 20)}\n" for point in history[-1][:3]
+    )
+
+    header = "Previous rounds of feedback:\n"
+    while rounds and estimate_tokens(header + "".join(rounds) + latest) > max_tokens:
+        rounds.pop(0)
+    return header + "".join(rounds) + latest
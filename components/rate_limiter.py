@@ -0,0 +1,270 @@
+"""
+Rate Limiter Component
+---------------------
+This component keeps the calls of all runs in the process within the model
+endpoints' limits. Each endpoint has token buckets for requests per minute and
+estimated tokens per minute, and a cap on calls in flight. Calls that cannot
+start yet wait in a queue per run, and the queues are served round-robin, so a
+run with many pending calls cannot starve the others. Blocking and async
+calls share the same queues. The time each call waited is recorded with its
+metrics.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import AsyncIterator, Dict, Any, Iterator, Optional, Tuple
+
+from components.call_policy import DeadlineExceededError
+
+# Limits per endpoint kind; 0 disables a limit. The LLM concurrency cap
+# defaults to the connection pool size, so calls never queue inside the pool.
+LIMITS = {
+    "llm": {
+        "rpm": float(os.getenv("LLM_RPM", "0")),
+        "tpm": float(os.getenv("LLM_TPM", "0")),
+        "concurrency": int(os.getenv("LLM_MAX_CONCURRENCY", os.getenv("LLM_POOL_SIZE", "10")))
+    },
+    "sdxl": {
+        "rpm": float(os.getenv("SDXL_RPM", "0")),
+        "tpm": 0.0,
+        "concurrency": int(os.getenv("SDXL_MAX_CONCURRENCY", "0"))
+    }
+}
+
+class TokenBucket:
+    """A bucket holding up to one minute's worth of a per-minute rate."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` is available; call after refill."""
+        return max(0.0, (amount - self.level) / self.rate)
+
+class _Waiter:
+    """A queued call; async waiters are woken through their event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else None
+
+class Permit:
+    """A granted call. Set ``used_tokens`` once known to refund the unused estimate."""
+
+    def __init__(self, tokens: float, waited: float):
+        self.tokens = tokens
+        self.waited = waited
+        self.used_tokens: Optional[int] = None
+
+class EndpointLimiter:
+    """Request, token and concurrency limits of one endpoint, with fair queueing."""
+
+    def __init__(self, endpoint: str, rpm: float = 0, tpm: float = 0, concurrency: int = 0):
+        self.endpoint = endpoint
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.concurrency = concurrency
+        self.in_flight = 0
+        # Waiting calls per run, and the order in which runs are served
+        self._queues: Dict[str, deque] = {}
+        self._order: deque = deque()
+        self._condition = threading.Condition()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.requests or self.tokens or self.concurrency > 0)
+
+    def _next_waiter(self):
+        for run in self._order:
+            if self._queues[run]:
+                return self._queues[run][0]
+        return None
+
+    def _wait_time(self, cost: float) -> Optional[float]:
+        """Seconds until a call of ``cost`` tokens may start, or None if it must
+        wait for a call in flight to finish."""
+        now = time.monotonic()
+        wait = 0.0
+        if self.requests:
+            self.requests.refill(now)
+            wait = max(wait, self.requests.wait_time(1))
+        if self.tokens:
+            self.tokens.refill(now)
+            wait = max(wait, self.tokens.wait_time(cost))
+        if self.concurrency > 0 and self.in_flight >= self.concurrency:
+            return None
+        return wait
+
+    def _enqueue(self, run: str, waiter: "_Waiter"):
+        if run not in self._queues:
+            self._queues[run] = deque()
+            self._order.append(run)
+        self._queues[run].append(waiter)
+
+    def _dequeue(self, run: str, waiter: "_Waiter", granted: bool):
+        queue = self._queues[run]
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[run]
+            self._order.remove(run)
+        elif granted:
+            # Served: the run goes to the back of the line
+            self._order.remove(run)
+            self._order.append(run)
+        self._notify()
+
+    def _try_grant(self, waiter: "_Waiter", cost: float) -> Tuple[bool, Optional[float]]:
+        """Take capacity if it is this waiter's turn and there is room.
+
+        Returns whether it was granted, and otherwise how long to wait before
+        checking again (None: until a call finishes or a waiter is served).
+        """
+        wait = self._wait_time(cost)
+        if self._next_waiter() is waiter and wait == 0:
+            if self.requests:
+                self.requests.level -= 1
+            if self.tokens:
+                self.tokens.level -= cost
+            self.in_flight += 1
+            return True, None
+        return False, wait or None
+
+    def _notify(self):
+        """Wake all waiting calls, blocking and async alike."""
+        self._condition.notify_all()
+        for queue in self._queues.values():
+            for waiter in queue:
+                if waiter.loop is not None:
+                    waiter.loop.call_soon_threadsafe(waiter.event.set)
+
+    def _cost(self, tokens: float) -> float:
+        # A call larger than the whole bucket would never fit
+        return min(tokens, self.tokens.capacity) if self.tokens else 0
+
+    def acquire(self, run_id: str = None, tokens: float = 0, timeout: float = None) -> Permit:
+        """Wait for this call's turn and capacity, and take it.
+
+        Raises DeadlineExceededError if the call cannot start within ``timeout``.
+        """
+        run = run_id or ""
+        cost = self._cost(tokens)
+        waiter = _Waiter()
+        started = time.monotonic()
+
+        with self._condition:
+            self._enqueue(run, waiter)
+            granted = False
+            try:
+                while True:
+                    granted, wait = self._try_grant(waiter, cost)
+                    if granted:
+                        break
+                    remaining = None if timeout is None else timeout - (time.monotonic() - started)
+                    if remaining is not None and remaining <= 0:
+                        raise DeadlineExceededError(f"Waited {timeout:.1f}s for capacity on {self.endpoint}")
+                    # Woken early when a call finishes or another waiter is served
+                    candidates = [value for value in (wait, remaining) if value is not None]
+                    self._condition.wait(min(candidates) if candidates else None)
+            finally:
+                self._dequeue(run, waiter, granted)
+
+        return Permit(cost, time.monotonic() - started)
+
+    async def aacquire(self, run_id: str = None, tokens: float = 0, timeout: float = None) -> Permit:
+        """Async variant of acquire that waits without blocking the event loop."""
+        run = run_id or ""
+        cost = self._cost(tokens)
+        waiter = _Waiter(asyncio.get_running_loop())
+        started = time.monotonic()
+
+        with self._condition:
+            self._enqueue(run, waiter)
+        granted = False
+        try:
+            while True:
+                with self._condition:
+                    granted, wait = self._try_grant(waiter, cost)
+                    waiter.event.clear()
+                if granted:
+                    break
+                remaining = None if timeout is None else timeout - (time.monotonic() - started)
+                if remaining is not None and remaining <= 0:
+                    raise DeadlineExceededError(f"Waited {timeout:.1f}s for capacity on {self.endpoint}")
+                candidates = [value for value in (wait, remaining) if value is not None]
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), min(candidates) if candidates else None)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._condition:
+                self._dequeue(run, waiter, granted)
+
+        return Permit(cost, time.monotonic() - started)
+
+    def release(self, permit: Permit):
+        """Finish a call, refunding the part of its token estimate it did not use."""
+        with self._condition:
+            self.in_flight -= 1
+            if self.tokens and permit.used_tokens is not None and permit.used_tokens < permit.tokens:
+                self.tokens.level = min(self.tokens.capacity,
+                                        self.tokens.level + permit.tokens - permit.used_tokens)
+            self._notify()
+
+_limiters: Dict[str, EndpointLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(endpoint: str, kind: str = "llm") -> EndpointLimiter:
+    """Return the shared limiter of an endpoint, configured by its kind."""
+    with _limiters_lock:
+        limiter = _limiters.get(endpoint)
+        if limiter is None:
+            limiter = _limiters[endpoint] = EndpointLimiter(endpoint, **LIMITS.get(kind, {}))
+        return limiter
+
+@contextmanager
+def limited(endpoint: str, kind: str = "llm", run_id: str = None, tokens: float = 0,
+            timeout: float = None, stats: Dict[str, Any] = None) -> Iterator[Permit]:
+    """Hold a slot on an endpoint for the duration of one request.
+
+    The seconds spent waiting are added to ``stats["rate_wait"]``.
+    """
+    limiter = get_limiter(endpoint, kind)
+    if not limiter.enabled:
+        yield Permit(0, 0.0)
+        return
+
+    permit = limiter.acquire(run_id, tokens, timeout)
+    if stats is not None:
+        stats["rate_wait"] = round(stats.get("rate_wait", 0.0) + permit.waited, 3)
+    try:
+        yield permit
+    finally:
+        limiter.release(permit)
+
+@asynccontextmanager
+async def alimited(endpoint: str, kind: str = "llm", run_id: str = None, tokens: float = 0,
+                   timeout: float = None, stats: Dict[str, Any] = None) -> AsyncIterator[Permit]:
+    """Async variant of limited."""
+    limiter = get_limiter(endpoint, kind)
+    if not limiter.enabled:
+        yield Permit(0, 0.0)
+        return
+
+    permit = await limiter.aacquire(run_id, tokens, timeout)
+    if stats is not None:
+        stats["rate_wait"] = round(stats.get("rate_wait", 0.0) + permit.waited, 3)
+    try:
+        yield permit
+    finally:
+        limiter.release(permit)
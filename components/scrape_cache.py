@@ -0,0 +1,87 @@
+"""
+Scrape Cache Component
+---------------------
+This component keeps an on-disk cache of scraped source pages. For each URL
+it stores the ETag/Last-Modified validators together with the text already
+extracted from the page, so repeated discovery runs can skip unchanged pages
+entirely (within the TTL) or revalidate them with a conditional request.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, Any, Optional
+
+SCRAPE_CACHE_ENABLED = os.getenv("SCRAPE_CACHE", "1") != "0"
+SCRAPE_CACHE_DIR = os.getenv("SCRAPE_CACHE_DIR", os.path.join("cache", "scrape"))
+SCRAPE_CACHE_TTL = float(os.getenv("SCRAPE_CACHE_TTL", "900"))
+
+# Bump when the extracted text format changes, so older entries are refetched
+ENTRY_VERSION = 2
+
+def _entry_path(url: str) -> str:
+    """Return the cache file used for a URL."""
+    digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(SCRAPE_CACHE_DIR, f"{digest}.json")
+
+def load_entry(url: str) -> Optional[Dict[str, Any]]:
+    """Load the cached entry for a URL, if any."""
+    if not SCRAPE_CACHE_ENABLED:
+        return None
+    try:
+        with open(_entry_path(url), "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return entry if entry.get("version") == ENTRY_VERSION else None
+
+def save_entry(url: str, text: str, etag: str = None, last_modified: str = None):
+    """Store the extracted text and validators for a URL.
+
+    A failed write only loses the cache entry, never the scraped text.
+    """
+    if not SCRAPE_CACHE_ENABLED:
+        return
+    entry = {
+        "version": ENTRY_VERSION,
+        "url": url,
+        "etag": etag,
+        "last_modified": last_modified,
+        "fetched_at": time.time(),
+        "text": text
+    }
+    # Write to a temporary file first so concurrent readers never see partial JSON
+    path = _entry_path(url)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(SCRAPE_CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not cache {url}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+def touch_entry(url: str, entry: Dict[str, Any]):
+    """Mark a cached entry as fresh after a 304 Not Modified response."""
+    save_entry(url, entry["text"], entry.get("etag"), entry.get("last_modified"))
+
+def is_fresh(entry: Dict[str, Any], ttl: float = None) -> bool:
+    """Check whether an entry is young enough to reuse without revalidation."""
+    ttl = SCRAPE_CACHE_TTL if ttl is None else ttl
+    return time.time() - entry.get("fetched_at", 0) < ttl
+
+def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Build the conditional request headers for a cached entry."""
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
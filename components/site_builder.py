@@ -0,0 +1,300 @@
+"""
+Site Builder Component
+---------------------
+This component builds a static site over the output directory: one page per
+post rendered from the drafts in the artifact store, plus an index page, an
+archive page and an RSS feed. A manifest records the hashes of each post's
+inputs (draft, image and page template), so a rebuild only re-renders the
+posts whose inputs changed.
+"""
+
+import os
+import re
+import glob
+import json
+import html
+import hashlib
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Any, List
+
+from components import artifact_store
+from components.html_formatter import render_page, PageTemplate, PAGE_TEMPLATE
+from components.image_generation import make_derivatives, IMAGE_DERIVATIVE_WIDTHS
+
+SITE_TITLE = os.getenv("SITE_TITLE", "AI Content Creation Agent")
+SITE_URL = os.getenv("SITE_URL", "")
+MANIFEST_FILE = ".site_manifest.json"
+INDEX_POSTS = 10
+
+# Bump when the build itself changes in a way that affects rendered posts
+BUILD_VERSION = 1
+
+PLACEHOLDER_IMAGE = "https://placehold.co/600x400?text=AI+Blog+Image"
+
+LISTING_TEMPLATE = PageTemplate("""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>$title</title>
+    <link rel="alternate" type="application/rss+xml" title="$site_title" href="feed.xml">
+    <style>
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            line-height: 1.6;
+            color: #333;
+            background-color: #f5f5f5;
+            margin: 0;
+        }
+
+        .container {
+            max-width: 800px;
+            margin: 0 auto;
+            padding: 20px;
+            background-color: #ffffff;
+            box-shadow: 0 0 10px rgba(0, 0, 0, 0.1);
+        }
+
+        h1 { color: #2c3e50; }
+        h2 { color: #3498db; border-bottom: 1px solid #eee; padding-bottom: 10px; }
+        a { color: #3498db; text-decoration: none; }
+        .date { color: #666; font-style: italic; }
+        nav { margin-bottom: 20px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <nav><a href="index.html">Home</a> | <a href="archive.html">Archive</a> | <a href="feed.xml">RSS</a></nav>
+        <h1>$title</h1>
+        $body
+    </div>
+</body>
+</html>
+""")
+
+@lru_cache(maxsize=None)
+def template_hash() -> str:
+    """Hash of everything that shapes a rendered post besides its own inputs."""
+    import markdown
+    return hashlib.sha256(
+        f"{PAGE_TEMPLATE}|{markdown.__version__}|{BUILD_VERSION}|{IMAGE_DERIVATIVE_WIDTHS}".encode("utf-8")
+    ).hexdigest()
+
+def escape(text: str) -> str:
+    """Escape &, < and > in HTML or XML text."""
+    return html.escape(text, quote=False)
+
+def slugify(topic: str) -> str:
+    """File name (without extension) of a post in the output directory."""
+    slug = topic.replace(' ', '_').lower()
+    return ''.join(c for c in slug if c.isalnum() or c in '._- ')
+
+def extract_title(content: str, fallback: str) -> str:
+    """The first level-one heading of a draft."""
+    match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
+    return match.group(1) if match else fallback
+
+def extract_excerpt(content: str, length: int = 240) -> str:
+    """The first paragraph of a draft, as plain text."""
+    for paragraph in re.split(r'\n\s*\n', content):
+        paragraph = paragraph.strip()
+        if paragraph and not paragraph.startswith(("#", "|", "```", "-", "*", ">")):
+            text = re.sub(r'[*_`\[\]]|\(http[^)]*\)', '', " ".join(paragraph.split()))
+            return text if len(text) <= length else text[:length].rsplit(" ", 1)[0] + "..."
+    return ""
+
+def collect_posts(logs_dir: str = "logs") -> List[Dict[str, Any]]:
+    """Find the stored draft of every finished run, newest first.
+
+    When several runs wrote about the same topic, the newest one wins.
+    """
+    posts: Dict[str, Dict[str, Any]] = {}
+    for summary_file in glob.glob(os.path.join(logs_dir, "*", "run_summary.json")):
+        try:
+            with open(summary_file, "r") as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            continue
+        artifacts = summary.get("artifacts") or {}
+        content_path = artifacts.get("content")
+        if not content_path or not os.path.exists(content_path) or not summary.get("selected_topic"):
+            continue
+        post = {
+            "slug": slugify(summary["selected_topic"]),
+            "run_id": summary.get("run_id", ""),
+            "topic": summary["selected_topic"],
+            "timestamp": summary.get("timestamp", ""),
+            "content": content_path,
+            "image": artifacts.get("image")
+        }
+        current = posts.get(post["slug"])
+        if current is None or post["timestamp"] > current["timestamp"]:
+            posts[post["slug"]] = post
+    return sorted(posts.values(), key=lambda post: post["timestamp"], reverse=True)
+
+def format_date(timestamp: str) -> str:
+    try:
+        return datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").strftime("%B %d, %Y")
+    except ValueError:
+        return timestamp
+
+def load_manifest(output_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"posts": {}, "listing": ""}
+
+def save_manifest(output_dir: str, manifest: Dict[str, Any]):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def write_page(output_dir: str, name: str, text: str):
+    """Store a page in the artifact store and link it into the output directory."""
+    artifact_store.link(artifact_store.put_text(text, os.path.splitext(name)[1]), os.path.join(output_dir, name))
+
+def render_post(post: Dict[str, Any], output_dir: str) -> Dict[str, Any]:
+    """Render one post into the output directory and return its manifest entry."""
+    content = artifact_store.read_bytes(post["content"]).decode("utf-8")
+    title = extract_title(content, post["topic"])
+
+    image_src = PLACEHOLDER_IMAGE
+    derivatives = {}
+    if post["image"] and os.path.exists(post["image"]):
+        image_path = os.path.join(output_dir, "images", os.path.basename(post["image"]))
+        artifact_store.link(post["image"], image_path)
+        image_src = os.path.relpath(image_path, output_dir)
+        derivatives = {
+            image_format: [(os.path.relpath(path, output_dir), width) for path, width in entries]
+            for image_format, entries in make_derivatives(image_path).items()
+        }
+
+    write_page(output_dir, f"{post['slug']}.html",
+               render_page(content, title, image_src, format_date(post["timestamp"]), derivatives))
+
+    return {
+        "run_id": post["run_id"],
+        "inputs": post_inputs(post),
+        "title": title,
+        "date": post["timestamp"],
+        "excerpt": extract_excerpt(content)
+    }
+
+def post_inputs(post: Dict[str, Any]) -> str:
+    """Hash of everything a rendered post depends on."""
+    parts = [
+        artifact_store.digest_of(post["content"]),
+        artifact_store.digest_of(post["image"]) if post["image"] else "",
+        post["timestamp"],
+        template_hash()
+    ]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+def render_index(entries: List[Dict[str, Any]]) -> str:
+    items = []
+    for entry in entries[:INDEX_POSTS]:
+        items.append(
+            f'<h2><a href="{entry["slug"]}.html">{escape(entry["title"])}</a></h2>\n'
+            f'        <div class="date">{format_date(entry["date"])}</div>\n'
+            f'        <p>{escape(entry["excerpt"])}</p>'
+        )
+    return LISTING_TEMPLATE.render(title=SITE_TITLE, site_title=SITE_TITLE, body="\n        ".join(items))
+
+def render_archive(entries: List[Dict[str, Any]]) -> str:
+    sections = []
+    current_month = None
+    for entry in entries:
+        month = entry["date"][:7]
+        if month != current_month:
+            if current_month is not None:
+                sections.append("</ul>")
+            label = datetime.strptime(month, "%Y-%m").strftime("%B %Y") if re.match(r'\d{4}-\d{2}$', month) else month
+            sections.append(f"<h2>{label}</h2>\n        <ul>")
+            current_month = month
+        sections.append(f'<li><a href="{entry["slug"]}.html">{escape(entry["title"])}</a> '
+                        f'<span class="date">{format_date(entry["date"])}</span></li>')
+    if current_month is not None:
+        sections.append("</ul>")
+    return LISTING_TEMPLATE.render(title=f"Archive - {SITE_TITLE}", site_title=SITE_TITLE,
+                                   body="\n        ".join(sections))
+
+def render_feed(entries: List[Dict[str, Any]]) -> str:
+    base_url = SITE_URL.rstrip("/")
+    items = []
+    for entry in entries[:INDEX_POSTS]:
+        try:
+            # Run timestamps are in local time
+            published = datetime.strptime(entry["date"], "%Y-%m-%d %H:%M:%S").astimezone().strftime("%a, %d %b %Y %H:%M:%S %z")
+        except ValueError:
+            published = ""
+        link = f"{base_url}/{entry['slug']}.html"
+        items.append(
+            "    <item>\n"
+            f"      <title>{escape(entry['title'])}</title>\n"
+            f"      <link>{escape(link)}</link>\n"
+            f"      <guid isPermaLink=\"false\">{escape(entry['run_id'])}</guid>\n"
+            f"      <pubDate>{published}</pubDate>\n"
+            f"      <description>{escape(entry['excerpt'])}</description>\n"
+            "    </item>\n"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0">\n'
+        "  <channel>\n"
+        f"    <title>{escape(SITE_TITLE)}</title>\n"
+        f"    <link>{escape(base_url + '/index.html')}</link>\n"
+        f"    <description>{escape(SITE_TITLE)}</description>\n"
+        + "".join(items) +
+        "  </channel>\n"
+        "</rss>\n"
+    )
+
+def build_site(output_dir: str = "output", logs_dir: str = "logs", force: bool = False) -> Dict[str, int]:
+    """Build or update the static site in ``output_dir``.
+
+    Only posts whose inputs changed since the last build are re-rendered, and
+    the index, archive and feed are rewritten only when the list of posts
+    changed. Pass ``force`` to re-render everything. Returns build counts.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {"posts": {}, "listing": ""} if force else load_manifest(output_dir)
+    previous = manifest.get("posts", {})
+    posts = collect_posts(logs_dir)
+
+    entries: Dict[str, Dict[str, Any]] = {}
+    rendered = 0
+    for post in posts:
+        entry = previous.get(post["slug"])
+        if (entry is None or entry.get("inputs") != post_inputs(post)
+                or not os.path.exists(os.path.join(output_dir, f"{post['slug']}.html"))):
+            entry = render_post(post, output_dir)
+            rendered += 1
+        entries[post["slug"]] = entry
+
+    # Remove pages of posts that are no longer in the logs
+    removed = 0
+    for slug in previous:
+        if slug not in entries:
+            path = os.path.join(output_dir, f"{slug}.html")
+            if os.path.exists(path):
+                os.remove(path)
+            removed += 1
+
+    listing = sorted(({"slug": slug, **entry} for slug, entry in entries.items()),
+                     key=lambda entry: entry["date"], reverse=True)
+    listing_hash = hashlib.sha256(json.dumps(
+        [[entry["slug"], entry["title"], entry["date"], entry["excerpt"]] for entry in listing]
+        + [template_hash(), SITE_TITLE, SITE_URL]
+    ).encode("utf-8")).hexdigest()
+    listing_changed = listing_hash != manifest.get("listing") or not os.path.exists(os.path.join(output_dir, "index.html"))
+    if listing_changed:
+        write_page(output_dir, "index.html", render_index(listing))
+        write_page(output_dir, "archive.html", render_archive(listing))
+        write_page(output_dir, "feed.xml", render_feed(listing))
+
+    save_manifest(output_dir, {"posts": entries, "listing": listing_hash})
+    return {"posts": len(entries), "rendered": rendered, "removed": removed, "listing_updated": int(listing_changed)}
@@ -0,0 +1,106 @@
+"""
+Startup Profile Component
+------------------------
+This component reports what a command spends on imports. The command is run
+again in a child interpreter with Python's `-X importtime`, and the import
+times it prints are summed per top-level package, with the modules the
+command imported directly (including imports deferred into functions) listed
+by their cumulative cost. Only the standard library is used, so profiling
+does not itself change what gets imported.
+"""
+
+import os
+import re
+import sys
+import time
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+PROFILE_FLAG = "--profile-startup"
+
+# Third-party packages that should only load in the nodes that need them
+HEAVY_PACKAGES = ["langgraph", "langchain_core", "openai", "leptonai", "bs4", "requests", "httpx", "markdown", "PIL"]
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+# (module, self microseconds, cumulative microseconds, nesting depth)
+ImportRow = Tuple[str, int, int, int]
+
+def parse_importtime(output: str) -> Tuple[List[ImportRow], List[str]]:
+    """Split `-X importtime` output into import rows and the other stderr lines."""
+    rows = []
+    other = []
+    for line in output.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2)), (len(match.group(3)) - 1) // 2))
+        elif not line.startswith("import time:"):
+            other.append(line)
+    return rows, other
+
+def package_costs(rows: List[ImportRow]) -> Dict[str, Tuple[float, int]]:
+    """Seconds of import time and number of modules per top-level package."""
+    costs = defaultdict(lambda: [0.0, 0])
+    for module, self_us, _, _ in rows:
+        cost = costs[module.split(".")[0]]
+        cost[0] += self_us / 1e6
+        cost[1] += 1
+    return {package: (seconds, count) for package, (seconds, count) in costs.items()}
+
+def loaded_heavy_packages(rows: List[ImportRow]) -> List[str]:
+    """The heavy packages a command imported."""
+    packages = {module.split(".")[0] for module, _, _, _ in rows}
+    return [package for package in HEAVY_PACKAGES if package in packages]
+
+def profile_imports(argv: List[str], capture_output: bool = False, cwd: str = None,
+                    env: Dict[str, str] = None) -> Tuple[float, List[ImportRow], List[str], int]:
+    """Run ``python -X importtime`` with ``argv``.
+
+    Returns the wall time, the import rows, the command's other stderr lines
+    and its exit code. Stdin and stdout are inherited unless ``capture_output``.
+    """
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime"] + argv,
+        cwd=cwd, env=env,
+        stdout=subprocess.DEVNULL if capture_output else None,
+        stderr=subprocess.PIPE, text=True
+    )
+    wall_time = time.perf_counter() - started
+    rows, other = parse_importtime(process.stderr)
+    return wall_time, rows, other, process.returncode
+
+def format_report(command: List[str], wall_time: float, rows: List[ImportRow], top: int = 15) -> str:
+    """Text report of a command's import costs."""
+    total = sum(self_us for _, self_us, _, _ in rows) / 1e6
+    lines = [
+        f"Startup profile: python {' '.join(command)}",
+        f"  wall time     {wall_time:8.3f} s",
+        f"  imports       {total:8.3f} s ({len(rows)} modules)",
+        f"  heavy loaded  {', '.join(loaded_heavy_packages(rows)) or 'none'}",
+        "",
+        f"  {'package':<28}{'self ms':>10}{'modules':>10}"
+    ]
+    costs = sorted(package_costs(rows).items(), key=lambda item: item[1][0], reverse=True)
+    for package, (seconds, count) in costs[:top]:
+        lines.append(f"  {package:<28}{seconds * 1000:>10.1f}{count:>10}")
+
+    lines += ["", f"  {'imported by the command':<40}{'cumulative ms':>14}"]
+    direct = sorted((row for row in rows if row[3] == 0), key=lambda row: row[2], reverse=True)
+    for module, _, cumulative_us, _ in direct[:top]:
+        lines.append(f"  {module:<40}{cumulative_us / 1000:>14.1f}")
+    return "\n".join(lines)
+
+def profile_command(argv: List[str] = None) -> int:
+    """Re-run this script without the profile flag and print its import costs.
+
+    Returns the exit code of the profiled command.
+    """
+    argv = list(sys.argv if argv is None else argv)
+    command = [os.path.abspath(argv[0])] + [arg for arg in argv[1:] if arg != PROFILE_FLAG]
+    wall_time, rows, other, returncode = profile_imports(command)
+    if other:
+        print("\n".join(other), file=sys.stderr)
+    print(format_report([os.path.basename(command[0])] + command[1:], wall_time, rows))
+    return returncode
@@ -5,34 +5,50 @@ This component is responsible for discovering trending AI topics by scraping
 relevant websites and using Llama 3.3 70B to identify the most interesting trends.
 """
 
-import requests
-from bs4 import BeautifulSoup
 import os
 import re
-from typing import Dict, List, Any
-import openai
-import json
+import codecs
+import asyncio
+from typing import TYPE_CHECKING, Dict, List, Any, Optional, Tuple
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from urllib.parse import urlparse
 from datetime import datetime
 
-# Import custom LLM from content_generation
-# We'll use a simple function instead to avoid circular imports
-def call_llama(prompt):
-    """Call Llama 3.3 70B via Lepton API."""
-    client = openai.OpenAI(
-        base_url="https://llama3-3-70b.lepton.run/api/v1/",
-        api_key=os.getenv("LEPTON_API_KEY")
-    )
-    
-    completion = client.chat.completions.create(
-        model="llama3.3-70b",
-        messages=[
-            {"role": "system", "content": "You are a trend analyst specializing in artificial intelligence and technology."},
+from components.llm_client import chat_completion, achat_completion
+from components import scrape_cache
+from components.extractors import extract_items, host_items, format_items, get_extractor, extract_page_text
+from components.prompt_builder import dedupe_lines, fit_sources, remaining_budget
+from components.topic_index import get_topic_index, TOPIC_DEDUP
+from components import metrics
+from components import event_log
+
+# The HTTP clients are imported when the first page is fetched
+if TYPE_CHECKING:
+    import httpx
+    import requests
+
+SYSTEM_MESSAGE = "You are a trend analyst specializing in artificial intelligence and technology."
+
+def llama_request(prompt, run_id=None, on_text=None):
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_MESSAGE},
             {"role": "user", "content": prompt}
         ],
-        max_tokens=2048
-    )
-    
-    return completion.choices[0].message.content
+        "max_tokens": 2048,
+        "stage": "topic_discovery",
+        "run_id": run_id,
+        "on_text": on_text
+    }
+
+def call_llama(prompt, run_id=None, on_text=None):
+    """Call Llama 3.3 70B via Lepton API."""
+    return chat_completion(**llama_request(prompt, run_id, on_text))
+
+async def acall_llama(prompt, run_id=None, on_text=None):
+    """Async variant of call_llama."""
+    return await achat_completion(**llama_request(prompt, run_id, on_text))
 
 # Sources for trending AI topics
 SOURCES = [
@@ -43,37 +59,365 @@ SOURCES = [
     "https://techcrunch.com/category/artificial-intelligence/",
 ]
 
-def scrape_content(url: str) -> str:
-    """Scrape content from a given URL."""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
+# Scraping settings: the overall discovery deadline bounds the whole scrape,
+# while per-host timeouts let slow sites fail fast without holding up the rest
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "5"))
+DISCOVERY_DEADLINE = float(os.getenv("DISCOVERY_DEADLINE", "15"))
+DEFAULT_SCRAPE_TIMEOUT = float(os.getenv("SCRAPE_TIMEOUT", "10"))
+HOST_TIMEOUTS = {
+    "news.ycombinator.com": 5,
+    "www.reddit.com": 8,
+}
+
+# Streaming fetch settings: bodies are read in chunks up to a hard byte cap,
+# and the download stops early once the host's extractor has found a full
+# page of items (Hacker News and subreddits list 25-30 per page)
+SCRAPE_STREAM = os.getenv("SCRAPE_STREAM", "1") != "0"
+SCRAPE_MAX_BYTES = int(os.getenv("SCRAPE_MAX_BYTES", str(1024 * 1024)))
+SCRAPE_CHUNK_SIZE = 16 * 1024
+SCRAPE_EARLY_STOP_BYTES = 64 * 1024
+SCRAPE_EARLY_STOP_ITEMS = int(os.getenv("SCRAPE_EARLY_STOP_ITEMS", "25"))
+
+SCRAPE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+def get_scrape_timeout(url: str) -> float:
+    """Return the request timeout to use for the host of the given URL."""
+    host = urlparse(url).netloc.lower()
+    return HOST_TIMEOUTS.get(host, DEFAULT_SCRAPE_TIMEOUT)
+
+def get_decoder(response):
+    """Return an incremental decoder for the charset declared by the response."""
+    charset = "utf-8"
+    if "charset" in response.headers.get("Content-Type", "").lower() and response.encoding:
+        charset = response.encoding
+    try:
+        return codecs.getincrementaldecoder(charset)(errors="replace")
+    except LookupError:
+        return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+class PageReader:
+    """Incremental decoding and extraction of a streamed page body.
+
+    The body is decoded chunk by chunk. For hosts with a registered extractor,
+    the text read so far is run through that extractor at doubling sizes, and
+    the download stops as soon as it finds SCRAPE_EARLY_STOP_ITEMS items;
+    those items are the result, so the page is not parsed again. Otherwise
+    the items are extracted once, when the body is complete. The page-text
+    fallback never ends a download, since a prefix without story rows yet
+    would only yield navigation and boilerplate.
+    """
+    
+    def __init__(self, response, url: str):
+        self.url = url
+        self.decoder = get_decoder(response)
+        self.parts = []
+        self.downloaded = 0
+        self.next_check = SCRAPE_EARLY_STOP_BYTES
+        self.can_stop_early = SCRAPE_EARLY_STOP_ITEMS > 0 and get_extractor(url) is not extract_page_text
+    
+    def feed(self, chunk: bytes) -> Optional[Tuple[str, int, bool]]:
+        """Consume a chunk; returns the result once the download can stop early."""
+        chunk = chunk[:SCRAPE_MAX_BYTES - self.downloaded]
+        self.downloaded += len(chunk)
+        self.parts.append(self.decoder.decode(chunk))
+        if self.downloaded >= SCRAPE_MAX_BYTES:
+            return extract_items("".join(self.parts), self.url), self.downloaded, True
+        if self.can_stop_early and self.downloaded >= self.next_check:
+            items = host_items("".join(self.parts), self.url)
+            if len(items) >= SCRAPE_EARLY_STOP_ITEMS:
+                return format_items(items), self.downloaded, True
+            self.next_check *= 2
+        return None
+    
+    def close(self) -> Tuple[str, int, bool]:
+        """Extract the items of the complete body."""
+        self.parts.append(self.decoder.decode(b"", final=True))
+        return extract_items("".join(self.parts), self.url), self.downloaded, False
+
+def read_page(response: "requests.Response", url: str) -> Tuple[str, int, bool]:
+    """Read a response body and extract its items within the byte cap.
+
+    Returns the extracted text, the number of body bytes read and whether the
+    download stopped before the end of the body.
+    """
+    if not SCRAPE_STREAM:
+        return extract_items(response.text, url), len(response.content), False
     
+    reader = PageReader(response, url)
+    for chunk in response.iter_content(chunk_size=SCRAPE_CHUNK_SIZE):
+        result = reader.feed(chunk)
+        if result:
+            return result
+    return reader.close()
+
+async def aread_page(response: "httpx.Response", url: str) -> Tuple[str, int, bool]:
+    """Async variant of read_page for a streamed httpx response."""
+    if not SCRAPE_STREAM:
+        content = await response.aread()
+        return extract_items(response.text, url), len(content), False
+    
+    reader = PageReader(response, url)
+    async for chunk in response.aiter_bytes(chunk_size=SCRAPE_CHUNK_SIZE):
+        result = reader.feed(chunk)
+        if result:
+            return result
+    return reader.close()
+
+def log_fetch(run_id: str, url: str, status: int, downloaded: int, truncated: bool):
+    """Log the bytes downloaded for a source."""
+    if downloaded:
+        print(f"Downloaded {downloaded / 1024:.0f} KB from {url}{' (stopped early)' if truncated else ''}")
+    event_log.emit(run_id, "topic_discovery", "source_fetched", {
+        "url": url,
+        "status": status,
+        "bytes": downloaded,
+        "truncated": truncated
+    })
+
+def scrape_content(url: str, timeout: float = None, run_id: str = None) -> str:
+    """Scrape content from a given URL.
+
+    Pages fetched within the scrape cache TTL are reused as-is; older entries
+    are revalidated with a conditional request and their extracted text is
+    reused when the server answers 304 Not Modified. Bodies are streamed
+    with a hard byte cap (see read_page), so a heavy page never sits in
+    memory in full.
+    """
+    import requests
+    
+    headers = dict(SCRAPE_HEADERS)
+    
+    cached = scrape_cache.load_entry(url)
+    if cached and scrape_cache.is_fresh(cached):
+        return cached["text"]
+    headers.update(scrape_cache.conditional_headers(cached))
+    
+    host = urlparse(url).netloc.lower()
+    started = time.monotonic()
+    response = None
+    downloaded = 0
+    truncated = False
+    ok = False
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
+        if timeout is None:
+            timeout = get_scrape_timeout(url)
+        response = requests.get(url, headers=headers, timeout=timeout, stream=SCRAPE_STREAM)
         
-        # Parse the HTML content
-        soup = BeautifulSoup(response.text, "html.parser")
+        if response.status_code == 304 and cached:
+            ok = True
+            scrape_cache.touch_entry(url, cached)
+            return cached["text"]
         
-        # Extract relevant content (this will vary based on the website structure)
-        # For demonstration purposes, we'll extract all text
-        text_content = soup.get_text()
+        response.raise_for_status()
         
-        # Clean up the text (remove extra whitespace, etc.)
-        text_content = " ".join(text_content.split())
+        # Pull only headlines, titles and scores with the host's extractor
+        text_content, downloaded, truncated = read_page(response, url)
+        ok = True
+        scrape_cache.save_entry(
+            url,
+            text_content,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified")
+        )
         
-        return text_content[:10000]  # Limit content size
+        return text_content
+    
+    except Exception as e:
+        print(f"Error scraping {url}: {e}")
+        # A stale copy is still better than no content at all
+        if cached:
+            print(f"Using cached copy of {url}")
+            return cached["text"]
+        return ""
+    
+    finally:
+        status = response.status_code if response is not None else None
+        if response is not None:
+            response.close()
+        metrics.record(run_id, "http", host, time.monotonic() - started, ok=ok,
+                       bytes_transferred=downloaded, status=status, truncated=truncated)
+        log_fetch(run_id, url, status, downloaded, truncated)
+
+async def ascrape_content(url: str, client: "httpx.AsyncClient", timeout: float = None, run_id: str = None) -> str:
+    """Async variant of scrape_content, fetching with a shared async HTTP client."""
+    headers = dict(SCRAPE_HEADERS)
+    
+    cached = scrape_cache.load_entry(url)
+    if cached and scrape_cache.is_fresh(cached):
+        return cached["text"]
+    headers.update(scrape_cache.conditional_headers(cached))
+    
+    host = urlparse(url).netloc.lower()
+    started = time.monotonic()
+    status = None
+    downloaded = 0
+    truncated = False
+    ok = False
+    try:
+        if timeout is None:
+            timeout = get_scrape_timeout(url)
+        async with client.stream("GET", url, headers=headers, timeout=timeout) as response:
+            status = response.status_code
+            if status == 304 and cached:
+                ok = True
+                scrape_cache.touch_entry(url, cached)
+                return cached["text"]
+            
+            response.raise_for_status()
+            
+            text_content, downloaded, truncated = await aread_page(response, url)
+            ok = True
+            scrape_cache.save_entry(
+                url,
+                text_content,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified")
+            )
+            
+            return text_content
     
     except Exception as e:
         print(f"Error scraping {url}: {e}")
+        if cached:
+            print(f"Using cached copy of {url}")
+            return cached["text"]
         return ""
+    
+    finally:
+        metrics.record(run_id, "http", host, time.monotonic() - started, ok=ok,
+                       bytes_transferred=downloaded, status=status, truncated=truncated)
+        log_fetch(run_id, url, status, downloaded, truncated)
 
-def extract_trending_topics(contents: List[str]) -> List[str]:
-    """Use Llama 3.3 70B to extract trending AI topics from scraped content."""
+def scrape_sources(sources: List[str], max_workers: int = None, deadline: float = None,
+                   run_id: str = None) -> List[str]:
+    """Scrape all sources concurrently and return the non-empty contents.
+
+    Results are gathered as they complete. Sources that have not finished when
+    the overall deadline expires are abandoned, so discovery latency is bounded
+    by the slowest single source (or the deadline) rather than the sum of all.
+    The returned contents keep the order of ``sources`` for stable prompts.
+    """
+    max_workers = max_workers or SCRAPE_CONCURRENCY
+    deadline = DISCOVERY_DEADLINE if deadline is None else deadline
     
+    # Sequential mode, kept for debugging and very constrained environments
+    if max_workers <= 1:
+        contents = []
+        for source in sources:
+            print(f"Scraping {source}...")
+            content = scrape_content(source, run_id=run_id)
+            if content:
+                contents.append(content)
+        return contents
+    
+    results = {}
+    started = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scrape")
+    futures = {}
+    for source in sources:
+        print(f"Scraping {source}...")
+        futures[executor.submit(scrape_content, source, run_id=run_id)] = source
+    
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            source = futures[future]
+            content = future.result()
+            elapsed = time.monotonic() - started
+            print(f"Finished {source} in {elapsed:.1f}s ({len(content)} characters)")
+            if content:
+                results[source] = content
+    except FuturesTimeoutError:
+        pending = [source for future, source in futures.items() if not future.done()]
+        print(f"Discovery deadline of {deadline:.0f}s reached, skipping: {', '.join(pending)}")
+    finally:
+        # Don't wait for abandoned requests; they finish in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    return [results[source] for source in sources if source in results]
+
+async def ascrape_sources(sources: List[str], max_workers: int = None, deadline: float = None,
+                          run_id: str = None) -> List[str]:
+    """Async variant of scrape_sources.
+
+    Up to ``max_workers`` sources are fetched at once on the event loop;
+    sources still pending at the deadline are cancelled.
+    """
+    import httpx
+    max_workers = max_workers or SCRAPE_CONCURRENCY
+    deadline = DISCOVERY_DEADLINE if deadline is None else deadline
+    semaphore = asyncio.Semaphore(max_workers)
+    results = {}
+    started = time.monotonic()
+    
+    async with httpx.AsyncClient(follow_redirects=True) as client:
+        async def scrape(source: str):
+            async with semaphore:
+                content = await ascrape_content(source, client, run_id=run_id)
+            elapsed = time.monotonic() - started
+            print(f"Finished {source} in {elapsed:.1f}s ({len(content)} characters)")
+            if content:
+                results[source] = content
+        
+        tasks = {}
+        for source in sources:
+            print(f"Scraping {source}...")
+            tasks[asyncio.ensure_future(scrape(source))] = source
+        
+        _, pending = await asyncio.wait(tasks, timeout=deadline)
+        if pending:
+            print(f"Discovery deadline of {deadline:.0f}s reached, skipping: "
+                  f"{', '.join(tasks[task] for task in pending)}")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+    
+    return [results[source] for source in sources if source in results]
+
+def clean_topic_line(line: str) -> str:
+    """Strip numbering and list markers from one line of the topic list."""
+    # Remove numbering patterns (e.g. "1.", "1)", "[1]", etc.)
+    cleaned_line = re.sub(r'^\s*\d+[\.\)\]]*\s*', '', line.strip())
+    
+    # Remove any asterisks, dashes or other list markers
+    cleaned_line = re.sub(r'^\s*[\*\-\+]\s*', '', cleaned_line)
+    
+    return cleaned_line
+
+class TopicStreamParser:
+    """Parse topics line by line from a streamed LLM response."""
+    
+    def __init__(self, limit: int = 10):
+        self.limit = limit
+        self.topics = []
+        self._buffer = ""
+    
+    def feed(self, text: str):
+        """Consume a chunk of streamed text and emit any completed lines."""
+        self._buffer += text
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            self._emit(line)
+    
+    def close(self) -> List[str]:
+        """Flush the final partial line and return the parsed topics."""
+        if self._buffer:
+            self._emit(self._buffer)
+            self._buffer = ""
+        return self.topics
+    
+    def _emit(self, line: str):
+        if not line.strip() or len(self.topics) >= self.limit:
+            return
+        topic = clean_topic_line(line)
+        self.topics.append(topic)
+        print(f"Found topic {len(self.topics)}: {topic}")
+
+def topics_prompt(contents: List[str]) -> str:
+    """Prompt asking for the trending topics in the scraped content."""
     # Create a prompt for the LLM
-    prompt = """
+    template = """
     Based on the following content scraped from tech news sites, identify the top 10 
     trending topics in AI right now. Focus on specific advancements, technologies, 
     research papers, or applications that are gaining significant attention.
@@ -86,84 +430,96 @@ def extract_trending_topics(contents: List[str]) -> List[str]:
     
     Return ONLY a list of 10 trending AI topics, one per line, without any additional text.
     DO NOT number your list - just return the topic titles.
-    """.format("\n\n".join(contents))
+    """
     
-    # Call Llama 3.3 70B
-    response = call_llama(prompt)
+    # Drop boilerplate repeated across sources, then share the stage's token
+    # budget fairly between the sources
+    contents = dedupe_lines(contents)
+    contents = fit_sources(contents, remaining_budget("topic_discovery", SYSTEM_MESSAGE, template.format("")))
+    return template.format("\n\n".join(content for content in contents if content))
+
+def extract_trending_topics(contents: List[str], run_id: str = None) -> List[str]:
+    """Use Llama 3.3 70B to extract trending AI topics from scraped content."""
+    # Call Llama 3.3 70B, parsing topics line by line as they stream in
+    parser = TopicStreamParser(limit=10)  # Ensure we have at most 10 topics
+    call_llama(topics_prompt(contents), run_id=run_id, on_text=parser.feed)
     
-    # Parse the response into a list of topics and clean any numbering
-    topics = []
-    for line in response.strip().split("\n"):
-        if not line.strip():
-            continue
-        
-        # Remove numbering patterns (e.g. "1.", "1)", "[1]", etc.)
-        cleaned_line = re.sub(r'^\s*\d+[\.\)\]]*\s*', '', line.strip())
-        
-        # Remove any asterisks, dashes or other list markers
-        cleaned_line = re.sub(r'^\s*[\*\-\+]\s*', '', cleaned_line)
-        
-        topics.append(cleaned_line)
+    return parser.close()
+
+async def aextract_trending_topics(contents: List[str], run_id: str = None) -> List[str]:
+    """Async variant of extract_trending_topics."""
+    parser = TopicStreamParser(limit=10)
+    await acall_llama(topics_prompt(contents), run_id=run_id, on_text=parser.feed)
     
-    return topics[:10]  # Ensure we have at most 10 topics
+    return parser.close()
 
-def log_discovery(state: Dict[str, Any], topics: List[str]):
+def log_discovery(state: Dict[str, Any], topics: List[str], covered: Dict[str, Dict[str, Any]] = None):
     """Log the topic discovery process."""
     run_id = state.get("run_id", datetime.now().strftime("%Y%m%d_%H%M%S"))
-    component_dir = os.path.join("logs", run_id, "topic_discovery")
-    os.makedirs(component_dir, exist_ok=True)
-    
-    # Log the discovered topics
-    log_file = os.path.join(component_dir, "output.txt")
-    with open(log_file, "w") as f:
-        f.write(f"===== {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} =====\n")
-        f.write("Discovered trending topics:\n")
-        for i, topic in enumerate(topics, 1):
-            f.write(f"{i}. {topic}\n")
-        f.write("\n")
-        
-        # Add state summary
-        f.write("State summary:\n")
-        summary = {
-            "trending_topics": topics,
-            "run_id": run_id
-        }
-        f.write(json.dumps(summary, indent=2))
-        f.write("\n\n")
+    event_log.emit(run_id, "topic_discovery", "topics_discovered", {
+        "trending_topics": topics,
+        "covered_topics": {topic: match["run_id"] for topic, match in (covered or {}).items()}
+    })
+
+# Used when no source could be scraped
+FALLBACK_TOPICS = [
+    "GPT-5 Rumors and Expected Capabilities",
+    "Open-Source LLMs Challenging Commercial Models",
+    "AI Coding Assistants Revolution",
+    "Multimodal AI Systems Breaking Barriers",
+    "AI Ethics and Regulation Developments",
+    "Edge AI and On-Device Intelligence",
+    "AI in Healthcare Diagnostic Breakthroughs",
+    "Generative AI for Creative Industries",
+    "AI Agents and Autonomous Systems",
+    "Foundation Models in Scientific Discovery"
+]
+
+def discovery_result(state: Dict[str, Any], trending_topics: List[str]) -> Dict[str, Any]:
+    """Drop topics covered by earlier runs if configured, log, and update the agent state."""
+    # Look up topics that earlier runs already covered
+    index = get_topic_index()
+    covered = index.covered(trending_topics) if index else {}
+    if covered and TOPIC_DEDUP == "filter":
+        remaining = [topic for topic in trending_topics if topic not in covered]
+        # Keep the list as it is if every topic was covered before
+        if remaining:
+            print(f"Skipping {len(covered)} topics already covered by earlier runs")
+            trending_topics = remaining
+    
+    # Log the discovery process
+    log_discovery(state, trending_topics, covered)
+    
+    # Update the state with trending topics
+    return {**state, "trending_topics": trending_topics}
 
 def get_trending_topics(state: Dict[str, Any]) -> Dict[str, Any]:
     """Get trending AI topics and update the agent state."""
     print("Discovering trending AI topics...")
     
     # Scrape content from sources
-    contents = []
-    for source in SOURCES:
-        print(f"Scraping {source}...")
-        content = scrape_content(source)
-        if content:
-            contents.append(content)
+    contents = scrape_sources(SOURCES, run_id=state.get("run_id"))
     
     # If we couldn't scrape any content, use a fallback list of topics
     if not contents:
         print("Using fallback trending topics...")
-        trending_topics = [
-            "GPT-5 Rumors and Expected Capabilities",
-            "Open-Source LLMs Challenging Commercial Models",
-            "AI Coding Assistants Revolution",
-            "Multimodal AI Systems Breaking Barriers",
-            "AI Ethics and Regulation Developments",
-            "Edge AI and On-Device Intelligence",
-            "AI in Healthcare Diagnostic Breakthroughs",
-            "Generative AI for Creative Industries",
-            "AI Agents and Autonomous Systems",
-            "Foundation Models in Scientific Discovery"
-        ]
+        trending_topics = list(FALLBACK_TOPICS)
     else:
         # Extract trending topics using LLM
-        trending_topics = extract_trending_topics(contents)
+        trending_topics = extract_trending_topics(contents, run_id=state.get("run_id"))
     
-    # Log the discovery process
-    log_discovery(state, trending_topics)
+    return discovery_result(state, trending_topics)
+
+async def aget_trending_topics(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Async variant of get_trending_topics."""
+    print("Discovering trending AI topics...")
     
-    # Update the state with trending topics
-    return {**state, "trending_topics": trending_topics}
\ No newline at end of file
+    contents = await ascrape_sources(SOURCES, run_id=state.get("run_id"))
+    
+    if not contents:
+        print("Using fallback trending topics...")
+        trending_topics = list(FALLBACK_TOPICS)
+    else:
+        trending_topics = await aextract_trending_topics(contents, run_id=state.get("run_id"))
+    
+    return discovery_result(state, trending_topics)
@@ -0,0 +1,173 @@
+"""
+Topic Index Component
+--------------------
+This component remembers which topics have already been written about. Every
+finished run adds its topic to a persistent index, and topics from earlier
+runs are picked up from `logs/*/run_summary.json`. New candidate topics are
+looked up with MinHash signatures and locality-sensitive hashing, so a topic
+that resurfaces in a slightly different phrasing is recognized as covered
+before a full post is paid for again.
+"""
+
+import os
+import re
+import glob
+import json
+import random
+import hashlib
+import threading
+from datetime import datetime
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+# "flag" marks covered topics in the selection list, "filter" removes them
+# and "off" disables the lookup
+TOPIC_DEDUP = os.getenv("TOPIC_DEDUP", "flag")
+TOPIC_INDEX_PATH = os.getenv("TOPIC_INDEX_PATH", os.path.join("cache", "topic_index.jsonl"))
+TOPIC_DUP_THRESHOLD = float(os.getenv("TOPIC_DUP_THRESHOLD", "0.5"))
+LOGS_DIR = "logs"
+
+# MinHash signature length and LSH banding; 32 bands of 2 rows make topics
+# with a word overlap of 0.5 collide in some band with near certainty
+NUM_PERM = 64
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERM // LSH_BANDS
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "for", "to", "with", "by", "at",
+    "from", "as", "is", "are", "its", "new", "how", "why", "what", "vs", "versus"
+}
+
+def topic_tokens(topic: str) -> Set[str]:
+    """Normalized content words of a topic title."""
+    tokens = set()
+    for word in re.findall(r"[a-z0-9]+", topic.lower()):
+        if word in STOPWORDS:
+            continue
+        # Light stemming so "Models" and "Model" match
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.add(word)
+    return tokens
+
+def _hash(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+def minhash(tokens: Set[str]) -> Tuple[int, ...]:
+    """MinHash signature of a token set."""
+    hashes = [_hash(token) for token in tokens]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+def _bands(signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+    return [(band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]) for band in range(LSH_BANDS)]
+
+class TopicIndex:
+    """Persistent index of covered topics with near-duplicate lookup."""
+
+    def __init__(self, path: str = TOPIC_INDEX_PATH, logs_dir: str = LOGS_DIR):
+        self.path = path
+        self.logs_dir = logs_dir
+        self.entries: List[Dict[str, Any]] = []
+        self._tokens: List[Set[str]] = []
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = defaultdict(list)
+        self._run_ids: Set[str] = set()
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Load the index file, then pick up finished runs it does not know yet."""
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._insert(json.loads(line))
+
+        for summary_file in sorted(glob.glob(os.path.join(self.logs_dir, "*", "run_summary.json"))):
+            try:
+                with open(summary_file, "r") as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if summary.get("run_id") not in self._run_ids and summary.get("selected_topic"):
+                self.add(summary["selected_topic"], summary["run_id"],
+                         output_path=summary.get("final_output_path", ""),
+                         timestamp=summary.get("timestamp"))
+
+    def _insert(self, entry: Dict[str, Any]) -> bool:
+        tokens = topic_tokens(entry["topic"])
+        if not tokens:
+            return False
+        index = len(self.entries)
+        self.entries.append(entry)
+        self._tokens.append(tokens)
+        self._run_ids.add(entry.get("run_id"))
+        for band in _bands(minhash(tokens)):
+            self._buckets[band].append(index)
+        return True
+
+    def add(self, topic: str, run_id: str, output_path: str = "", timestamp: str = None):
+        """Record a covered topic and append it to the index file."""
+        entry = {
+            "topic": topic,
+            "run_id": run_id,
+            "output_path": output_path,
+            "timestamp": timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        with self._lock:
+            if run_id in self._run_ids or not self._insert(entry):
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def find_duplicate(self, topic: str, threshold: float = None) -> Optional[Dict[str, Any]]:
+        """Return the most similar covered topic at or above the threshold, if any.
+
+        LSH buckets yield the candidates; their exact word overlap decides.
+        """
+        threshold = TOPIC_DUP_THRESHOLD if threshold is None else threshold
+        tokens = topic_tokens(topic)
+        if not tokens:
+            return None
+
+        with self._lock:
+            candidates = set()
+            for band in _bands(minhash(tokens)):
+                candidates.update(self._buckets.get(band, ()))
+
+            best = None
+            for index in candidates:
+                other = self._tokens[index]
+                similarity = len(tokens & other) / len(tokens | other)
+                if similarity >= threshold and (best is None or similarity > best["similarity"]):
+                    best = {**self.entries[index], "similarity": round(similarity, 3)}
+            return best
+
+    def covered(self, topics: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Map each already-covered topic in a list to its closest earlier run."""
+        matches = {}
+        for topic in topics:
+            match = self.find_duplicate(topic)
+            if match:
+                matches[topic] = match
+        return matches
+
+_index: Optional[TopicIndex] = None
+_index_lock = threading.Lock()
+
+def get_topic_index() -> Optional[TopicIndex]:
+    """Return the shared topic index, or None if the lookup is disabled."""
+    global _index
+    if TOPIC_DEDUP == "off":
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = TopicIndex()
+    return _index
@@ -3,15 +3,13 @@ Generate a visual representation of the workflow graph using Mermaid
 """
 
 import os
-from langgraph.graph import StateGraph, END
-from typing import TypedDict, List
-from main import AgentState, build_workflow_graph
-from langchain_core.runnables.graph import MermaidDrawMethod
-import base64
+from main import build_workflow_graph
 
 # Define a function to save the graph visualization
 def generate_workflow_graph():
     """Generate and save a visualization of the workflow graph"""
+    # Only drawing needs langchain_core; building the graph loads LangGraph itself
+    from langchain_core.runnables.graph import MermaidDrawMethod
     
     # Build the workflow graph
     graph = build_workflow_graph()
@@ -21,7 +19,8 @@ def generate_workflow_graph():
     
     # Generate the Mermaid PNG
     try:
-        png_data = runnable.get_graph().draw_mermaid_png(
+        # xray expands the refinement subgraph so its loop is visible
+        png_data = runnable.get_graph(xray=True).draw_mermaid_png(
             draw_method=MermaidDrawMethod.API,
         )
         
@@ -35,7 +34,7 @@ def generate_workflow_graph():
         print("Workflow graph visualization saved to docs/workflow_graph.png")
         
         # Generate Mermaid markdown for reference
-        mermaid_code = runnable.get_graph().draw_mermaid()
+        mermaid_code = runnable.get_graph(xray=True).draw_mermaid()
         with open('docs/workflow_graph.md', 'w') as f:
             f.write("```mermaid\n")
             f.write(mermaid_code)
@@ -50,15 +49,20 @@ def generate_workflow_graph():
         workflow_text = """
         Workflow Graph:
         
-        [discover_topics] --> [human_selection] --> [generate_content] --> [refine_content]
-                                                                           |
-                                                                           | (count < 4)
-                                                                           v
-                                                                      [refine_content]
-                                                                           |
-                                                                           | (count >= 4)
-                                                                           v
-                                                                      [generate_image] --> [create_html] --> [END]
+        [discover_topics] --> [human_selection] --> [generate_content]
+                                                          |
+                        +---------------------------------+---------------------+
+                        |                                                       |
+                        v                                                       v
+                 [refinement: refine_content] <--+                       [generate_image]
+                        |                        | (not converged)              |
+                        +------------------------+                              |
+                        | (converged or max iterations)                        |
+                        v                                                       |
+                   [sync_image] <-----------------------------------------------+
+                        |
+                        v
+                  [create_html] --> [END]
         """
         
         # Save the text visualization
@@ -7,24 +7,43 @@ and HTML page creation using LangGraph.
 """
 
 import os
+import sys
 from dotenv import load_dotenv
 import argparse
+import asyncio
 from datetime import datetime
 import json
-import shutil
+import uuid
 
-from langgraph.graph import StateGraph, END
-from typing import TypedDict, Annotated, Sequence, List, Dict, Any
+from typing import TYPE_CHECKING, TypedDict, Annotated, Sequence, List, Dict, Any
+
+# Load environment variables before the components read their settings
+load_dotenv()
 
 # Import our custom components
-from components.topic_discovery import get_trending_topics
+from components.topic_discovery import get_trending_topics, aget_trending_topics
 from components.human_selection import get_human_selection
-from components.content_generation import generate_initial_content
-from components.content_refinement import refine_content
-from components.image_generation import generate_image
-from components.html_formatter import create_html_page, log_html_creation
+from components.content_generation import generate_initial_content, agenerate_initial_content
+from components.content_refinement import refine_content, arefine_content
+from components.image_generation import (generate_image, agenerate_image, IMAGE_PARALLEL,
+                                         refresh_image_if_stale, arefresh_image_if_stale)
+from components.html_formatter import create_html_page, acreate_html_page, log_html_creation
+from components.llm_cache import get_llm_cache
+from components.llm_client import aclose_llm_clients
+from components.metrics import timed_node, get_run_metrics, release_run_metrics, write_prometheus
+from components import event_log
+from components import artifact_store
+from components.logger import render_run_logs, LOG_RENDER_VIEW
+from components.startup_profile import profile_command, PROFILE_FLAG
+from components.topic_index import get_topic_index
+from components.site_builder import build_site, slugify
+from components.checkpoints import (get_checkpointer, aget_checkpointer, aclose_checkpointer,
+                                    run_config, get_saved_state, fork_run)
 
-load_dotenv()
+# LangGraph is only imported when a workflow is built, so commands that don't
+# run one (--build-site, --render-logs, --help) start quickly
+if TYPE_CHECKING:
+    from langgraph.graph import StateGraph
 
 # Define the state for our agent
 class AgentState(TypedDict):
@@ -33,70 +52,176 @@ class AgentState(TypedDict):
     current_content: str
     refinement_count: int
     refinement_feedback: List[List[str]]
+    refinement_similarity: List[float]
+    refinement_stop_reason: str
     image_url: str
+    image_prompt: str
+    image_basis: str
     html_content: str
     run_id: str
+
+# The subset of the state owned by the refinement loop. Running the loop as a
+# subgraph with its own state lets it run alongside image generation without
+# both branches writing the same keys.
+class RefinementState(TypedDict):
+    selected_topic: str
+    current_content: str
+    refinement_count: int
+    refinement_feedback: List[List[str]]
+    refinement_similarity: List[float]
+    refinement_stop_reason: str
+    run_id: str
     
-def initialize_state() -> AgentState:
+def new_run_id() -> str:
+    """Generate a unique run ID.
+
+    The timestamp keeps run directories sorted chronologically, and the random
+    suffix keeps IDs unique when several runs start within the same second.
+    """
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+def initialize_state(run_id: str = None, selected_topic: str = "",
+                     trending_topics: List[str] = None) -> AgentState:
     """Initialize the agent state with default values."""
     # Generate a unique run ID
-    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    run_id = run_id or new_run_id()
     
     return {
-        "trending_topics": [],
-        "selected_topic": "",
+        "trending_topics": list(trending_topics or []),
+        "selected_topic": selected_topic,
         "current_content": "",
         "refinement_count": 0,
         "refinement_feedback": [],
+        "refinement_similarity": [],
+        "refinement_stop_reason": "",
         "image_url": "",
+        "image_prompt": "",
+        "image_basis": "",
         "html_content": "",
         "run_id": run_id
     }
 
+# Conditional edge: Either continue refinement or finish the loop.
+# The refinement node records a stop reason once the draft has converged
+# or the configured maximum number of iterations is reached.
+def should_continue_refinement(state: Dict[str, Any]) -> bool:
+    return not state.get("refinement_stop_reason")
+
+# Node functions of the blocking workflow and of the asyncio one. Human
+# selection waits on the terminal, so LangGraph runs it in a thread either way.
+NODES = {
+    False: {
+        "discover_topics": get_trending_topics,
+        "generate_content": generate_initial_content,
+        "refine_content": refine_content,
+        "generate_image": generate_image,
+        "sync_image": refresh_image_if_stale,
+        "create_html": create_html_page
+    },
+    True: {
+        "discover_topics": aget_trending_topics,
+        "generate_content": agenerate_initial_content,
+        "refine_content": arefine_content,
+        "generate_image": agenerate_image,
+        "sync_image": arefresh_image_if_stale,
+        "create_html": acreate_html_page
+    }
+}
+
+def build_refinement_graph(async_nodes: bool = False) -> "StateGraph":
+    """Build the self-critique and refinement loop as a standalone graph."""
+    from langgraph.graph import StateGraph, END
+    graph = StateGraph(RefinementState)
+    graph.add_node("refine_content", timed_node("refine_content", NODES[async_nodes]["refine_content"]))
+    graph.add_conditional_edges(
+        "refine_content",
+        should_continue_refinement,
+        {
+            True: "refine_content",
+            False: END
+        }
+    )
+    graph.set_entry_point("refine_content")
+    return graph
+
 # Define the workflow graph
-def build_workflow_graph() -> StateGraph:
-    """Build the langgraph workflow for the content creation agent."""
+def build_workflow_graph(interactive: bool = True, parallel_image: bool = None,
+                         async_nodes: bool = False) -> "StateGraph":
+    """Build the langgraph workflow for the content creation agent.
+
+    The non-interactive variant used by batch runs starts directly at content
+    generation, with the topic already selected in the initial state.
+
+    With ``parallel_image`` (the default, see IMAGE_PARALLEL) the image is
+    prompted and rendered from the initial draft while the refinement loop
+    runs, and both branches join before the HTML page is created. The image
+    is regenerated at the join only if the title or introduction changed
+    materially during refinement.
+
+    With ``async_nodes`` the nodes are coroutines that share the event loop,
+    and the compiled graph must be run with ``ainvoke`` (see arun_workflow).
+    """
+    from langgraph.graph import StateGraph, END
+    if parallel_image is None:
+        parallel_image = IMAGE_PARALLEL
+    nodes = NODES[async_nodes]
     
     # Create a new graph
     graph = StateGraph(AgentState)
     
     # Add nodes to the graph
-    graph.add_node("discover_topics", get_trending_topics)
-    graph.add_node("human_selection", get_human_selection)
-    graph.add_node("generate_content", generate_initial_content)
-    graph.add_node("refine_content", refine_content)
-    graph.add_node("generate_image", generate_image)
-    graph.add_node("create_html", create_html_page)
+    if interactive:
+        graph.add_node("discover_topics", timed_node("discover_topics", nodes["discover_topics"]))
+        graph.add_node("human_selection", timed_node("human_selection", get_human_selection))
+    graph.add_node("generate_content", timed_node("generate_content", nodes["generate_content"]))
+    graph.add_node("generate_image", timed_node("generate_image", nodes["generate_image"]))
+    graph.add_node("create_html", timed_node("create_html", nodes["create_html"]))
     
     # Define the edges (workflow)
-    graph.add_edge("discover_topics", "human_selection")
-    graph.add_edge("human_selection", "generate_content")
-    graph.add_edge("generate_content", "refine_content")
-    
-    # Conditional edge: Either continue refinement or move to image generation
-    def should_continue_refinement(state: AgentState) -> str:
-        if state["refinement_count"] < 4:  # Maximum 4 iterations
-            return "refine_content"
-        else:
-            return "generate_image"
+    if interactive:
+        graph.add_edge("discover_topics", "human_selection")
+        graph.add_edge("human_selection", "generate_content")
     
-    graph.add_conditional_edges(
-        "refine_content",
-        should_continue_refinement,
-        {
-            "refine_content": "refine_content",
-            "generate_image": "generate_image"
-        }
-    )
+    if parallel_image:
+        # Fan out: refinement and image generation both start from the initial draft
+        graph.add_node("refinement", build_refinement_graph(async_nodes).compile())
+        graph.add_node("sync_image", timed_node("sync_image", nodes["sync_image"]))
+        graph.add_edge("generate_content", "refinement")
+        graph.add_edge("generate_content", "generate_image")
+        
+        # Fan in: wait for both branches before creating the HTML page
+        graph.add_edge(["refinement", "generate_image"], "sync_image")
+        graph.add_edge("sync_image", "create_html")
+    else:
+        graph.add_node("refine_content", timed_node("refine_content", nodes["refine_content"]))
+        graph.add_edge("generate_content", "refine_content")
+        graph.add_conditional_edges(
+            "refine_content",
+            should_continue_refinement,
+            {
+                True: "refine_content",
+                False: "generate_image"
+            }
+        )
+        graph.add_edge("generate_image", "create_html")
     
-    graph.add_edge("generate_image", "create_html")
     graph.add_edge("create_html", END)
     
     # Set the entry point
-    graph.set_entry_point("discover_topics")
+    graph.set_entry_point("discover_topics" if interactive else "generate_content")
     
     return graph
 
+def compile_workflow(interactive: bool = True, parallel_image: bool = None):
+    """Compile the workflow graph with the durable checkpointer, if enabled."""
+    return build_workflow_graph(interactive, parallel_image).compile(checkpointer=get_checkpointer())
+
+async def acompile_workflow(interactive: bool = True, parallel_image: bool = None):
+    """Compile the async workflow graph with the event loop's checkpointer, if enabled."""
+    return build_workflow_graph(interactive, parallel_image, async_nodes=True).compile(
+        checkpointer=await aget_checkpointer()
+    )
+
 def log_final_output(state: Dict[str, Any], output_path: str):
     """Log the final output details."""
     run_id = state.get("run_id", "unknown")
@@ -109,81 +234,231 @@ def log_final_output(state: Dict[str, Any], output_path: str):
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "selected_topic": state.get("selected_topic", ""),
         "refinement_iterations": state.get("refinement_count", 0),
+        "refinement_stop_reason": state.get("refinement_stop_reason", ""),
+        "refinement_similarity": state.get("refinement_similarity", []),
         "final_output_path": output_path,
         "image_path": state.get("image_url", ""),
         "content_length": len(state.get("current_content", "")),
         "html_length": len(state.get("html_content", "")),
     }
     
+    # Record how many LLM calls were served from the response cache
+    cache = get_llm_cache()
+    if cache is not None:
+        summary["llm_cache"] = cache.stats()
+    
+    # Per-node and per-call wall time, retries, tokens and bytes
+    summary["metrics"] = get_run_metrics(run_id).summary()
+    
+    # Manifest of the run's artifacts in the content-addressed store
+    summary["artifacts"] = {
+        "content": artifact_store.put_text(state.get("current_content", ""), ".md"),
+        "html": artifact_store.put_text(state.get("html_content", ""), ".html"),
+        "image": artifact_store.put_file(state.get("image_url", ""))
+    }
+    
     with open(summary_file, "w") as f:
         json.dump(summary, f, indent=2)
     
-    # Copy the final HTML output to the logs directory
-    if os.path.exists(output_path):
-        try:
-            html_filename = os.path.basename(output_path)
-            log_html_path = os.path.join(logs_dir, html_filename)
-            shutil.copy2(output_path, log_html_path)
-        except Exception as e:
-            print(f"Could not copy final HTML to logs: {e}")
+    # Remember the topic so later runs can spot it resurfacing
+    index = get_topic_index()
+    if index is not None:
+        index.add(summary["selected_topic"], run_id, output_path, timestamp=summary["timestamp"])
+    
+    # The final HTML itself is already in the event log; the rendered view
+    # copies it next to the summary
+    event_log.emit(run_id, "main", "run_completed", {"final_output_path": output_path})
+
+def save_run_output(final_state: Dict[str, Any], output_dir: str):
+    """Save the HTML output of a finished run and log the results."""
+    if final_state.get("html_content") and final_state.get("selected_topic"):
+        # Clean the filename
+        output_path = os.path.join(output_dir, f"{slugify(final_state['selected_topic'])}.html")
+        
+        # Store the page once and hardlink it into the output directory
+        html_object = artifact_store.put_text(final_state["html_content"], ".html")
+        artifact_store.link(html_object, output_path)
+        print(f"HTML content created and saved to {output_path}")
+        
+        # Update HTML logger with final output path
+        log_html_creation(final_state, final_state.get("selected_topic", ""), 
+                        final_state.get("html_content", ""), output_path)
+                        
+        # Log final output details
+        log_final_output(final_state, output_path)
+        
+        print("Workflow completed successfully!")
+    else:
+        print("Workflow completed but no HTML content was generated.")
+
+def log_run_failure(run_id: str, logs_dir: str, error: Exception):
+    """Print and log an exception that ended a run."""
+    print(f"Error during workflow execution: {error}")
+    import traceback
+    traceback.print_exc()
+    
+    # Log the error
+    event_log.emit(run_id, "main", "run_failed", {"error": str(error)})
+    with open(os.path.join(logs_dir, "error.txt"), "w") as f:
+        f.write(f"Error during workflow execution: {error}\n")
+        traceback.print_exc(file=f)
+
+def finish_run(run_id: str, metrics_file: str = None):
+    """Release the run's metrics and write the metrics file and log views."""
+    release_run_metrics(run_id)
+    if metrics_file:
+        write_prometheus(metrics_file)
+    if LOG_RENDER_VIEW:
+        event_log.flush()
+        render_run_logs(run_id)
+
+def run_workflow(workflow, initial_state: Dict[str, Any], output_dir: str,
+                 metrics_file: str = None, resume: bool = False) -> Dict[str, Any]:
+    """Run one workflow invocation, save its HTML output and log the results.
+
+    If ``metrics_file`` is given, the process-wide Prometheus metrics are
+    written to it once the run finishes. With ``resume`` the run continues
+    from its last checkpoint instead of starting from ``initial_state``.
+    Returns the final state, or None if the workflow failed.
+    """
+    # Create logs directory for this run
+    run_id = initial_state["run_id"]
+    logs_dir = os.path.join("logs", run_id)
+    os.makedirs(logs_dir, exist_ok=True)
+    
+    try:
+        # Get the final state from the workflow
+        final_state = workflow.invoke(None if resume else initial_state, run_config(run_id))
+        save_run_output(final_state, output_dir)
+        return final_state
+            
+    except Exception as e:
+        log_run_failure(run_id, logs_dir, e)
+        return None
+    
+    finally:
+        finish_run(run_id, metrics_file)
+
+async def arun_workflow(workflow, initial_state: Dict[str, Any], output_dir: str,
+                        metrics_file: str = None, resume: bool = False) -> Dict[str, Any]:
+    """Async variant of run_workflow, for workflows compiled by acompile_workflow."""
+    run_id = initial_state["run_id"]
+    logs_dir = os.path.join("logs", run_id)
+    os.makedirs(logs_dir, exist_ok=True)
+    
+    try:
+        final_state = await workflow.ainvoke(None if resume else initial_state, run_config(run_id))
+        save_run_output(final_state, output_dir)
+        return final_state
+    
+    except Exception as e:
+        log_run_failure(run_id, logs_dir, e)
+        return None
+    
+    finally:
+        finish_run(run_id, metrics_file)
+
+async def amain_run(output_dir: str, metrics_file: str = None):
+    """Run the interactive workflow on an event loop."""
+    try:
+        workflow = await acompile_workflow()
+        print("Starting AI Content Creation Agent workflow...")
+        await arun_workflow(workflow, initialize_state(), output_dir, metrics_file=metrics_file)
+    finally:
+        await aclose_llm_clients()
+        await aclose_checkpointer()
 
 def main():
     """Main function to run the agent workflow."""
     parser = argparse.ArgumentParser(description="AI Content Creation Agent")
     parser.add_argument("--output", type=str, default="output", help="Output directory for HTML files")
+    parser.add_argument("--batch", action="store_true", help="Run non-interactively for several topics at once")
+    parser.add_argument("--topics", type=str, nargs="+", help="Topics to write about in batch mode (skips discovery)")
+    parser.add_argument("--top-n", type=int, default=3, help="In batch mode without --topics, use the top N discovered topics")
+    parser.add_argument("--workers", type=int, default=4, help="Maximum number of concurrent runs in batch mode")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Run the workflow's nodes as coroutines on one event loop")
+    parser.add_argument("--metrics-file", type=str, help="Write Prometheus text-format metrics to this file after each run")
+    parser.add_argument("--render-logs", type=str, metavar="RUN_ID", help="Render the human-readable log files of a past run and exit")
+    parser.add_argument("--build-site", action="store_true", help="Render all stored posts, index, archive and feed into the output directory and exit")
+    parser.add_argument("--rebuild", action="store_true", help="With --build-site, re-render every post instead of only changed ones")
+    parser.add_argument("--resume", type=str, metavar="RUN_ID", help="Continue an interrupted run from its last completed node")
+    parser.add_argument("--fork", type=str, metavar="RUN_ID", help="Start a new run from the saved state of a past run (use with --from)")
+    parser.add_argument("--from", dest="from_node", type=str, metavar="NODE", help="Node to re-run from when forking, e.g. refinement or create_html")
+    parser.add_argument(PROFILE_FLAG, action="store_true", help="Run the command and report the time spent importing each package")
     args = parser.parse_args()
     
+    if args.profile_startup:
+        sys.exit(profile_command())
+    
+    if args.render_logs:
+        render_run_logs(args.render_logs)
+        print(f"Rendered logs for run {args.render_logs}")
+        return
+    
+    if args.build_site:
+        counts = build_site(args.output, force=args.rebuild)
+        print(f"Built site in {args.output}: {counts['rendered']} of {counts['posts']} posts rendered, "
+              f"{counts['removed']} removed")
+        return
+    
     # Ensure output directory exists
     os.makedirs(args.output, exist_ok=True)
     
-    # Initialize the state and workflow
-    initial_state = initialize_state()
+    if args.batch or args.topics:
+        from batch import run_batch, arun_batch
+        if args.use_async:
+            asyncio.run(arun_batch(topics=args.topics, top_n=args.top_n, concurrency=args.workers,
+                                   output_dir=args.output, metrics_file=args.metrics_file))
+        else:
+            run_batch(topics=args.topics, top_n=args.top_n, workers=args.workers, output_dir=args.output,
+                      metrics_file=args.metrics_file)
+        return
     
-    # Create logs directory for this run
-    run_id = initial_state["run_id"]
-    logs_dir = os.path.join("logs", run_id)
-    os.makedirs(logs_dir, exist_ok=True)
+    if args.fork and not args.from_node:
+        parser.error("--fork requires --from NODE")
     
-    workflow = build_workflow_graph().compile()
+    if args.use_async and (args.resume or args.fork):
+        parser.error("--async cannot be combined with --resume or --fork")
     
-    # Run the workflow
-    print("Starting AI Content Creation Agent workflow...")
+    if args.use_async:
+        asyncio.run(amain_run(args.output, metrics_file=args.metrics_file))
+        return
     
-    try:
-        # Get the final state from the workflow
-        final_state = workflow.invoke(initial_state)
-        
-        # Save the HTML content
-        if final_state.get("html_content") and final_state.get("selected_topic"):
-            # Clean the filename
-            output_file = final_state["selected_topic"].replace(' ', '_').lower()
-            output_file = ''.join(c for c in output_file if c.isalnum() or c in '._- ')
-            output_path = os.path.join(args.output, f"{output_file}.html")
-            
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(final_state["html_content"])
-            print(f"HTML content created and saved to {output_path}")
-            
-            # Update HTML logger with final output path
-            log_html_creation(final_state, final_state.get("selected_topic", ""), 
-                            final_state.get("html_content", ""), output_path)
-                            
-            # Log final output details
-            log_final_output(final_state, output_path)
-            
-            print("Workflow completed successfully!")
+    workflow = compile_workflow()
+    
+    if args.resume:
+        try:
+            snapshot = get_saved_state(workflow, args.resume)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        if snapshot is None:
+            print(f"No checkpoint found for run {args.resume}")
+        elif not snapshot.next:
+            print(f"Run {args.resume} already completed")
         else:
-            print("Workflow completed but no HTML content was generated.")
-            
-    except Exception as e:
-        print(f"Error during workflow execution: {e}")
-        import traceback
-        traceback.print_exc()
-        
-        # Log the error
-        with open(f"logs/{run_id}/error.txt", "w") as f:
-            f.write(f"Error during workflow execution: {e}\n")
-            traceback.print_exc(file=f)
+            print(f"Resuming run {args.resume} at {', '.join(snapshot.next)}...")
+            run_workflow(workflow, snapshot.values, args.output, metrics_file=args.metrics_file, resume=True)
+        return
+    
+    if args.fork:
+        run_id = new_run_id()
+        try:
+            forked_state = fork_run(workflow, args.fork, args.from_node, run_id)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        event_log.emit(run_id, "main", "run_forked", {"parent_run_id": args.fork, "from_node": args.from_node})
+        print(f"Forked run {args.fork} into {run_id}, re-running from {args.from_node}...")
+        run_workflow(workflow, forked_state, args.output, metrics_file=args.metrics_file, resume=True)
+        return
+    
+    # Initialize the state
+    initial_state = initialize_state()
+    
+    # Run the workflow
+    print("Starting AI Content Creation Agent workflow...")
+    run_workflow(workflow, initial_state, args.output, metrics_file=args.metrics_file)
 
 if __name__ == "__main__":
     # Load environment variables from .env file